@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .metrics import REGISTRY
+from .router import Request, Response
+
+# 队列满时直接丢弃新记录，处理请求的线程从不等待磁盘
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+# 后台线程每次最多合并写入的行数
+WRITE_BATCH = 500
+
+ACCESS_LOG_DROPPED = REGISTRY.counter("hanzi_access_log_dropped_total", "访问日志队列已满而丢弃的记录数。")
+
+
+class AccessLog:
+    """结构化访问日志：每个请求一行 JSON，经有界队列由后台线程写入，按大小轮转。
+
+    path 为空时不记录。文件达到 max_bytes 后依次改名为 .1、.2 ...，最多保留 backups 份。
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        backups: int = DEFAULT_BACKUPS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max(1024, int(max_bytes))
+        self.backups = max(0, int(backups))
+        self._queue: "queue.Queue[Optional[Dict[str, object]]]" = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._file = None
+        self._size = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None and not self._stopped
+
+    def record(
+        self,
+        request: Request,
+        response: Response,
+        seconds: float,
+        db_seconds: float = 0.0,
+        db_calls: int = 0,
+    ) -> None:
+        """记录一次请求（只构造字典并入队，格式化与写入都在后台线程）。"""
+        if not self.enabled:
+            return
+        route = request.route
+        entry = {
+            "ts": time.time(),
+            "method": request.method,
+            # 只记录路径：查询参数里可能有会话编号
+            "path": request.path,
+            "route": route.path if route else "unmatched",
+            "status": response.status_code,
+            "latency_ms": round(seconds * 1000, 3),
+            "bytes": len(response.body),
+            "db_ms": round(db_seconds * 1000, 3),
+            "db_calls": db_calls,
+            "user_id": request.user_id,
+            "client": request.client_address[0],
+        }
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            ACCESS_LOG_DROPPED.inc()
+
+    def pending_count(self) -> int:
+        return self._queue.qsize()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None or self._stopped:
+                return
+            self._thread = threading.Thread(target=self._run, name="access-log", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            entry = self._queue.get()
+            batch: List[Dict[str, object]] = []
+            stopping = entry is None
+            if entry is not None:
+                batch.append(entry)
+            while not stopping and len(batch) < WRITE_BATCH:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stopping = True
+                else:
+                    batch.append(entry)
+            if batch:
+                try:
+                    self._write(batch)
+                except OSError as exc:
+                    print(f"[访问日志] 写入失败: {exc}")
+            if stopping:
+                self._close_file()
+                return
+
+    def _write(self, batch: List[Dict[str, object]]) -> None:
+        lines = []
+        for entry in batch:
+            entry["ts"] = datetime.fromtimestamp(float(entry["ts"])).isoformat(timespec="milliseconds")
+            lines.append(json.dumps(entry, ensure_ascii=False, separators=(",", ":")))
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        if self._file is None:
+            self._open_file()
+        elif self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+
+    def _open_file(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _rotate(self) -> None:
+        self._close_file()
+        if self.backups:
+            for index in range(self.backups - 1, 0, -1):
+                older = self.path.with_name(f"{self.path.name}.{index}")
+                if older.exists():
+                    os.replace(older, self.path.with_name(f"{self.path.name}.{index + 1}"))
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink(missing_ok=True)
+        self._open_file()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """停止记录，写完队列中剩余的记录后关闭文件。"""
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+        if thread is None:
+            return
+        # 队列满时也要送达结束标记：后台线程仍在取出记录
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout=timeout)
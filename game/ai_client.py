@@ -2,10 +2,26 @@
 
 import json
 import os
+import time
 import urllib.error
 import urllib.request
 from typing import Dict, Optional
 
+from .metrics import REGISTRY
+
+AI_REQUEST_SECONDS = REGISTRY.histogram(
+    "hanzi_ai_request_seconds", "调用外部大模型的耗时（秒，含失败的调用）。", ("operation",)
+)
+AI_REQUEST_FAILURES = REGISTRY.counter(
+    "hanzi_ai_request_failures_total", "调用外部大模型失败的次数。", ("operation", "reason")
+)
+
+
+class _AIRequestError(RuntimeError):
+    def __init__(self, message: str, reason: str) -> None:
+        super().__init__(message)
+        self.reason = reason
+
 
 class AIClient:
     """调用外部大模型进行猜字决策。"""
@@ -22,7 +38,8 @@ class AIClient:
             self.temperature = float(temperature_raw)
         except (TypeError, ValueError):
             self.temperature = 0.2
-        self.debug_http = os.getenv("AI_HTTP_DEBUG", "1").strip().lower() in ("1", "true", "yes")
+        # 完整请求/响应同步打印到终端，负载下很慢，默认关闭
+        self.debug_http = os.getenv("AI_HTTP_DEBUG", "0").strip().lower() in ("1", "true", "yes")
 
     def _log_request(self, url: str, headers: dict, body: bytes) -> None:
         """打印完整 HTTP 请求（不包含密钥）。"""
@@ -111,19 +128,21 @@ class AIClient:
             return value
         raise ValueError("模型输出不是 JSON 对象。")
 
-    def choose_next_guess(self, state: Dict[str, object], previous_step: Optional[dict]) -> dict:
-        """调用模型并返回 guess + reason。"""
-        if not self.api_key:
-            raise RuntimeError("未配置 OPENAI_API_KEY，无法调用 AI。")
-
-        messages = self._build_prompt(state, previous_step)
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": self.temperature,
-            "response_format": {"type": "json_object"},
-        }
-
+    def _chat(self, payload: dict, operation: str) -> str:
+        """发送一次 chat/completions 请求，返回第一条回复的内容，并记录耗时与失败原因。"""
+        started = time.perf_counter()
+        try:
+            return self._chat_request(payload)
+        except _AIRequestError as exc:
+            AI_REQUEST_FAILURES.inc(operation=operation, reason=exc.reason)
+            raise
+        except Exception:
+            AI_REQUEST_FAILURES.inc(operation=operation, reason="other")
+            raise
+        finally:
+            AI_REQUEST_SECONDS.observe(time.perf_counter() - started, operation=operation)
+
+    def _chat_request(self, payload: dict) -> str:
         data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
         headers = {
             "Content-Type": "application/json",
@@ -139,31 +158,47 @@ class AIClient:
         except urllib.error.HTTPError as exc:
             body = exc.read().decode("utf-8", errors="ignore")
             self._log_response(exc.code, exc.headers, body)
-            raise RuntimeError(f"AI 接口 HTTP 错误：{exc.code}，返回：{body[:200]}") from exc
+            raise _AIRequestError(f"AI 接口 HTTP 错误：{exc.code}，返回：{body[:200]}", "http") from exc
         except urllib.error.URLError as exc:
-            raise RuntimeError(f"AI 接口无法连接：{exc.reason}") from exc
+            raise _AIRequestError(f"AI 接口无法连接：{exc.reason}", "connect") from exc
+        except TimeoutError as exc:
+            raise _AIRequestError("AI 接口响应超时。", "timeout") from exc
 
         if not raw.strip():
-            raise RuntimeError("AI 接口返回空内容，请检查 Base URL/网络/Key。")
+            raise _AIRequestError("AI 接口返回空内容，请检查 Base URL/网络/Key。", "empty")
         try:
             result = json.loads(raw)
         except json.JSONDecodeError as exc:
             snippet = raw[:200].strip()
-            raise RuntimeError(f"AI 接口返回非 JSON：{snippet}") from exc
+            raise _AIRequestError(f"AI 接口返回非 JSON：{snippet}", "invalid_response") from exc
 
         if isinstance(result, dict) and result.get("error"):
             message = result.get("error", {}).get("message", "未知错误")
-            raise RuntimeError(f"AI 接口错误：{message}")
+            raise _AIRequestError(f"AI 接口错误：{message}", "api_error")
 
         content = ""
         if isinstance(result, dict):
             choices = result.get("choices", [])
             if choices:
                 content = choices[0].get("message", {}).get("content", "")
-
         if not content:
-            raise RuntimeError("模型返回为空。")
+            raise _AIRequestError("模型返回为空。", "empty")
+        return content
+
+    def choose_next_guess(self, state: Dict[str, object], previous_step: Optional[dict]) -> dict:
+        """调用模型并返回 guess + reason。"""
+        if not self.api_key:
+            raise RuntimeError("未配置 OPENAI_API_KEY，无法调用 AI。")
+
+        messages = self._build_prompt(state, previous_step)
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "response_format": {"type": "json_object"},
+        }
 
+        content = self._chat(payload, "guess")
         data = self._extract_json(content)
         guess = str(data.get("guess", "")).strip()
         reason = str(data.get("reason", "")).strip()
@@ -205,45 +240,7 @@ class AIClient:
             "response_format": {"type": "json_object"},
         }
 
-        data = json.dumps(request_payload, ensure_ascii=False).encode("utf-8")
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}",
-        }
-        request = urllib.request.Request(self.base_url, data=data, headers=headers, method="POST")
-        self._log_request(self.base_url, headers, data)
-
-        try:
-            with urllib.request.urlopen(request, timeout=30) as response:
-                raw = response.read().decode("utf-8")
-                self._log_response(response.getcode(), response.headers, raw)
-        except urllib.error.HTTPError as exc:
-            body = exc.read().decode("utf-8", errors="ignore")
-            self._log_response(exc.code, exc.headers, body)
-            raise RuntimeError(f"AI 接口 HTTP 错误：{exc.code}，返回：{body[:200]}") from exc
-        except urllib.error.URLError as exc:
-            raise RuntimeError(f"AI 接口无法连接：{exc.reason}") from exc
-
-        if not raw.strip():
-            raise RuntimeError("AI 接口返回空内容，请检查 Base URL/网络/Key。")
-        try:
-            result = json.loads(raw)
-        except json.JSONDecodeError as exc:
-            snippet = raw[:200].strip()
-            raise RuntimeError(f"AI 接口返回非 JSON：{snippet}") from exc
-
-        if isinstance(result, dict) and result.get("error"):
-            message = result.get("error", {}).get("message", "未知错误")
-            raise RuntimeError(f"AI 接口错误：{message}")
-
-        content = ""
-        if isinstance(result, dict):
-            choices = result.get("choices", [])
-            if choices:
-                content = choices[0].get("message", {}).get("content", "")
-        if not content:
-            raise RuntimeError("模型返回为空。")
-
+        content = self._chat(request_payload, "generate")
         data = self._extract_json(content)
         body = str(data.get("body", "")).strip()
         if not body:
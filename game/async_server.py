@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import http.client
+import io
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from typing import Optional, Set, Tuple, Type
+
+from .websocket import WebSocketConnection
+
+# 空闲 keep-alive 连接的最长等待时间（秒）
+KEEPALIVE_TIMEOUT = 75.0
+# 收到请求行后读完请求头与请求体的期限（秒），防止慢速发送长期占用连接（slowloris）
+REQUEST_READ_TIMEOUT = 15.0
+# 单行（请求行/请求头）长度上限，超出视为非法请求
+MAX_LINE_BYTES = 64 * 1024
+MAX_HEADER_COUNT = 100
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class _HTTPError(Exception):
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+def _error_response(status_code: int, message: str) -> bytes:
+    data = json.dumps({"ok": False, "message": message}, ensure_ascii=False).encode("utf-8")
+    reason = http.client.responses.get(status_code, "Error")
+    head = (
+        f"HTTP/1.1 {status_code} {reason}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    return head.encode("latin-1") + data
+
+
+def _run_handler(
+    handler_class: Type[BaseHTTPRequestHandler],
+    method: str,
+    target: str,
+    version: str,
+    headers: http.client.HTTPMessage,
+    body: bytes,
+    client_address: Tuple[str, int],
+    keep_alive: bool,
+    queued_at: Optional[float] = None,
+) -> Tuple[bytes, bool, Optional[object]]:
+    """在线程池里复用同步的 RequestHandler，返回 (响应字节, 是否关闭连接, 流式响应)。
+
+    不经过 BaseHTTPRequestHandler.__init__（它会直接读写 socket），
+    而是补齐处理函数用到的属性，请求体与响应都放在内存缓冲里。
+    流式响应（如 SSE）与协议升级（WebSocket）只写出响应头，后续数据由事件循环收发，不占用工作线程。
+    """
+    handler = handler_class.__new__(handler_class)
+    handler.client_address = client_address
+    handler.server = None
+    handler.rfile = io.BytesIO(body)
+    handler.wfile = io.BytesIO()
+    handler.command = method
+    handler.path = target
+    handler.request_version = version
+    handler.requestline = f"{method} {target} {version}"
+    handler.headers = headers
+    handler.close_connection = not keep_alive
+    # 响应都带 Content-Length，可以安全地以 HTTP/1.1 保持连接
+    handler.protocol_version = "HTTP/1.1" if keep_alive else "HTTP/1.0"
+    handler.defer_stream = True
+    handler.deferred_stream = None
+    handler.queued_at = queued_at
+    do_method = getattr(handler, "do_" + method, None)
+    if do_method is None:
+        return _error_response(501, "不支持的请求方法。"), True, None
+    try:
+        do_method()
+    except Exception as exc:
+        print(f"[服务] 处理 {method} {target} 失败: {exc}")
+        return _error_response(500, "服务器内部错误。"), True, None
+    return handler.wfile.getvalue(), bool(handler.close_connection), handler.deferred_stream
+
+
+class AsyncHTTPServer:
+    """基于 asyncio 的 HTTP/1.1 前端：连接由事件循环维护，路由仍交给同步的 RequestHandler。
+
+    空闲的 keep-alive 连接只占一个协程，数据库与 AI 调用在线程池中执行。
+    """
+
+    # 停机时等待处理中的请求完成的最长时间（秒），由 main() 按 --shutdown-timeout 设置
+    shutdown_timeout = 10.0
+
+    def __init__(
+        self,
+        server_address: Tuple[str, int],
+        handler_class: Type[BaseHTTPRequestHandler],
+        max_workers: int = 32,
+    ) -> None:
+        self.handler_class = handler_class
+        # 与 HTTPServer 一致：构造时即绑定端口，便于预派生的多个进程共享同一个监听 socket
+        self.socket = socket.create_server(server_address, backlog=1024)
+        self.server_address = self.socket.getsockname()[:2]
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="async-http")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._stopping: Optional[asyncio.Event] = None
+        # 已提交给线程池、尚未开始处理的请求数
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        # 所有连接的协程，以及其中正在等待下一个请求或维持推送/WebSocket 的（停机时可以直接关闭）
+        self._connections: Set[asyncio.Task] = set()
+        self._idle: Set[asyncio.Task] = set()
+        self.draining = False
+        # 停机时超过 shutdown_timeout 仍未完成、被强制断开的连接数
+        self.unfinished = 0
+
+    def queue_depth(self) -> int:
+        with self._pending_lock:
+            return self._pending
+
+    def _dequeue(self, *args) -> Tuple[bytes, bool, Optional[object]]:
+        with self._pending_lock:
+            self._pending -= 1
+        return _run_handler(*args)
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, str, http.client.HTTPMessage, bytes]]:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=KEEPALIVE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        if not request_line:
+            return None
+        parts = request_line.decode("latin-1").rstrip("\r\n").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            raise _HTTPError(400, "请求行格式错误。")
+        method, target, version = parts
+        try:
+            head = await asyncio.wait_for(self._read_headers_and_body(reader), timeout=REQUEST_READ_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise _HTTPError(408, "读取请求超时。")
+        if head is None:
+            return None
+        headers, body = head
+        return method, target, version, headers, body
+
+    async def _read_headers_and_body(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[http.client.HTTPMessage, bytes]]:
+        header_lines = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                return None
+            if line in (b"\r\n", b"\n"):
+                break
+            header_lines.append(line)
+            if len(header_lines) > MAX_HEADER_COUNT:
+                raise _HTTPError(431, "请求头过多。")
+        headers = http.client.parse_headers(io.BytesIO(b"".join(header_lines) + b"\r\n"))
+
+        if headers.get("Transfer-Encoding"):
+            raise _HTTPError(501, "不支持分块请求体。")
+        try:
+            length = int(headers.get("Content-Length", "0") or 0)
+        except ValueError:
+            raise _HTTPError(400, "Content-Length 无效。")
+        if length < 0:
+            raise _HTTPError(400, "Content-Length 无效。")
+        if length > MAX_BODY_BYTES:
+            raise _HTTPError(413, "请求体过大。")
+        body = await reader.readexactly(length) if length else b""
+        return headers, body
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername") or ("", 0)
+        client_address = (str(peer[0]), int(peer[1]))
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while not self.draining:
+                self._idle.add(task)
+                try:
+                    request = await self._read_request(reader)
+                except _HTTPError as exc:
+                    writer.write(_error_response(exc.status_code, exc.message))
+                    await writer.drain()
+                    break
+                except (ValueError, asyncio.LimitOverrunError, asyncio.IncompleteReadError):
+                    break
+                finally:
+                    self._idle.discard(task)
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                connection = str(headers.get("Connection", "")).lower()
+                if version == "HTTP/1.1":
+                    keep_alive = connection != "close"
+                else:
+                    keep_alive = connection == "keep-alive"
+                # 停机中：处理完这个请求就关闭连接
+                keep_alive = keep_alive and not self.draining
+                with self._pending_lock:
+                    self._pending += 1
+                response, close, stream = await loop.run_in_executor(
+                    self._executor,
+                    self._dequeue,
+                    self.handler_class,
+                    method,
+                    target,
+                    version,
+                    headers,
+                    body,
+                    client_address,
+                    keep_alive,
+                    time.monotonic(),
+                )
+                try:
+                    writer.write(response)
+                    await writer.drain()
+                    if stream is not None:
+                        self._idle.add(task)
+                    if isinstance(stream, WebSocketConnection):
+                        await self._pump_websocket(stream, reader, writer)
+                        break
+                    if stream is not None:
+                        await self._pump_stream(stream, writer)
+                        break
+                finally:
+                    # 写响应头失败时还没进入 pump：同样注销订阅、释放长连接名额
+                    if stream is not None:
+                        stream.close()
+                if close:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._idle.discard(task)
+            self._connections.discard(task)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _pump_stream(self, stream, writer: asyncio.StreamWriter) -> None:
+        """把流式响应的数据写给客户端：有数据时由其他线程唤醒，空闲时定期发心跳。"""
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+
+        def wake() -> None:
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+        stream.on_ready(wake)
+        try:
+            while not stream.closed:
+                try:
+                    await asyncio.wait_for(ready.wait(), timeout=stream.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    writer.write(stream.heartbeat)
+                    await writer.drain()
+                    continue
+                ready.clear()
+                data = stream.drain()
+                if data:
+                    writer.write(data)
+                    await writer.drain()
+        finally:
+            stream.close()
+
+    async def _pump_websocket(
+        self, connection: WebSocketConnection, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """WebSocket 连接：由事件循环读取帧，只在处理消息时占用工作线程（同一连接的消息按顺序处理）。"""
+        loop = asyncio.get_running_loop()
+        try:
+            while not connection.closed:
+                try:
+                    data = await asyncio.wait_for(reader.read(65536), timeout=connection.idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not data:
+                    break
+                output = await loop.run_in_executor(self._executor, connection.receive, data)
+                if output:
+                    writer.write(output)
+                    await writer.drain()
+        finally:
+            connection.close()
+
+    async def _serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._server = await asyncio.start_server(
+            self._handle_connection, sock=self.socket, limit=MAX_LINE_BYTES
+        )
+        async with self._server:
+            await self._stopping.wait()
+            await self._drain()
+
+    async def _drain(self) -> None:
+        """停止接受新连接，关闭空闲与长连接，最多等待 shutdown_timeout 秒让处理中的请求写完响应。"""
+        self.draining = True
+        self._server.close()
+        for task in list(self._idle):
+            task.cancel()
+        busy = set(self._connections)
+        if busy:
+            _, busy = await asyncio.wait(busy, timeout=max(0.0, self.shutdown_timeout))
+        self.unfinished = len(busy)
+        for task in busy:
+            task.cancel()
+        if busy:
+            await asyncio.wait(busy)
+
+    def serve_forever(self) -> None:
+        asyncio.run(self._serve())
+
+    def shutdown(self) -> None:
+        """供其他线程调用：停止接受新连接并结束 serve_forever。"""
+        loop = self._loop
+        if loop is not None and self._stopping is not None:
+            loop.call_soon_threadsafe(self._stopping.set)
+
+    def server_close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.socket.close()
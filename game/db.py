@@ -1,27 +1,276 @@
 # -*- coding: utf-8 -*-
 
+import functools
+import inspect
+import json
+import os
 import sqlite3
+import sys
+import threading
+import time
+import weakref
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .cache import MISSING, TTLCache
+from .metrics import DB_BUCKETS, REGISTRY, SIZE_BUCKETS
 
 DB_FILE = Path(__file__).resolve().parents[1] / "data" / "game.db"
+# 写锁冲突时的等待秒数（多线程/多进程并发写入）
+SQLITE_BUSY_TIMEOUT = 10.0
+
+# 排行榜类查询的进程内缓存：写入路径精确失效，TTL 兜底其他来源的变更
+QUERY_CACHE_TTL = 10.0
+_QUERY_CACHE = TTLCache(ttl=QUERY_CACHE_TTL, maxsize=512)
+
+# session_id -> 用户信息的缓存；未绑定的会话不缓存，登录后立即生效
+SESSION_CACHE_TTL = 60.0
+_SESSION_CACHE = TTLCache(ttl=SESSION_CACHE_TTL, maxsize=10000)
+
+# 全局配置的进程内缓存：整表加载一次，写入时同步更新；
+# 其他进程的修改通过 cache_versions 中的版本号发现（最多每隔 SETTINGS_RECHECK_INTERVAL 秒检查一次）
+SETTINGS_RECHECK_INTERVAL = 1.0
+_SETTINGS_LOCK = threading.Lock()
+_settings_cache: Optional[Dict[str, str]] = None
+_settings_version = 0
+_settings_checked_at = 0.0
 
 
 def _now_iso() -> str:
     return datetime.utcnow().isoformat(timespec="seconds") + "Z"
 
 
+def _now_ts() -> int:
+    return int(time.time())
+
+
+def _ts_to_iso(ts: int) -> str:
+    return datetime.utcfromtimestamp(ts).isoformat(timespec="seconds") + "Z"
+
+
+def _iso_to_ts(value: str) -> int:
+    """将 _now_iso 格式的 UTC 时间转换为秒级时间戳。"""
+    parsed = datetime.strptime(value.rstrip("Z"), "%Y-%m-%dT%H:%M:%S")
+    return int((parsed - datetime(1970, 1, 1)).total_seconds())
+
+
+class _ThreadConnection(sqlite3.Connection):
+    """每个线程复用的连接（子类化以支持弱引用登记与关闭标记）。"""
+
+    closed = False
+
+
+_LOCAL = threading.local()
+_OPEN_CONNECTIONS: "weakref.WeakSet[_ThreadConnection]" = weakref.WeakSet()
+_OPEN_CONNECTIONS_LOCK = threading.Lock()
+
+
 def _connect() -> sqlite3.Connection:
-    conn = sqlite3.connect(str(DB_FILE))
+    """返回当前线程复用的连接；调用方用 with 语句负责提交或回滚。"""
+    conn = getattr(_LOCAL, "conn", None)
+    if conn is not None and not conn.closed and getattr(_LOCAL, "db_file", None) == DB_FILE:
+        return conn
+    conn = sqlite3.connect(
+        str(DB_FILE),
+        timeout=SQLITE_BUSY_TIMEOUT,
+        check_same_thread=False,
+        factory=_ThreadConnection,
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA synchronous = NORMAL")
+    _LOCAL.conn = conn
+    _LOCAL.db_file = DB_FILE
+    with _OPEN_CONNECTIONS_LOCK:
+        _OPEN_CONNECTIONS.add(conn)
     return conn
 
 
+def close_connections() -> None:
+    """关闭所有线程复用的连接（用于停机）。"""
+    with _OPEN_CONNECTIONS_LOCK:
+        connections = list(_OPEN_CONNECTIONS)
+        _OPEN_CONNECTIONS.clear()
+    for conn in connections:
+        conn.closed = True
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def _reset_after_fork() -> None:
+    # 子进程不能沿用父进程打开的 SQLite 连接，丢弃后按需重新打开
+    global _LOCAL
+    _LOCAL = threading.local()
+    with _OPEN_CONNECTIONS_LOCK:
+        _OPEN_CONNECTIONS.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class VersionWatch:
+    """cache_versions 中某个版本号的进程内视图。
+
+    多进程部署时，各进程的内存缓存通过它发现其他进程的写入：
+    check() 最多每隔 recheck_interval 秒读一次版本号，变化时调用订阅的失效回调。
+    """
+
+    def __init__(self, name: str, recheck_interval: float = 1.0) -> None:
+        self.name = name
+        self.recheck_interval = float(recheck_interval)
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._callbacks: List[Callable[[], None]] = []
+
+    def subscribe(self, callback: Callable[[], None]) -> None:
+        self._callbacks.append(callback)
+
+    def check(self, max_age: Optional[float] = None) -> None:
+        """max_age 覆盖默认的检查间隔（传 0 表示每次都读取版本号）。"""
+        interval = self.recheck_interval if max_age is None else float(max_age)
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._checked_at < interval:
+                return
+            self._checked_at = now
+        with _connect() as conn:
+            version = _read_version(conn, self.name)
+        with self._lock:
+            # 首次检查前可能已有缓存内容（版本未知），同样视为变化
+            changed = version != self._version
+            self._version = version
+        if changed:
+            for callback in self._callbacks:
+                callback()
+
+    @property
+    def version(self) -> Optional[int]:
+        with self._lock:
+            return self._version
+
+    def note_write(self, version: int) -> None:
+        """本进程写入并递增版本后调用：期间没有其他进程写入时直接推进，避免失效自己的缓存。"""
+        with self._lock:
+            if self._version is not None and version == self._version + 1:
+                self._version = version
+
+
+# 排行/统计类数据（成绩、题目元数据、难度）的版本
+QUERY_VERSION = VersionWatch("queries")
+QUERY_VERSION.subscribe(_QUERY_CACHE.clear)
+# 会话绑定关系的版本
+SESSION_VERSION = VersionWatch("sessions")
+# 上次同步会话绑定时读到的 updated_at 下限（None 表示尚未同步）
+_sessions_synced_at: Optional[str] = None
+# 各进程时钟与写入提交之间的余量（秒）
+SESSION_SYNC_SLACK = 2
+
+
+def _invalidate_rebound_sessions() -> None:
+    """其他进程绑定了会话时，只失效这段时间内重新绑定的会话，其余缓存保持不变。"""
+    global _sessions_synced_at
+    since = _sessions_synced_at
+    _sessions_synced_at = _ts_to_iso(_now_ts() - SESSION_SYNC_SLACK)
+    if since is None:
+        _SESSION_CACHE.clear()
+        return
+    with _connect() as conn:
+        rows = conn.execute("SELECT session_id FROM sessions WHERE updated_at >= ?", (since,)).fetchall()
+    for row in rows:
+        _SESSION_CACHE.invalidate(str(row["session_id"]))
+
+
+SESSION_VERSION.subscribe(_invalidate_rebound_sessions)
+# 每日题安排的版本
+DAILY_SCHEDULE_VERSION = VersionWatch("daily_schedule")
+
+
+def _cached_query(func: Callable) -> Callable:
+    """按 (函数名, 参数) 缓存只读查询结果；返回值为共享对象，调用方不应修改。"""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (func.__name__, tuple(bound.arguments.values()))
+        QUERY_VERSION.check()
+        value = _QUERY_CACHE.get(key)
+        if value is not MISSING:
+            return value
+        generation = _QUERY_CACHE.generation()
+        value = func(*args, **kwargs)
+        _QUERY_CACHE.set(key, value, generation=generation)
+        return value
+
+    return wrapper
+
+
+def _invalidate_queries(*names: str, puzzle_id: Optional[str] = None, version: Optional[int] = None) -> None:
+    """失效指定查询的缓存；传入 puzzle_id 时只失效该题目相关的键。
+
+    version 为写入事务内递增后的 queries 版本号。
+    """
+
+    def matches(key, _value) -> bool:
+        if key[0] not in names:
+            return False
+        return puzzle_id is None or (key[1] and key[1][0] == puzzle_id)
+
+    _QUERY_CACHE.invalidate_where(matches)
+    if version is not None:
+        QUERY_VERSION.note_write(version)
+
+
+def query_data_version() -> Optional[int]:
+    """排行/统计类数据的版本号：本进程写入后立即变化，其他进程的写入最多 1 秒后可见。"""
+    QUERY_VERSION.check()
+    return QUERY_VERSION.version
+
+
+def query_cache_stats() -> Dict[str, object]:
+    """查询缓存的命中统计。"""
+    return _QUERY_CACHE.stats()
+
+
+def session_cache_stats() -> Dict[str, object]:
+    """会话缓存的命中统计。"""
+    return _SESSION_CACHE.stats()
+
+
+def _cache_stats(key: str) -> Dict[tuple, float]:
+    stats = {"query": _QUERY_CACHE.stats(), "session": _SESSION_CACHE.stats()}
+    return {(name,): float(item[key]) for name, item in stats.items()}
+
+
+DB_CALL_SECONDS = REGISTRY.histogram(
+    "hanzi_db_call_seconds",
+    "game/db.py 中各公开函数的耗时（秒，含查询缓存命中与嵌套调用）。",
+    ("function",),
+    buckets=DB_BUCKETS,
+)
+PROGRESS_SAVE_BYTES = REGISTRY.histogram(
+    "hanzi_progress_save_bytes", "每次写回用户进度的 JSON 字节数。", buckets=SIZE_BUCKETS
+)
+REGISTRY.callback(
+    "hanzi_cache_hits_total", "进程内缓存命中次数。", "counter", lambda: _cache_stats("hits"), ("cache",)
+)
+REGISTRY.callback(
+    "hanzi_cache_misses_total", "进程内缓存未命中次数。", "counter", lambda: _cache_stats("misses"), ("cache",)
+)
+REGISTRY.callback("hanzi_cache_entries", "进程内缓存条目数。", "gauge", lambda: _cache_stats("size"), ("cache",))
+
+
 def init_db() -> None:
     """初始化本地 SQLite 数据库（如不存在则创建表）。"""
     DB_FILE.parent.mkdir(parents=True, exist_ok=True)
     with _connect() as conn:
+        # WAL 允许读写并发，多线程下读请求不会被写入阻塞
+        conn.execute("PRAGMA journal_mode = WAL")
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS users (
@@ -42,6 +291,7 @@ def init_db() -> None:
             )
             """
         )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at)")
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS results (
@@ -146,22 +396,175 @@ def init_db() -> None:
             )
             """
         )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS daily_schedule (
+                date TEXT PRIMARY KEY,
+                puzzle_id TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS daily_used (
+                puzzle_id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS user_progress (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 1,
+                updated_at TEXT NOT NULL,
+                FOREIGN KEY(user_id) REFERENCES users(id)
+            )
+            """
+        )
+        _migrate_epoch_columns(conn)
+        _migrate_daily_history(conn)
+
+
+def _migrate_epoch_columns(conn: sqlite3.Connection) -> None:
+    """补充整数时间戳与用时列，并回填历史数据，便于统计查询走索引。"""
+    columns = [
+        ("users", "created_ts", "created_at"),
+        ("users", "last_seen_ts", "last_seen"),
+        ("results", "completed_ts", "completed_at"),
+        ("puzzle_attempts", "first_started_ts", "first_started_at"),
+        ("puzzle_attempts", "last_started_ts", "last_started_at"),
+    ]
+    # 回填只在刚加列时执行一次；之后的写入都会同时写整数列，启动时不必每次扫表
+    added = []
+    for table, column, source in columns:
+        try:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+        except sqlite3.OperationalError:
+            continue
+        added.append((table, column, source))
+    try:
+        conn.execute("ALTER TABLE results ADD COLUMN duration_sec INTEGER")
+        duration_added = True
+    except sqlite3.OperationalError:
+        duration_added = False
+    # ISO 字符串（YYYY-MM-DDTHH:MM:SSZ）可直接交给 strftime('%s') 解析
+    for table, column, source in added:
+        conn.execute(
+            f"""
+            UPDATE {table}
+            SET {column} = CAST(strftime('%s', {source}) AS INTEGER)
+            WHERE {column} IS NULL
+            """
+        )
+    if duration_added:
+        conn.execute(
+            """
+            UPDATE results
+            SET duration_sec = (
+                SELECT MAX(0, results.completed_ts - pa.first_started_ts)
+                FROM puzzle_attempts pa
+                WHERE pa.user_id = results.user_id AND pa.puzzle_id = results.puzzle_id
+            )
+            WHERE duration_sec IS NULL
+            """
+        )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_results_puzzle_completed ON results (puzzle_id, completed_ts)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_results_puzzle_rank ON results (puzzle_id, guess_count, completed_ts)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_last_seen ON users (last_seen_ts)")
+
+
+def _migrate_daily_history(conn: sqlite3.Connection) -> None:
+    """将 settings 中的每日题历史（JSON 数组）迁移到 daily_schedule 表。
+
+    早期没有日期的记录（纯字符串或缺少 date）无法按日期存放，写入 daily_used，仍视为已用过。
+    """
+    rows = conn.execute(
+        """
+        SELECT key, value FROM settings
+        WHERE key IN ('daily_puzzle_history', 'daily_puzzle_date', 'daily_puzzle_id')
+        """
+    ).fetchall()
+    if not rows:
+        return
+    values = {str(row["key"]): str(row["value"]) for row in rows}
+    entries = []
+    undated = []
+    try:
+        history = json.loads(values.get("daily_puzzle_history") or "[]")
+    except json.JSONDecodeError:
+        history = []
+    if isinstance(history, list):
+        for item in history:
+            if isinstance(item, str):
+                date_str, puzzle_id = "", item.strip()
+            elif isinstance(item, dict):
+                date_str = str(item.get("date", "")).strip()
+                puzzle_id = str(item.get("puzzle_id", "")).strip()
+            else:
+                continue
+            if not puzzle_id:
+                continue
+            if date_str:
+                entries.append((date_str, puzzle_id))
+            else:
+                undated.append(puzzle_id)
+    if values.get("daily_puzzle_date") and values.get("daily_puzzle_id"):
+        entries.append((values["daily_puzzle_date"], values["daily_puzzle_id"]))
+    now = _now_iso()
+    conn.executemany(
+        "INSERT OR IGNORE INTO daily_schedule (date, puzzle_id, created_at) VALUES (?, ?, ?)",
+        [(date_str, puzzle_id, now) for date_str, puzzle_id in entries],
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO daily_used (puzzle_id, created_at) VALUES (?, ?)",
+        [(puzzle_id, now) for puzzle_id in undated],
+    )
+    conn.execute(
+        """
+        DELETE FROM settings
+        WHERE key IN ('daily_puzzle_history', 'daily_puzzle_date', 'daily_puzzle_id')
+        """
+    )
+    _bump_version(conn, "settings")
 
 
 def upsert_user(nickname: str) -> Dict[str, object]:
     """创建或更新用户，并返回用户信息。"""
-    now = _now_iso()
+    now_ts = _now_ts()
+    now = _ts_to_iso(now_ts)
     with _connect() as conn:
         row = conn.execute("SELECT id FROM users WHERE nickname = ?", (nickname,)).fetchone()
         if row:
-            conn.execute("UPDATE users SET last_seen = ? WHERE id = ?", (now, row["id"]))
+            conn.execute(
+                "UPDATE users SET last_seen = ?, last_seen_ts = ? WHERE id = ?",
+                (now, now_ts, row["id"]),
+            )
             user_id = row["id"]
         else:
             cursor = conn.execute(
-                "INSERT INTO users (nickname, created_at, last_seen) VALUES (?, ?, ?)",
-                (nickname, now, now),
+                """
+                INSERT INTO users (nickname, created_at, last_seen, created_ts, last_seen_ts)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (nickname, now, now, now_ts, now_ts),
             )
             user_id = cursor.lastrowid
+    _SESSION_CACHE.invalidate_where(lambda _key, user: user["id"] == user_id)
     return {"id": user_id, "nickname": nickname}
 
 
@@ -177,10 +580,18 @@ def bind_session(session_id: str, user_id: int) -> None:
             """,
             (session_id, user_id, now),
         )
+        version = _bump_version(conn, "sessions")
+    _SESSION_CACHE.invalidate(session_id)
+    SESSION_VERSION.note_write(version)
 
 
 def get_user_by_session(session_id: str) -> Optional[Dict[str, object]]:
-    """通过 session_id 获取用户信息。"""
+    """通过 session_id 获取用户信息（带 TTL 缓存）。"""
+    SESSION_VERSION.check()
+    cached = _SESSION_CACHE.get(session_id)
+    if cached is not MISSING:
+        return dict(cached)
+    generation = _SESSION_CACHE.generation()
     with _connect() as conn:
         row = conn.execute(
             """
@@ -193,7 +604,9 @@ def get_user_by_session(session_id: str) -> Optional[Dict[str, object]]:
         ).fetchone()
         if not row:
             return None
-        return {"id": row["id"], "nickname": row["nickname"]}
+        user = {"id": row["id"], "nickname": row["nickname"]}
+    _SESSION_CACHE.set(session_id, user, generation=generation)
+    return dict(user)
 
 
 def get_user_id_by_session(session_id: str) -> Optional[int]:
@@ -208,27 +621,194 @@ def get_user_id_by_session(session_id: str) -> Optional[int]:
         return int(row["user_id"])
 
 
-def record_result(user_id: int, puzzle_id: str, guess_count: int) -> None:
-    """记录成绩（仅在更优成绩时更新）。"""
-    now = _now_iso()
+def get_progress_version(user_id: int) -> int:
+    """读取用户进度的版本号（无记录时为 0），用于判断进程内缓存是否过期。"""
+    with _connect() as conn:
+        row = conn.execute("SELECT version FROM user_progress WHERE user_id = ?", (user_id,)).fetchone()
+        return int(row["version"]) if row else 0
+
+
+def load_user_progress(user_id: int) -> Optional[Dict[str, object]]:
+    """读取用户进度，返回 {"data": 进度字典, "version": 版本号}。"""
     with _connect() as conn:
         row = conn.execute(
-            "SELECT guess_count FROM results WHERE user_id = ? AND puzzle_id = ?",
-            (user_id, puzzle_id),
+            "SELECT data, version FROM user_progress WHERE user_id = ?",
+            (user_id,),
         ).fetchone()
-        if row is None:
-            conn.execute(
-                "INSERT INTO results (user_id, puzzle_id, guess_count, completed_at) VALUES (?, ?, ?, ?)",
-                (user_id, puzzle_id, guess_count, now),
+        if not row:
+            return None
+        try:
+            data = json.loads(row["data"])
+        except json.JSONDecodeError:
+            data = {}
+        return {"data": data if isinstance(data, dict) else {}, "version": int(row["version"])}
+
+
+def save_user_progress(user_id: int, data: Dict[str, object], expected_version: int) -> Optional[int]:
+    """按版本号写回用户进度（乐观并发控制）。
+
+    expected_version 为读取时的版本号；期间被其他进程修改过时不写入并返回 None，
+    成功时返回新版本号。
+    """
+    payload = json.dumps(data, ensure_ascii=False)
+    PROGRESS_SAVE_BYTES.observe(len(payload.encode("utf-8")))
+    now = _now_iso()
+    with _connect() as conn:
+        if expected_version <= 0:
+            cursor = conn.execute(
+                """
+                INSERT OR IGNORE INTO user_progress (user_id, data, version, updated_at)
+                VALUES (?, ?, 1, ?)
+                """,
+                (user_id, payload, now),
             )
-            return
-        if guess_count < row["guess_count"]:
-            conn.execute(
-                "UPDATE results SET guess_count = ?, completed_at = ? WHERE user_id = ? AND puzzle_id = ?",
-                (guess_count, now, user_id, puzzle_id),
+            return 1 if cursor.rowcount else None
+        cursor = conn.execute(
+            """
+            UPDATE user_progress
+            SET data = ?, version = version + 1, updated_at = ?
+            WHERE user_id = ? AND version = ?
+            """,
+            (payload, now, user_id, expected_version),
+        )
+        return expected_version + 1 if cursor.rowcount else None
+
+
+def remove_puzzle_progress(puzzle_id: str) -> int:
+    """从所有用户进度中移除某道题（题目被覆盖或删除时），返回受影响的用户数。"""
+    path = '$.games."' + puzzle_id.replace('"', "") + '"'
+    now = _now_iso()
+    with _connect() as conn:
+        cursor = conn.execute(
+            """
+            UPDATE user_progress
+            SET data = json_set(
+                    json_remove(data, ?),
+                    '$.current_id',
+                    CASE WHEN json_extract(data, '$.current_id') = ? THEN NULL
+                         ELSE json_extract(data, '$.current_id') END
+                ),
+                version = version + 1,
+                updated_at = ?
+            WHERE json_type(data, ?) IS NOT NULL
+            """,
+            (path, puzzle_id, now, path),
+        )
+        return int(cursor.rowcount)
+
+
+def count_user_progress() -> int:
+    with _connect() as conn:
+        row = conn.execute("SELECT COUNT(*) AS total FROM user_progress").fetchone()
+        return int(row["total"])
+
+
+def import_user_progress(entries: Dict[int, Dict[str, object]]) -> None:
+    """导入旧版 sessions.json 中的进度；已有记录的用户保持不变。"""
+    if not entries:
+        return
+    now = _now_iso()
+    with _connect() as conn:
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO user_progress (user_id, data, version, updated_at)
+            VALUES (?, ?, 1, ?)
+            """,
+            [(int(user_id), json.dumps(data, ensure_ascii=False), now) for user_id, data in entries.items()],
+        )
+
+
+def record_result(
+    user_id: int, puzzle_id: str, guess_count: int, started_ts: Optional[int] = None
+) -> Optional[Dict[str, object]]:
+    """记录成绩（仅在更优成绩时更新），同时写入用时（秒）。
+
+    用时从 puzzle_attempts 的首次开局时间算起；开局记录尚未落库时使用 started_ts（缓冲中的时间）。
+
+    成绩有更新时返回写入的 guess_count/completed_at/completed_ts 与该题成绩的版本号 version，否则返回 None。
+    单条 UPSERT 完成比较与写入，多个进程同时提交同一成绩也不会冲突。
+    """
+    now_ts = _now_ts()
+    now = _ts_to_iso(now_ts)
+    with _connect() as conn:
+        cursor = conn.execute(
+            """
+            INSERT INTO results (user_id, puzzle_id, guess_count, completed_at, completed_ts, duration_sec)
+            VALUES (
+                ?, ?, ?, ?, ?,
+                MAX(0, ? - COALESCE(
+                    (
+                        SELECT first_started_ts
+                        FROM puzzle_attempts
+                        WHERE user_id = ? AND puzzle_id = ?
+                    ),
+                    ?
+                ))
             )
+            ON CONFLICT(user_id, puzzle_id) DO UPDATE SET
+                guess_count = excluded.guess_count,
+                completed_at = excluded.completed_at,
+                completed_ts = excluded.completed_ts,
+                duration_sec = excluded.duration_sec
+            WHERE excluded.guess_count < results.guess_count
+            """,
+            (user_id, puzzle_id, guess_count, now, now_ts, now_ts, user_id, puzzle_id, started_ts),
+        )
+        if not cursor.rowcount:
+            return None
+        version = _bump_version(conn, "queries")
+        results_version = _bump_version(conn, _results_version_name(puzzle_id))
+    _invalidate_queries(
+        "get_leaderboard",
+        "get_leaderboard_between",
+        "get_completion_count_between",
+        puzzle_id=puzzle_id,
+    )
+    _invalidate_queries(
+        "list_overall_leaderboard",
+        "list_author_stats",
+        "list_puzzle_difficulty_stats",
+        version=version,
+    )
+    return {"guess_count": guess_count, "completed_at": now, "completed_ts": now_ts, "version": results_version}
+
+
+def _results_version_name(puzzle_id: str) -> str:
+    return f"results:{puzzle_id}"
+
+
+def get_results_version(puzzle_id: str) -> int:
+    """单题成绩的版本号：该题有成绩写入时递增，用于判断内存排行榜是否过期。"""
+    with _connect() as conn:
+        return _read_version(conn, _results_version_name(puzzle_id))
+
+
+def list_puzzle_results(puzzle_id: str) -> List[Dict[str, object]]:
+    """获取单题全部成绩（用于构建内存排行榜）。"""
+    with _connect() as conn:
+        rows = conn.execute(
+            """
+            SELECT results.user_id, users.nickname, results.guess_count,
+                   results.completed_at, results.completed_ts
+            FROM results
+            JOIN users ON users.id = results.user_id
+            WHERE results.puzzle_id = ?
+            """,
+            (puzzle_id,),
+        ).fetchall()
+        return [
+            {
+                "user_id": row["user_id"],
+                "nickname": row["nickname"],
+                "guess_count": row["guess_count"],
+                "completed_at": row["completed_at"],
+                "completed_ts": row["completed_ts"],
+            }
+            for row in rows
+        ]
 
 
+@_cached_query
 def get_leaderboard(puzzle_id: str, limit: int = 10) -> List[Dict[str, object]]:
     """获取单题排行榜。"""
     with _connect() as conn:
@@ -238,7 +818,7 @@ def get_leaderboard(puzzle_id: str, limit: int = 10) -> List[Dict[str, object]]:
             FROM results
             JOIN users ON users.id = results.user_id
             WHERE results.puzzle_id = ?
-            ORDER BY results.guess_count ASC, results.completed_at ASC
+            ORDER BY results.guess_count ASC, results.completed_ts ASC
             LIMIT ?
             """,
             (puzzle_id, limit),
@@ -249,6 +829,7 @@ def get_leaderboard(puzzle_id: str, limit: int = 10) -> List[Dict[str, object]]:
         ]
 
 
+@_cached_query
 def get_leaderboard_between(
     puzzle_id: str, start_iso: str, end_iso: str, limit: int = 10
 ) -> List[Dict[str, object]]:
@@ -259,11 +840,11 @@ def get_leaderboard_between(
             SELECT users.nickname, results.guess_count, results.completed_at
             FROM results
             JOIN users ON users.id = results.user_id
-            WHERE results.puzzle_id = ? AND results.completed_at >= ? AND results.completed_at < ?
-            ORDER BY results.guess_count ASC, results.completed_at ASC
+            WHERE results.puzzle_id = ? AND results.completed_ts >= ? AND results.completed_ts < ?
+            ORDER BY results.guess_count ASC, results.completed_ts ASC
             LIMIT ?
             """,
-            (puzzle_id, start_iso, end_iso, limit),
+            (puzzle_id, _iso_to_ts(start_iso), _iso_to_ts(end_iso), limit),
         ).fetchall()
         return [
             {"nickname": row["nickname"], "guess_count": row["guess_count"], "completed_at": row["completed_at"]}
@@ -271,6 +852,7 @@ def get_leaderboard_between(
         ]
 
 
+@_cached_query
 def get_completion_count_between(puzzle_id: str, start_iso: str, end_iso: str) -> int:
     """统计时间范围内的通关次数。"""
     with _connect() as conn:
@@ -278,9 +860,9 @@ def get_completion_count_between(puzzle_id: str, start_iso: str, end_iso: str) -
             """
             SELECT COUNT(*) AS total
             FROM results
-            WHERE puzzle_id = ? AND completed_at >= ? AND completed_at < ?
+            WHERE puzzle_id = ? AND completed_ts >= ? AND completed_ts < ?
             """,
-            (puzzle_id, start_iso, end_iso),
+            (puzzle_id, _iso_to_ts(start_iso), _iso_to_ts(end_iso)),
         ).fetchone()
         if not row:
             return 0
@@ -290,6 +872,43 @@ def get_completion_count_between(puzzle_id: str, start_iso: str, end_iso: str) -
             return 0
 
 
+# 每条区间占 4 个参数，保持在 SQLite 默认参数上限（999）以内
+_RANGE_CHUNK_SIZE = 200
+
+
+def count_completions_by_ranges(ranges: List[tuple]) -> Dict[str, int]:
+    """按 (key, puzzle_id, start_iso, end_iso) 区间批量统计通关次数。
+
+    同一连接内以 VALUES 表连接 results 分组计数，区间数量再多也只需少量查询。
+    """
+    counts = {str(item[0]): 0 for item in ranges}
+    if not ranges:
+        return counts
+    with _connect() as conn:
+        for offset in range(0, len(ranges), _RANGE_CHUNK_SIZE):
+            chunk = ranges[offset : offset + _RANGE_CHUNK_SIZE]
+            placeholders = ", ".join(["(?, ?, ?, ?)"] * len(chunk))
+            params: List[object] = []
+            for key, puzzle_id, start_iso, end_iso in chunk:
+                params.extend([str(key), str(puzzle_id), _iso_to_ts(start_iso), _iso_to_ts(end_iso)])
+            rows = conn.execute(
+                f"""
+                WITH ranges(range_key, puzzle_id, start_ts, end_ts) AS (VALUES {placeholders})
+                SELECT ranges.range_key AS range_key, COUNT(results.id) AS total
+                FROM ranges
+                LEFT JOIN results
+                  ON results.puzzle_id = ranges.puzzle_id
+                 AND results.completed_ts >= ranges.start_ts
+                 AND results.completed_ts < ranges.end_ts
+                GROUP BY ranges.range_key
+                """,
+                params,
+            ).fetchall()
+            for row in rows:
+                counts[str(row["range_key"])] = int(row["total"] or 0)
+    return counts
+
+
 def list_ai_profiles(include_secret: bool = False) -> List[Dict[str, object]]:
     """获取 AI 配置列表。"""
     with _connect() as conn:
@@ -402,7 +1021,7 @@ def list_users(limit: int = 100) -> List[Dict[str, object]]:
             """
             SELECT id, nickname, created_at, last_seen
             FROM users
-            ORDER BY last_seen DESC
+            ORDER BY last_seen_ts DESC
             LIMIT ?
             """,
             (limit,),
@@ -430,6 +1049,22 @@ def get_puzzle_author_id(puzzle_id: str) -> Optional[int]:
         return int(row["author_id"])
 
 
+def list_puzzle_meta() -> Dict[str, Dict[str, object]]:
+    """一次取出所有题目的作者、管理员难度与每日题标记（没有记录的题目视为未归属）。"""
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT puzzle_id, author_id, admin_difficulty, is_daily FROM puzzle_meta"
+        ).fetchall()
+        return {
+            str(row["puzzle_id"]): {
+                "author_id": int(row["author_id"]),
+                "admin_difficulty": str(row["admin_difficulty"] or ""),
+                "is_daily": bool(row["is_daily"]),
+            }
+            for row in rows
+        }
+
+
 def list_puzzle_ids_by_author(author_id: int) -> List[str]:
     """列出指定作者创建的题目 id。"""
     with _connect() as conn:
@@ -468,76 +1103,95 @@ def touch_puzzle_meta(puzzle_id: str, author_id: int) -> None:
             """,
             (puzzle_id, author_id, now, now),
         )
+        version = _bump_version(conn, "queries")
+    _invalidate_queries("list_author_stats", "list_puzzle_difficulty_stats", version=version)
 
 
 def delete_puzzle_meta(puzzle_id: str) -> None:
     """删除题目作者记录。"""
     with _connect() as conn:
         conn.execute("DELETE FROM puzzle_meta WHERE puzzle_id = ?", (puzzle_id,))
+        version = _bump_version(conn, "queries")
+    _invalidate_queries("list_author_stats", "list_puzzle_difficulty_stats", version=version)
+
+
+_TELEMETRY_UPSERT_SQL = """
+    INSERT INTO puzzle_attempts
+    (puzzle_id, user_id, attempts, total_guesses, correct_guesses,
+     first_started_at, last_started_at, first_started_ts, last_started_ts)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(puzzle_id, user_id) DO UPDATE SET
+        attempts = attempts + excluded.attempts,
+        total_guesses = total_guesses + excluded.total_guesses,
+        correct_guesses = correct_guesses + excluded.correct_guesses,
+        last_started_at = CASE WHEN excluded.attempts > 0 THEN excluded.last_started_at ELSE last_started_at END,
+        last_started_ts = CASE WHEN excluded.attempts > 0 THEN excluded.last_started_ts ELSE last_started_ts END
+"""
+
+
+def _telemetry_row(
+    puzzle_id: str, user_id: int, attempts: int, total: int, correct: int, first_ts: int, last_ts: int
+) -> tuple:
+    return (
+        puzzle_id,
+        user_id,
+        attempts,
+        total,
+        correct,
+        _ts_to_iso(first_ts),
+        _ts_to_iso(last_ts),
+        first_ts,
+        last_ts,
+    )
 
 
 def record_puzzle_attempt(user_id: int, puzzle_id: str) -> None:
     """记录一次开局尝试。"""
-    now = _now_iso()
+    now_ts = _now_ts()
     with _connect() as conn:
-        row = conn.execute(
-            "SELECT attempts FROM puzzle_attempts WHERE puzzle_id = ? AND user_id = ?",
-            (puzzle_id, user_id),
-        ).fetchone()
-        if row:
-            attempts = int(row["attempts"]) + 1
-            conn.execute(
-                """
-                UPDATE puzzle_attempts
-                SET attempts = ?, last_started_at = ?
-                WHERE puzzle_id = ? AND user_id = ?
-                """,
-                (attempts, now, puzzle_id, user_id),
-            )
-            return
-        conn.execute(
-            """
-            INSERT INTO puzzle_attempts (puzzle_id, user_id, attempts, first_started_at, last_started_at)
-            VALUES (?, ?, 1, ?, ?)
-            """,
-            (puzzle_id, user_id, now, now),
-        )
+        conn.execute(_TELEMETRY_UPSERT_SQL, _telemetry_row(puzzle_id, user_id, 1, 0, 0, now_ts, now_ts))
 
 
 def record_puzzle_guess(user_id: int, puzzle_id: str, status: str) -> None:
     """记录一次有效猜测的命中情况。"""
     if status not in ("correct", "wrong"):
         return
-    now = _now_iso()
+    now_ts = _now_ts()
+    correct = 1 if status == "correct" else 0
     with _connect() as conn:
-        row = conn.execute(
-            """
-            SELECT total_guesses, correct_guesses
-            FROM puzzle_attempts
-            WHERE puzzle_id = ? AND user_id = ?
-            """,
-            (puzzle_id, user_id),
-        ).fetchone()
-        if row:
-            total = int(row["total_guesses"]) + 1
-            correct = int(row["correct_guesses"]) + (1 if status == "correct" else 0)
-            conn.execute(
-                """
-                UPDATE puzzle_attempts
-                SET total_guesses = ?, correct_guesses = ?
-                WHERE puzzle_id = ? AND user_id = ?
-                """,
-                (total, correct, puzzle_id, user_id),
-            )
-            return
-        conn.execute(
-            """
-            INSERT INTO puzzle_attempts
-            (puzzle_id, user_id, attempts, total_guesses, correct_guesses, first_started_at, last_started_at)
-            VALUES (?, ?, 0, 1, ?, ?, ?)
-            """,
-            (puzzle_id, user_id, 1 if status == "correct" else 0, now, now),
+        conn.execute(_TELEMETRY_UPSERT_SQL, _telemetry_row(puzzle_id, user_id, 0, 1, correct, now_ts, now_ts))
+
+
+def flush_puzzle_telemetry(entries: List[Dict[str, object]]) -> None:
+    """在一个事务内批量累加开局与猜测统计。
+
+    entries 中每项包含 puzzle_id/user_id/attempts/total_guesses/correct_guesses/
+    first_ts/last_ts，其中 last_ts 仅在 attempts > 0 时更新最近开局时间。
+    写入后失效依赖这些统计的榜单查询，并递增 queries 版本供其他进程与响应缓存发现。
+    """
+    if not entries:
+        return
+    rows = [
+        _telemetry_row(
+            str(item["puzzle_id"]),
+            int(item["user_id"]),
+            int(item["attempts"]),
+            int(item["total_guesses"]),
+            int(item["correct_guesses"]),
+            int(item["first_ts"]),
+            int(item["last_ts"]),
         )
+        for item in entries
+    ]
+    with _connect() as conn:
+        conn.executemany(_TELEMETRY_UPSERT_SQL, rows)
+        version = _bump_version(conn, "queries")
+    _invalidate_queries(
+        "list_overall_leaderboard",
+        "list_author_stats",
+        "list_puzzle_difficulty_stats",
+        version=version,
+    )
 
 
 def get_daily_checkin(user_id: int, date_str: str) -> Optional[Dict[str, int]]:
@@ -629,6 +1283,8 @@ def set_admin_difficulty(puzzle_id: str, difficulty: Optional[str]) -> None:
             """,
             (difficulty, now, puzzle_id),
         )
+        version = _bump_version(conn, "queries")
+    _invalidate_queries("list_puzzle_difficulty_stats", version=version)
 
 
 def set_daily_flag(puzzle_id: str, is_daily: bool) -> None:
@@ -645,6 +1301,22 @@ def set_daily_flag(puzzle_id: str, is_daily: bool) -> None:
         )
 
 
+def demote_played_daily_puzzles() -> List[str]:
+    """把已被游玩过（开局或通关）的题目移出每日题池，返回被移出的题目 id。"""
+    now = _now_iso()
+    played = """
+        is_daily = 1 AND (
+            puzzle_id IN (SELECT puzzle_id FROM puzzle_attempts)
+            OR puzzle_id IN (SELECT puzzle_id FROM results)
+        )
+    """
+    with _connect() as conn:
+        rows = conn.execute(f"SELECT puzzle_id FROM puzzle_meta WHERE {played}").fetchall()
+        if rows:
+            conn.execute(f"UPDATE puzzle_meta SET is_daily = 0, updated_at = ? WHERE {played}", (now,))
+        return [str(row["puzzle_id"]) for row in rows]
+
+
 def list_daily_puzzle_ids() -> List[str]:
     """获取所有标记为每日题的题目 id。"""
     with _connect() as conn:
@@ -657,6 +1329,57 @@ def list_daily_puzzle_ids() -> List[str]:
         return [str(row["puzzle_id"]) for row in rows]
 
 
+def list_daily_schedule(start_date: str, end_date: str) -> Dict[str, str]:
+    """获取日期区间 [start_date, end_date] 内的每日题安排。"""
+    with _connect() as conn:
+        rows = conn.execute(
+            """
+            SELECT date, puzzle_id FROM daily_schedule
+            WHERE date >= ? AND date <= ?
+            """,
+            (start_date, end_date),
+        ).fetchall()
+        return {str(row["date"]): str(row["puzzle_id"]) for row in rows}
+
+
+def list_scheduled_puzzle_ids() -> List[str]:
+    """获取所有已被安排为每日题的题目 id（含已过去与预排的日期，以及旧版历史中无日期的记录）。"""
+    with _connect() as conn:
+        rows = conn.execute(
+            """
+            SELECT puzzle_id FROM daily_schedule
+            UNION
+            SELECT puzzle_id FROM daily_used
+            """
+        ).fetchall()
+        return [str(row["puzzle_id"]) for row in rows]
+
+
+def add_daily_schedule(entries: List[tuple]) -> None:
+    """写入 (date, puzzle_id) 安排；日期已存在时保留原安排。"""
+    if not entries:
+        return
+    now = _now_iso()
+    with _connect() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO daily_schedule (date, puzzle_id, created_at) VALUES (?, ?, ?)",
+            [(str(date_str), str(puzzle_id), now) for date_str, puzzle_id in entries],
+        )
+        version = _bump_version(conn, "daily_schedule")
+    DAILY_SCHEDULE_VERSION.note_write(version)
+
+
+def delete_daily_schedule(date_str: str, include_later: bool = False) -> None:
+    """删除指定日期（可选含之后所有日期）的每日题安排。"""
+    with _connect() as conn:
+        if include_later:
+            conn.execute("DELETE FROM daily_schedule WHERE date >= ?", (date_str,))
+        else:
+            conn.execute("DELETE FROM daily_schedule WHERE date = ?", (date_str,))
+        version = _bump_version(conn, "daily_schedule")
+    DAILY_SCHEDULE_VERSION.note_write(version)
+
+
 def list_played_puzzle_ids() -> List[str]:
     """获取曾被游玩过的题目 id（开局或通关）。"""
     with _connect() as conn:
@@ -696,6 +1419,8 @@ def upsert_difficulty_vote(user_id: int, puzzle_id: str, difficulty: int) -> Non
             """,
             (puzzle_id, user_id, difficulty, now),
         )
+        version = _bump_version(conn, "queries")
+    _invalidate_queries("list_puzzle_difficulty_stats", version=version)
 
 
 def get_difficulty_vote(user_id: int, puzzle_id: str) -> Optional[int]:
@@ -726,6 +1451,7 @@ def has_result(user_id: int, puzzle_id: str) -> bool:
         return bool(row)
 
 
+@_cached_query
 def list_puzzle_difficulty_stats(limit: int = 50) -> List[Dict[str, object]]:
     """获取题目难度排行榜数据。"""
     with _connect() as conn:
@@ -747,13 +1473,8 @@ def list_puzzle_difficulty_stats(limit: int = 50) -> List[Dict[str, object]]:
                     COUNT(results.id) AS completion_count,
                     COUNT(DISTINCT results.user_id) AS player_count,
                     AVG(results.guess_count) AS avg_guesses,
-                    AVG(
-                        (julianday(replace(replace(results.completed_at, 'T', ' '), 'Z', '')) -
-                         julianday(replace(replace(pa.first_started_at, 'T', ' '), 'Z', ''))) * 86400
-                    ) AS avg_duration
+                    AVG(results.duration_sec) AS avg_duration
                 FROM results
-                LEFT JOIN puzzle_attempts pa
-                    ON pa.user_id = results.user_id AND pa.puzzle_id = results.puzzle_id
                 GROUP BY results.puzzle_id
             ),
             vote_stats AS (
@@ -807,34 +1528,24 @@ def list_puzzle_difficulty_stats(limit: int = 50) -> List[Dict[str, object]]:
         return output
 
 
+@_cached_query
 def list_overall_leaderboard(limit: int = 50) -> List[Dict[str, object]]:
     """获取玩家总榜数据。"""
     with _connect() as conn:
         rows = conn.execute(
             """
-            WITH durations AS (
-                SELECT
-                    results.user_id AS user_id,
-                    results.puzzle_id AS puzzle_id,
-                    (julianday(replace(replace(results.completed_at, 'T', ' '), 'Z', '')) -
-                     julianday(replace(replace(pa.first_started_at, 'T', ' '), 'Z', ''))) * 86400 AS duration_sec
-                FROM results
-                LEFT JOIN puzzle_attempts pa
-                  ON pa.user_id = results.user_id AND pa.puzzle_id = results.puzzle_id
-            )
             SELECT
                 users.id AS user_id,
                 users.nickname AS nickname,
                 COUNT(results.id) AS completion_count,
                 AVG(results.guess_count) AS avg_guesses,
-                AVG(durations.duration_sec) AS avg_duration,
+                AVG(results.duration_sec) AS avg_duration,
                 COALESCE(SUM(pa.total_guesses), 0) AS total_guesses,
                 COALESCE(SUM(pa.correct_guesses), 0) AS correct_guesses
             FROM users
             JOIN results ON results.user_id = users.id
             LEFT JOIN puzzle_attempts pa
               ON pa.user_id = users.id AND pa.puzzle_id = results.puzzle_id
-            LEFT JOIN durations ON durations.user_id = results.user_id AND durations.puzzle_id = results.puzzle_id
             GROUP BY users.id, users.nickname
             ORDER BY completion_count DESC, avg_guesses ASC, avg_duration ASC
             LIMIT ?
@@ -856,6 +1567,7 @@ def list_overall_leaderboard(limit: int = 50) -> List[Dict[str, object]]:
             )
         return output
 
+@_cached_query
 def list_author_stats(limit: int = 50) -> List[Dict[str, object]]:
     """出题排行榜数据。"""
     with _connect() as conn:
@@ -921,6 +1633,58 @@ def list_author_stats(limit: int = 50) -> List[Dict[str, object]]:
         return output
 
 
+def _read_version(conn: sqlite3.Connection, name: str) -> int:
+    row = conn.execute("SELECT version FROM cache_versions WHERE name = ?", (name,)).fetchone()
+    return int(row["version"]) if row else 0
+
+
+def _bump_version(conn: sqlite3.Connection, name: str) -> int:
+    """在当前事务内递增版本号，供其他进程发现缓存已过期。"""
+    conn.execute(
+        """
+        INSERT INTO cache_versions (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+        """,
+        (name,),
+    )
+    return _read_version(conn, name)
+
+
+def _load_settings() -> Dict[str, str]:
+    """返回全局配置缓存，必要时从数据库重新加载。"""
+    global _settings_cache, _settings_version, _settings_checked_at
+    with _SETTINGS_LOCK:
+        now = time.monotonic()
+        if _settings_cache is not None and now - _settings_checked_at < SETTINGS_RECHECK_INTERVAL:
+            return _settings_cache
+        with _connect() as conn:
+            version = _read_version(conn, "settings")
+            if _settings_cache is None or version != _settings_version:
+                rows = conn.execute("SELECT key, value FROM settings").fetchall()
+                _settings_cache = {str(row["key"]): str(row["value"]) for row in rows}
+                _settings_version = version
+        _settings_checked_at = now
+        return _settings_cache
+
+
+def _apply_setting_write(version: int, key: str, value: Optional[str]) -> None:
+    """写入后同步缓存；若期间有其他进程修改过，则整表重新加载。"""
+    global _settings_cache, _settings_version
+    with _SETTINGS_LOCK:
+        if _settings_cache is None:
+            return
+        if version != _settings_version + 1:
+            _settings_cache = None
+            return
+        updated = dict(_settings_cache)
+        if value is None:
+            updated.pop(key, None)
+        else:
+            updated[key] = value
+        _settings_cache = updated
+        _settings_version = version
+
+
 def set_setting(key: str, value: str) -> None:
     """设置全局配置项。"""
     now = _now_iso()
@@ -933,18 +1697,70 @@ def set_setting(key: str, value: str) -> None:
             """,
             (key, value, now),
         )
+        version = _bump_version(conn, "settings")
+    _apply_setting_write(version, key, str(value))
 
 
 def get_setting(key: str) -> Optional[str]:
-    """获取全局配置项。"""
-    with _connect() as conn:
-        row = conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
-        if not row:
-            return None
-        return str(row["value"])
+    """获取全局配置项（读取进程内缓存）。"""
+    return _load_settings().get(key)
 
 
 def clear_setting(key: str) -> None:
     """删除全局配置项。"""
     with _connect() as conn:
         conn.execute("DELETE FROM settings WHERE key = ?", (key,))
+        version = _bump_version(conn, "settings")
+    _apply_setting_write(version, key, None)
+
+
+# 当前线程累计的数据库耗时：只统计最外层调用，嵌套调用不重复计入
+_DB_TIME = threading.local()
+
+
+def take_db_time() -> Tuple[float, int]:
+    """返回并清零当前线程累计的数据库耗时（秒）与调用次数，供访问日志按请求统计。"""
+    seconds = getattr(_DB_TIME, "seconds", 0.0)
+    calls = getattr(_DB_TIME, "calls", 0)
+    _DB_TIME.seconds = 0.0
+    _DB_TIME.calls = 0
+    return seconds, calls
+
+
+def _timed(func: Callable) -> Callable:
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        depth = getattr(_DB_TIME, "depth", 0)
+        _DB_TIME.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            _DB_TIME.depth = depth
+            if not depth:
+                _DB_TIME.seconds = getattr(_DB_TIME, "seconds", 0.0) + elapsed
+                _DB_TIME.calls = getattr(_DB_TIME, "calls", 0) + 1
+            DB_CALL_SECONDS.observe(elapsed, function=name)
+
+    return wrapper
+
+
+# 读取统计的函数本身不计入耗时
+_UNTIMED_FUNCTIONS = frozenset({"take_db_time"})
+
+
+def _instrument_public_functions() -> None:
+    """为本模块的公开函数统一加上耗时统计（模块内部的相互调用同样经过统计）。"""
+    module = sys.modules[__name__]
+    for name, value in list(vars(module).items()):
+        if name.startswith("_") or name in _UNTIMED_FUNCTIONS:
+            continue
+        if not inspect.isfunction(value) or value.__module__ != __name__:
+            continue
+        setattr(module, name, _timed(value))
+
+
+_instrument_public_functions()
@@ -236,3 +236,40 @@ class Game:
                 continue
             return ch
         return None
+
+
+# 只按位置揭示字符、长度不变的字段
+_MASKED_FIELDS = ("title_masked", "body_masked")
+
+
+def state_delta(old: Optional[Dict[str, object]], new: Optional[Dict[str, object]]) -> Dict[str, object]:
+    """计算两次 get_state() 之间的增量，用于长连接上只发送变化的部分。
+
+    - full: 无法增量时（首次发送、换题、无进行中的游戏）直接给出完整状态
+    - set: 取值变化的字段
+    - append: 只在末尾追加了元素的列表字段（已猜的字）
+    - reveal: 遮罩文本中被揭示的位置，[[下标, 字符], ...]，下标按字符计
+    """
+    if old is None or new is None or old.get("puzzle_id") != new.get("puzzle_id"):
+        return {"full": new}
+    changed: Dict[str, object] = {}
+    append: Dict[str, List[object]] = {}
+    reveal: Dict[str, List[List[object]]] = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if previous == value:
+            continue
+        if key in _MASKED_FIELDS and isinstance(previous, str) and isinstance(value, str) and len(previous) == len(value):
+            reveal[key] = [[index, ch] for index, (before, ch) in enumerate(zip(previous, value)) if before != ch]
+        elif isinstance(previous, list) and isinstance(value, list) and value[: len(previous)] == previous:
+            append[key] = value[len(previous) :]
+        else:
+            changed[key] = value
+    delta: Dict[str, object] = {}
+    if changed:
+        delta["set"] = changed
+    if append:
+        delta["append"] = append
+    if reveal:
+        delta["reveal"] = reveal
+    return delta
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple
+
+from .db import VersionWatch
+
+# 没有新数据时每隔多少秒发一条注释行，及时发现断开的连接，也防止代理因空闲断开
+HEARTBEAT_INTERVAL = 15.0
+HEARTBEAT = b": ping\n\n"
+# 断线后浏览器 EventSource 的重连间隔（毫秒）
+RETRY_MS = 3000
+
+
+def format_event(event: str, payload: dict) -> bytes:
+    """编码一条 SSE 消息（data 为单行 JSON）。"""
+    data = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return f"event: {event}\ndata: {data}\n\n".encode("utf-8")
+
+
+class TooManySubscribers(RuntimeError):
+    pass
+
+
+class Subscription:
+    """一个 SSE 连接的待发送队列。
+
+    推送的都是完整快照，同一主题只保留最新一条：客户端读得慢时丢掉的是过期数据，
+    队列长度不会超过订阅的主题数。
+    """
+
+    heartbeat_interval = HEARTBEAT_INTERVAL
+    heartbeat = HEARTBEAT
+
+    def __init__(self, broadcaster: "EventBroadcaster", topics: Set[str]) -> None:
+        self.topics = frozenset(topics)
+        self._broadcaster = broadcaster
+        self._lock = threading.Lock()
+        self._pending: "OrderedDict[str, bytes]" = OrderedDict()
+        self._ready = threading.Event()
+        self._callback: Optional[Callable[[], None]] = None
+        self.closed = False
+
+    def push(self, topic: str, message: bytes) -> None:
+        with self._lock:
+            if self.closed:
+                return
+            self._pending.pop(topic, None)
+            self._pending[topic] = message
+            callback = self._callback
+        self._ready.set()
+        if callback is not None:
+            callback()
+
+    def drain(self) -> bytes:
+        """取出所有待发送的消息（没有时返回 b""）。"""
+        with self._lock:
+            data = b"".join(self._pending.values())
+            self._pending.clear()
+            self._ready.clear()
+        return data
+
+    def wait(self, timeout: float) -> bool:
+        return self._ready.wait(timeout)
+
+    def on_ready(self, callback: Callable[[], None]) -> None:
+        """供事件循环使用：有新消息或连接关闭时调用 callback（可能在其他线程）。"""
+        with self._lock:
+            self._callback = callback
+            pending = bool(self._pending) or self.closed
+        if pending:
+            callback()
+
+    def close(self) -> None:
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            callback = self._callback
+        self._ready.set()
+        self._broadcaster.unsubscribe(self)
+        if callback is not None:
+            callback()
+
+    def __iter__(self) -> Iterator[bytes]:
+        """阻塞式读取：有消息时返回消息，空闲时返回心跳，关闭后结束。"""
+        while not self.closed:
+            if not self.wait(self.heartbeat_interval):
+                yield self.heartbeat
+                continue
+            data = self.drain()
+            if data:
+                yield data
+
+
+class EventBroadcaster:
+    """按主题把同一份编码好的消息分发给所有订阅者。
+
+    每个主题记住最近一次的消息：内容未变化时不再推送，新订阅者立即收到当前快照。
+    """
+
+    def __init__(self, max_subscribers: int = 1000) -> None:
+        # 为 0 时不接受订阅（如单线程模式，一个长连接就会挡住所有请求）
+        self.max_subscribers = max(0, int(max_subscribers))
+        self._lock = threading.Lock()
+        self._subscribers: Set[Subscription] = set()
+        self._latest: Dict[str, bytes] = {}
+        self._closed = False
+
+    def subscribe(self, topics: Set[str]) -> Subscription:
+        subscription = Subscription(self, topics)
+        with self._lock:
+            if self._closed or len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers("实时推送连接数已满，请稍后再试。")
+            self._subscribers.add(subscription)
+            latest = [(topic, self._latest[topic]) for topic in topics if topic in self._latest]
+        subscription.push("retry", f"retry: {RETRY_MS}\n\n".encode("ascii"))
+        for topic, message in latest:
+            subscription.push(topic, message)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def active_topics(self) -> Set[str]:
+        with self._lock:
+            topics: Set[str] = set()
+            for subscription in self._subscribers:
+                topics.update(subscription.topics)
+            return topics
+
+    def missing_topics(self, topics: Set[str]) -> Set[str]:
+        """还没有快照的主题。"""
+        with self._lock:
+            return {topic for topic in topics if topic not in self._latest}
+
+    def retain(self, topics: Set[str]) -> None:
+        """丢弃其他主题的快照：没人订阅时不再更新，留着会在下次订阅时发出过期数据。"""
+        with self._lock:
+            for topic in [topic for topic in self._latest if topic not in topics]:
+                del self._latest[topic]
+
+    def publish(self, topic: str, event: str, payload: dict) -> int:
+        """编码一次并推送给订阅了该主题的连接，返回推送的连接数（内容未变化时为 0）。"""
+        message = format_event(event, payload)
+        with self._lock:
+            if self._latest.get(topic) == message:
+                return 0
+            self._latest[topic] = message
+            targets = [sub for sub in self._subscribers if topic in sub.topics]
+        for subscription in targets:
+            subscription.push(topic, message)
+        return len(targets)
+
+    def close(self) -> None:
+        """停止服务时关闭所有连接，让占用的线程退出。"""
+        with self._lock:
+            self._closed = True
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.close()
+
+
+class LiveFeed:
+    """后台线程：数据版本变化时为当前有订阅者的主题重新计算一次快照并广播。
+
+    compute(topics) 返回 {主题: (事件名, 数据)}。版本号来自 cache_versions，
+    因此其他工作进程写入的成绩也会在 interval 秒内推送出去；
+    不经过版本号的变化（如跨天、统计批量落库）由每 full_refresh 秒一次的全量计算兜底。
+    """
+
+    def __init__(
+        self,
+        broadcaster: EventBroadcaster,
+        compute: Callable[[Set[str]], Dict[str, Tuple[str, dict]]],
+        watch: VersionWatch,
+        interval: float = 1.0,
+        full_refresh: float = 60.0,
+    ) -> None:
+        self.broadcaster = broadcaster
+        self.interval = max(0.05, float(interval))
+        self.full_refresh = max(self.interval, float(full_refresh))
+        self._last_full = 0.0
+        self._compute = compute
+        self._watch = watch
+        self._watch.subscribe(self.notify)
+        self._lock = threading.Lock()
+        self._dirty_all = True
+        self._dirty_topics: Set[str] = set()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def notify(self, topics: Optional[Set[str]] = None) -> None:
+        """标记数据已变化：topics 为空时重新计算全部主题。"""
+        with self._lock:
+            if topics is None:
+                self._dirty_all = True
+            else:
+                self._dirty_topics.update(topics)
+        self._wakeup.set()
+
+    def subscribe(self, topics: Set[str]) -> Subscription:
+        self._ensure_started()
+        subscription = self.broadcaster.subscribe(topics)
+        missing = self.broadcaster.missing_topics(topics)
+        if missing:
+            self.notify(missing)
+        return subscription
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None or self._stopped.is_set():
+                return
+            self._thread = threading.Thread(target=self._run, name="live-feed", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self._watch.check(max_age=0)
+                if time.monotonic() - self._last_full >= self.full_refresh:
+                    self.notify()
+                self._publish_dirty()
+            except Exception as exc:
+                print(f"[推送] 计算快照失败: {exc}")
+
+    def _publish_dirty(self) -> None:
+        active = self.broadcaster.active_topics()
+        with self._lock:
+            full = self._dirty_all
+            topics = set(active) if full else self._dirty_topics & active
+            self._dirty_all = False
+            self._dirty_topics = set()
+        if full:
+            self._last_full = time.monotonic()
+            self.broadcaster.retain(active)
+        if not topics:
+            return
+        for topic, (event, payload) in self._compute(topics).items():
+            self.broadcaster.publish(topic, event, payload)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        self.broadcaster.close()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=self.interval + 1)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "subscribers": self.broadcaster.subscriber_count(),
+            "topics": sorted(self.broadcaster.active_topics()),
+        }
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Set
+
+from .router import Request, Response
+
+# 不参与分析的路径（查看结果本身的请求）
+PROFILE_ENDPOINT = "/api/admin/profile"
+MAX_PROFILE_REQUESTS = 1000
+MAX_SAMPLE_SECONDS = 300.0
+MIN_SAMPLE_INTERVAL = 0.001
+# 单个调用栈最多保留的帧数
+MAX_STACK_DEPTH = 64
+PSTATS_SORT_KEYS = ("cumulative", "tottime", "calls", "ncalls")
+
+
+def _frame_label(frame) -> str:
+    """模块名:函数名，如 game.server:_submit_guess（可与 http.server 等同名文件区分）。"""
+    code = frame.f_code
+    module = frame.f_globals.get("__name__") or os.path.basename(code.co_filename)
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class _RequestProfile:
+    """cProfile 模式：分析接下来 remaining 个（匹配 route 的）请求，结果累加到同一份统计。"""
+
+    def __init__(self, requests: int, route: str) -> None:
+        self.route = route
+        self.requested = requests
+        self.remaining = requests
+        self.profiled = 0
+        self.stats: Optional[pstats.Stats] = None
+        # 同一时间只分析一个请求：3.12 起 cProfile 不能在多个线程同时启用
+        self.busy = threading.Lock()
+
+    def matches(self, request: Request) -> bool:
+        if not self.route:
+            return True
+        route = request.route
+        return self.route in (request.path, route.name if route else "")
+
+
+class _StackSampler:
+    """采样模式：后台线程定期读取处理中请求的调用栈，汇总为 collapsed stack（火焰图输入）。"""
+
+    def __init__(self, seconds: float, interval: float, all_threads: bool, active: Callable[[], Set[int]]) -> None:
+        self.seconds = seconds
+        self.interval = interval
+        self.all_threads = all_threads
+        self.samples = 0
+        self.stacks: "Counter[str]" = Counter()
+        self._active = active
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.seconds
+        while not self._stopped.is_set() and time.monotonic() < deadline:
+            threads = None if self.all_threads else self._active()
+            collected = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (threads is not None and ident not in threads):
+                    continue
+                labels: List[str] = []
+                while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                collected.append(";".join(reversed(labels)))
+            with self._lock:
+                self.samples += 1
+                self.stacks.update(collected)
+            self._stopped.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join(timeout=1.0)
+
+    def collapsed(self) -> str:
+        with self._lock:
+            items = self.stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def distinct_stacks(self) -> int:
+        with self._lock:
+            return len(self.stacks)
+
+
+class Profiler:
+    """按需性能分析：管理员开启后分析后续请求，无需重启或挂调试器。
+
+    - cprofile：用 cProfile 分析接下来 N 个请求（可只分析某个路由），结果为 pstats 文本
+    - sample：在 seconds 秒内每隔 interval 秒采样一次调用栈，结果为 collapsed stack，
+      可直接交给 flamegraph.pl / speedscope 生成火焰图
+
+    同一时间只有一个分析任务，新任务会替换旧任务的结果。结果只保存在当前进程。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._profile: Optional[_RequestProfile] = None
+        self._sampler: Optional[_StackSampler] = None
+        self._active_lock = threading.Lock()
+        self._active: Set[int] = set()
+
+    def start_cprofile(self, requests: int, route: str = "") -> None:
+        requests = max(1, min(MAX_PROFILE_REQUESTS, int(requests)))
+        with self._lock:
+            self._stop_sampler()
+            self._profile = _RequestProfile(requests, route.strip())
+
+    def start_sampling(self, seconds: float, interval: float, all_threads: bool = False) -> None:
+        seconds = max(0.1, min(MAX_SAMPLE_SECONDS, float(seconds)))
+        interval = max(MIN_SAMPLE_INTERVAL, float(interval))
+        with self._lock:
+            self._stop_sampler()
+            self._profile = None
+            self._sampler = _StackSampler(seconds, interval, all_threads, self._active_threads)
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stop_sampler()
+            self._sampler = None
+            self._profile = None
+
+    def _stop_sampler(self) -> None:
+        if self._sampler is not None:
+            self._sampler.stop()
+
+    def _active_threads(self) -> Set[int]:
+        with self._active_lock:
+            return set(self._active)
+
+    def middleware(self, request: Request, call_next: Callable[[Request], Response]) -> Response:
+        """路由中间件：未开启分析时只多一次属性判断。"""
+        if (self._profile is None and self._sampler is None) or request.path == PROFILE_ENDPOINT:
+            return call_next(request)
+        if self._sampler is not None and self._sampler.running:
+            ident = threading.get_ident()
+            with self._active_lock:
+                self._active.add(ident)
+            try:
+                return call_next(request)
+            finally:
+                with self._active_lock:
+                    self._active.discard(ident)
+        profile = self._profile
+        if profile is None or not profile.matches(request) or not profile.busy.acquire(blocking=False):
+            return call_next(request)
+        try:
+            with self._lock:
+                if profile.remaining <= 0:
+                    return call_next(request)
+                profile.remaining -= 1
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # 其他分析工具（如调试器）正在使用
+                return call_next(request)
+            try:
+                return call_next(request)
+            finally:
+                profiler.disable()
+                with self._lock:
+                    if profile.stats is None:
+                        profile.stats = pstats.Stats(profiler)
+                    else:
+                        profile.stats.add(profiler)
+                    profile.profiled += 1
+        finally:
+            profile.busy.release()
+
+    def status(self) -> Dict[str, object]:
+        with self._lock:
+            profile, sampler = self._profile, self._sampler
+            if profile is not None:
+                return {
+                    "mode": "cprofile",
+                    "route": profile.route,
+                    "requested": profile.requested,
+                    "profiled": profile.profiled,
+                    "done": profile.profiled >= profile.requested,
+                }
+            if sampler is not None:
+                return {
+                    "mode": "sample",
+                    "seconds": sampler.seconds,
+                    "interval": sampler.interval,
+                    "all_threads": sampler.all_threads,
+                    "samples": sampler.samples,
+                    "stacks": sampler.distinct_stacks(),
+                    "done": not sampler.running,
+                }
+        return {"mode": None}
+
+    def report(self, sort: str = "cumulative", limit: int = 40) -> str:
+        """当前结果：cprofile 为 pstats 文本，sample 为 collapsed stack。"""
+        with self._lock:
+            profile, sampler = self._profile, self._sampler
+            if profile is not None:
+                if profile.stats is None:
+                    return ""
+                # 复制一份再去掉目录前缀，避免与后续累加的完整路径条目对不上
+                stream = io.StringIO()
+                stats = pstats.Stats(stream=stream)
+                stats.add(profile.stats)
+                stats.strip_dirs().sort_stats(sort if sort in PSTATS_SORT_KEYS else "cumulative").print_stats(limit)
+                return stream.getvalue()
+        if sampler is not None:
+            return sampler.collapsed()
+        return ""
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+import os
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict
+from typing import FrozenSet, List, Dict, Optional, Tuple
 
 # 默认题目文件夹（每个 .txt 文件即一道题）
 PUZZLE_DIR = Path(__file__).resolve().parents[1] / "data" / "puzzles"
@@ -28,7 +32,85 @@ def load_puzzles(path: Path = PUZZLE_DIR) -> List[Dict[str, str]]:
     """从固定文件夹读取全部题目。"""
     if not path.exists():
         raise FileNotFoundError(f"题目文件夹不存在: {path}")
-    files = sorted(path.glob("*.txt"))
+    # 按文件名排序：比较 Path 对象本身要慢一个数量级，题目多时很明显
+    files = sorted(path.glob("*.txt"), key=lambda file_path: file_path.name)
     if not files:
         raise FileNotFoundError(f"题目文件夹为空: {path}")
     return [parse_puzzle_file(file_path) for file_path in files]
+
+
+class PuzzleCatalog:
+    """题目目录的进程内缓存：最多每隔 recheck_interval 秒扫描一次目录，只重新解析新增或修改过的文件。
+
+    load() 返回的列表与 load_puzzles 相同，但为共享对象，调用方不应修改。
+    version() 是目录内文件名、修改时间与大小的摘要，题目增删改后随之变化；
+    其他进程写入的题目最多 recheck_interval 秒后可见，本进程写入后调用 invalidate() 立即生效。
+    """
+
+    def __init__(self, path: Path = PUZZLE_DIR, recheck_interval: float = 1.0) -> None:
+        self.path = path
+        self.recheck_interval = float(recheck_interval)
+        self._lock = threading.Lock()
+        self._checked_at: Optional[float] = None
+        # 文件名 -> (修改时间, 大小, 解析结果)
+        self._files: Dict[str, Tuple[int, int, Dict[str, str]]] = {}
+        self._puzzles: List[Dict[str, str]] = []
+        self._ids: FrozenSet[str] = frozenset()
+        self._version = ""
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._checked_at = None
+
+    def load(self) -> List[Dict[str, str]]:
+        self._refresh()
+        if not self._puzzles:
+            raise FileNotFoundError(f"题目文件夹为空: {self.path}")
+        return self._puzzles
+
+    def version(self) -> str:
+        self._refresh()
+        return self._version
+
+    def contains(self, puzzle_id: str) -> bool:
+        """题目是否存在（不读文件，用于拒绝任意 id 的查询）。"""
+        self._refresh()
+        return puzzle_id in self._ids
+
+    def snapshot(self) -> Tuple[str, List[Dict[str, str]]]:
+        """同时返回版本号与题目列表，二者保证对应。"""
+        self._refresh()
+        with self._lock:
+            version, puzzles = self._version, self._puzzles
+        if not puzzles:
+            raise FileNotFoundError(f"题目文件夹为空: {self.path}")
+        return version, puzzles
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.recheck_interval:
+                return
+            if not self.path.exists():
+                raise FileNotFoundError(f"题目文件夹不存在: {self.path}")
+            stats = []
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".txt") and not entry.name.startswith(".") and entry.is_file():
+                        stat = entry.stat()
+                        stats.append((entry.name, stat.st_mtime_ns, stat.st_size))
+            stats.sort()
+            files = {}
+            for name, mtime_ns, size in stats:
+                cached = self._files.get(name)
+                if cached is not None and cached[:2] == (mtime_ns, size):
+                    files[name] = cached
+                else:
+                    files[name] = (mtime_ns, size, parse_puzzle_file(self.path / name))
+            digest = hashlib.sha1(repr(stats).encode("utf-8")).hexdigest()[:12]
+            if digest != self._version:
+                self._files = files
+                self._puzzles = [item[2] for item in files.values()]
+                self._ids = frozenset(puzzle["id"] for puzzle in self._puzzles)
+                self._version = digest
+            self._checked_at = now
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .db import get_results_version, list_puzzle_results
+
+# 排序键：(猜测次数, 完成时间戳, user_id)，越小排名越靠前
+RankKey = Tuple[int, int, int]
+# 每个进程最多常驻内存的单题排行榜数量，超出时淘汰最久未访问的（下次访问时重新加载）
+MAX_BOARDS = 1024
+
+
+class PuzzleLeaderboard:
+    """单题排行榜：用 bisect 维护有序数组，名次查询为 O(log n)。"""
+
+    def __init__(self) -> None:
+        self._keys: List[RankKey] = []
+        self._key_by_user: Dict[int, RankKey] = {}
+        self._entries: Dict[int, Dict[str, object]] = {}
+        # 加载时该题成绩的版本号与最近一次核对的时间，由 LeaderboardIndex 维护
+        self.version: Optional[int] = None
+        self.checked_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def update(
+        self, user_id: int, nickname: str, guess_count: int, completed_ts: int, completed_at: str
+    ) -> bool:
+        """写入成绩；仅当比已有成绩更优时生效。"""
+        user_id = int(user_id)
+        key = (int(guess_count), int(completed_ts), user_id)
+        old_key = self._key_by_user.get(user_id)
+        if old_key is not None:
+            if old_key[0] <= key[0]:
+                return False
+            index = bisect.bisect_left(self._keys, old_key)
+            del self._keys[index]
+        bisect.insort(self._keys, key)
+        self._key_by_user[user_id] = key
+        self._entries[user_id] = {
+            "nickname": nickname,
+            "guess_count": int(guess_count),
+            "completed_at": completed_at,
+        }
+        return True
+
+    def top(self, limit: int) -> List[Dict[str, object]]:
+        return [dict(self._entries[key[2]]) for key in self._keys[: max(0, int(limit))]]
+
+    def rank(self, user_id: int) -> Optional[Dict[str, object]]:
+        """返回名次、总人数与百分位（超过的玩家比例）；未通关返回 None。"""
+        key = self._key_by_user.get(int(user_id))
+        if key is None:
+            return None
+        total = len(self._keys)
+        rank = bisect.bisect_left(self._keys, key) + 1
+        percentile = (total - rank) / total * 100 if total else 0.0
+        return {
+            "rank": rank,
+            "total": total,
+            "percentile": round(percentile, 1),
+            "guess_count": key[0],
+        }
+
+
+class LeaderboardIndex:
+    """按题目懒加载的内存排行榜集合（线程安全）。
+
+    每个排行榜记下加载时该题成绩的版本号（version_reader），读取时最多每隔 recheck_interval 秒核对一次；
+    多进程部署时其他进程写入某题成绩只会让该题的排行榜重新加载。
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], List[Dict[str, object]]] = list_puzzle_results,
+        version_reader: Optional[Callable[[str], int]] = get_results_version,
+        maxsize: int = MAX_BOARDS,
+        recheck_interval: float = 1.0,
+    ) -> None:
+        self._loader = loader
+        self._version_reader = version_reader
+        self.maxsize = max(1, int(maxsize))
+        self.recheck_interval = float(recheck_interval)
+        self._boards: "OrderedDict[str, PuzzleLeaderboard]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _board(self, puzzle_id: str, max_age: Optional[float]) -> PuzzleLeaderboard:
+        """返回排行榜；超过 max_age 秒未核对版本号时先核对，变化则重新加载。"""
+        interval = self.recheck_interval if max_age is None else float(max_age)
+        now = time.monotonic()
+        with self._lock:
+            board = self._boards.get(puzzle_id)
+            if board is not None:
+                self._boards.move_to_end(puzzle_id)
+                if self._version_reader is None or now - board.checked_at < interval:
+                    return board
+        # 读版本号与加载都在锁外，避免一道题的数据库读取阻塞其他题目
+        version = self._version_reader(puzzle_id) if self._version_reader is not None else None
+        with self._lock:
+            board = self._boards.get(puzzle_id)
+            if board is not None and board.version == version:
+                board.checked_at = now
+                return board
+        loaded = PuzzleLeaderboard()
+        for row in self._loader(puzzle_id):
+            loaded.update(
+                int(row["user_id"]),
+                str(row["nickname"]),
+                int(row["guess_count"]),
+                int(row["completed_ts"]),
+                str(row["completed_at"]),
+            )
+        loaded.version = version
+        loaded.checked_at = now
+        with self._lock:
+            board = self._boards.get(puzzle_id)
+            # 加载期间已有更新的版本（其他线程加载或本进程写入）时保留它
+            if board is not None and version is not None and board.version is not None and board.version > version:
+                return board
+            self._boards[puzzle_id] = loaded
+            self._boards.move_to_end(puzzle_id)
+            while len(self._boards) > self.maxsize:
+                self._boards.popitem(last=False)
+        return loaded
+
+    def record(
+        self,
+        puzzle_id: str,
+        user_id: int,
+        nickname: str,
+        guess_count: int,
+        completed_ts: int,
+        completed_at: str,
+        version: Optional[int] = None,
+    ) -> None:
+        """同步一条已写入数据库的成绩；version 为写入后该题成绩的版本号。
+
+        排行榜未加载时不做处理，下次访问时从数据库加载（已包含这条成绩）。
+        """
+        with self._lock:
+            board = self._boards.get(str(puzzle_id))
+            if board is None:
+                return
+            board.update(user_id, nickname, guess_count, completed_ts, completed_at)
+            # 期间没有其他进程写入该题时直接推进版本，避免重新加载
+            if version is not None and board.version is not None and int(version) == board.version + 1:
+                board.version = int(version)
+
+    def top(self, puzzle_id: str, limit: int = 10, max_age: Optional[float] = None) -> List[Dict[str, object]]:
+        board = self._board(str(puzzle_id), max_age)
+        with self._lock:
+            return board.top(limit)
+
+    def rank(self, puzzle_id: str, user_id: int, max_age: Optional[float] = None) -> Optional[Dict[str, object]]:
+        """max_age=0 时每次核对版本号（如通关后的名次查询可能落到另一个进程）。"""
+        board = self._board(str(puzzle_id), max_age)
+        with self._lock:
+            return board.rank(user_id)
+
+    def drop(self, puzzle_id: Optional[str] = None) -> None:
+        """丢弃内存排行（下次访问时重新加载）。"""
+        with self._lock:
+            if puzzle_id is None:
+                self._boards.clear()
+            else:
+                self._boards.pop(str(puzzle_id), None)
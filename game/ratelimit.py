@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from .metrics import REGISTRY
+from .router import Request, Response
+
+RATE_LIMITED = REGISTRY.counter(
+    "hanzi_rate_limited_total", "被限流拒绝的请求数（scope 为 session 或 ip）。", ("group", "scope")
+)
+REQUESTS_SHED = REGISTRY.counter(
+    "hanzi_requests_shed_total", "过载保护拒绝的请求数（reason 为 queue_depth 或 queue_wait）。", ("reason",)
+)
+
+# 每个进程最多记住的令牌桶数量，超出时淘汰最久未用的（被淘汰的桶相当于重新装满）
+MAX_BUCKETS = 100000
+
+
+class Limit:
+    """令牌桶参数：每秒补充 rate 个令牌，最多攒 burst 个。"""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+
+
+# 分组 -> (每个会话, 每个 IP)。同一 IP 后面可能有多名玩家，IP 的额度更宽
+DEFAULT_LIMITS: Dict[str, Tuple[Limit, Limit]] = {
+    # 手动猜字每秒一两次，连点或粘贴也很少超过 20 次
+    "guess": (Limit(5, 20), Limit(50, 200)),
+    "hint": (Limit(0.5, 5), Limit(5, 30)),
+    # 每一步都会调用上游 AI，限制的是 AI 额度
+    "ai_step": (Limit(0.5, 3), Limit(2, 10)),
+    "generate": (Limit(2 / 60, 3), Limit(5 / 60, 5)),
+}
+
+
+class RateLimiter:
+    """按会话编号与客户端 IP 分别计数的令牌桶限流，线程安全。"""
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[Limit, Limit]]] = None, max_buckets: int = MAX_BUCKETS) -> None:
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.max_buckets = max(1, int(max_buckets))
+        self.enabled = True
+        # (分组, 维度, 键) -> [剩余令牌, 上次补充时间]
+        self._buckets: "OrderedDict[Tuple[str, str, str], list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bucket(self, key: Tuple[str, str, str], limit: Limit, now: float) -> list:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [limit.burst, now]
+            self._buckets[key] = bucket
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+            bucket[1] = now
+        return bucket
+
+    def acquire(self, group: str, session_id: Optional[str], client_ip: str) -> float:
+        """尝试消耗一个令牌：成功返回 0，否则返回建议的重试等待秒数（不消耗任何令牌）。"""
+        limits = self.limits.get(group)
+        if not self.enabled or limits is None:
+            return 0.0
+        now = time.monotonic()
+        checks = []
+        if session_id:
+            checks.append(("session", session_id, limits[0]))
+        if client_ip:
+            checks.append(("ip", client_ip, limits[1]))
+        with self._lock:
+            buckets = [(scope, self._bucket((group, scope, key), limit, now), limit) for scope, key, limit in checks]
+            for scope, bucket, limit in buckets:
+                if bucket[0] < 1:
+                    RATE_LIMITED.inc(group=group, scope=scope)
+                    return (1 - bucket[0]) / limit.rate if limit.rate > 0 else 60.0
+            for _, bucket, _ in buckets:
+                bucket[0] -= 1
+        return 0.0
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._buckets)
+
+
+class AdmissionControl:
+    """过载保护：等待处理的请求过多，或请求在线程池里排队太久时直接拒绝，让队列尽快消化。
+
+    queue_depth 由服务前端提供（当前排队的连接/请求数），single 模式没有队列。
+    """
+
+    def __init__(self, max_queue_depth: int = 0, max_queue_wait: float = 0.0) -> None:
+        # 0 表示不检查
+        self.max_queue_depth = max(0, int(max_queue_depth))
+        self.max_queue_wait = max(0.0, float(max_queue_wait))
+        self.queue_depth: Optional[Callable[[], int]] = None
+
+    def check(self, request: Request) -> Optional[str]:
+        """返回拒绝原因，允许处理时返回 None。"""
+        if self.max_queue_wait and request.queue_wait > self.max_queue_wait:
+            return "queue_wait"
+        depth = self.queue_depth
+        if self.max_queue_depth and depth is not None and depth() > self.max_queue_depth:
+            return "queue_depth"
+        return None
+
+
+def _reject(status_code: int, message: str, retry_after: float) -> Response:
+    response = Response.json({"ok": False, "message": message}, status_code=status_code)
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def rate_limit_middleware(
+    limiter: RateLimiter,
+    admission: AdmissionControl,
+    session_key: Callable[[Request], Optional[str]],
+) -> Callable[[Request, Callable[[Request], Response]], Response]:
+    """路由中间件：先做过载保护（503），再按路由的 rate_limit 分组限流（429）。
+
+    路由可用 shed=False 跳过过载保护（如指标与管理接口，过载时仍要能查看）。
+    """
+
+    def middleware(request: Request, call_next: Callable[[Request], Response]) -> Response:
+        route = request.route
+        if route is None:
+            return call_next(request)
+        if route.options.get("shed", True):
+            reason = admission.check(request)
+            if reason is not None:
+                REQUESTS_SHED.inc(reason=reason)
+                return _reject(503, "服务器繁忙，请稍后再试。", 1)
+        group = route.options.get("rate_limit")
+        if group:
+            retry_after = limiter.acquire(str(group), session_key(request), request.client_address[0])
+            if retry_after:
+                return _reject(429, "操作太频繁，请稍后再试。", retry_after)
+        return call_next(request)
+
+    return middleware
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import hashlib
+import threading
+from typing import Callable, Dict, Hashable, Optional
+
+from .cache import MISSING, TTLCache
+from .compression import COMPRESS_LEVEL, MIN_COMPRESS_BYTES, accepts_gzip
+from .metrics import REGISTRY
+from .router import Request, Response
+
+RESPONSE_CACHE_REQUESTS = REGISTRY.counter(
+    "hanzi_response_cache_requests_total",
+    "带 cache_ttl 的接口的缓存结果（hit 命中，miss 执行处理函数，coalesced 等到了同一键上其他请求的结果）。",
+    ("route", "result"),
+)
+
+# 可以让浏览器缓存，但每次都用 ETag 向服务器确认
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+class CachedResponse:
+    """缓存的 200 响应：JSON 字节、预先压缩的 gzip 版本与强 ETag。"""
+
+    __slots__ = ("body", "gzip_body", "content_type", "etag", "gzip_etag", "validator")
+
+    def __init__(self, body: bytes, content_type: str, validator: object) -> None:
+        self.body = body
+        self.content_type = content_type
+        digest = hashlib.sha1(body).hexdigest()[:16]
+        self.etag = f'"{digest}"'
+        # 与 gzip_middleware 一致：压缩后的字节不同，ETag 加 -gz 区分
+        self.gzip_etag = f'"{digest}-gz"'
+        gzip_body = gzip.compress(body, compresslevel=COMPRESS_LEVEL) if len(body) >= MIN_COMPRESS_BYTES else None
+        self.gzip_body = gzip_body if gzip_body is not None and len(gzip_body) < len(body) else None
+        # 写入时的数据版本，版本变化后不再使用
+        self.validator = validator
+
+    def response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+        if len(self.body) >= MIN_COMPRESS_BYTES:
+            headers["Vary"] = "Accept-Encoding"
+        use_gzip = self.gzip_body is not None and accepts_gzip(request.header("Accept-Encoding"))
+        if use_gzip:
+            headers["ETag"] = self.gzip_etag
+        if_none_match = request.header("If-None-Match")
+        if if_none_match and etag_matches(if_none_match, (self.etag, self.gzip_etag)):
+            return Response(b"", status_code=304, content_type="", headers=headers)
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(self.gzip_body, content_type=self.content_type, headers=headers)
+        return Response(self.body, content_type=self.content_type, headers=headers)
+
+
+def etag_matches(header: str, etags) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match 使用弱比较：忽略 W/ 前缀
+    tags = {tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip() for tag in header.split(",")}
+    return any(etag in tags for etag in etags)
+
+
+class _Flight:
+    """一次正在进行的计算；同一键上的其他请求等待 done。"""
+
+    __slots__ = ("done", "result")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[CachedResponse] = None
+
+
+class ResponseCache:
+    """公开 GET 接口的响应缓存：按路径与查询参数缓存序列化后的响应，TTL 由路由的 cache_ttl 指定。
+
+    同一个键同时未命中时只有一个请求执行处理函数，其余请求等待它的结果（singleflight），
+    因此轮询高峰（如每日题切换）时每个键只跑一次聚合查询。
+    validator() 返回当前的数据版本，与写入时不同的条目视为过期：写入路径精确失效，TTL 兜底其他来源的变更。
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 512,
+        validator: Optional[Callable[[], object]] = None,
+        wait_timeout: float = 10.0,
+    ) -> None:
+        self.validator = validator
+        # 等待其他请求计算的最长秒数，超时后自己计算
+        self.wait_timeout = float(wait_timeout)
+        self._entries = TTLCache(ttl=1.0, maxsize=maxsize)
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self._counts = {"hit": 0, "miss": 0, "coalesced": 0}
+
+    @staticmethod
+    def key(request: Request) -> Hashable:
+        query = tuple(sorted((name, tuple(values)) for name, values in request.query.items()))
+        return (request.path, query)
+
+    def get(self, request: Request, ttl: float, compute: Callable[[Request], Response]) -> Response:
+        route = request.route.name if request.route is not None else request.path
+        key = self.key(request)
+        validator = self.validator() if self.validator is not None else None
+        entry = self._entries.get(key)
+        if entry is not MISSING and entry.validator == validator:
+            self._count(route, "hit")
+            return entry.response(request)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+        if not leader:
+            flight.done.wait(self.wait_timeout)
+            if flight.result is not None:
+                self._count(route, "coalesced")
+                return flight.result.response(request)
+            # 计算失败或未能缓存（如返回错误），各自处理
+            self._count(route, "miss")
+            return compute(request)
+        self._count(route, "miss")
+        try:
+            generation = self._entries.generation()
+            response = compute(request)
+            if not _cacheable(response):
+                return response
+            entry = CachedResponse(response.body, response.content_type, validator)
+            self._entries.set(key, entry, ttl=ttl, generation=generation)
+            flight.result = entry
+            return entry.response(request)
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _count(self, route: str, result: str) -> None:
+        RESPONSE_CACHE_REQUESTS.inc(route=route, result=result)
+        with self._lock:
+            self._counts[result] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, object]:
+        size = self._entries.stats()["size"]
+        with self._lock:
+            total = sum(self._counts.values())
+            return {
+                **self._counts,
+                "size": size,
+                "in_flight": len(self._flights),
+                "hit_rate": ((self._counts["hit"] + self._counts["coalesced"]) / total) if total else 0.0,
+            }
+
+
+def _cacheable(response: Response) -> bool:
+    return (
+        response.status_code == 200
+        and response.stream is None
+        and response.upgrade is None
+        and "Content-Encoding" not in response.headers
+        and "Set-Cookie" not in response.headers
+    )
+
+
+def response_cache_middleware(cache: ResponseCache) -> Callable[[Request, Callable[[Request], Response]], Response]:
+    """路由中间件：GET 路由带 cache_ttl（秒）时经 cache 返回，响应带 ETag，可返回 304。
+
+    只用于与登录用户无关的公开接口：缓存键不含会话。
+    """
+
+    def middleware(request: Request, call_next: Callable[[Request], Response]) -> Response:
+        route = request.route
+        if route is None or request.method != "GET":
+            return call_next(request)
+        ttl = route.options.get("cache_ttl")
+        if not ttl:
+            return call_next(request)
+        return cache.get(request, float(ttl), call_next)
+
+    return middleware
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from .metrics import REGISTRY
+
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+# 未预期的异常只返回这条提示，具体异常与调用栈记录在服务端日志中
+INTERNAL_ERROR_MESSAGE = "服务器内部错误，请稍后重试。"
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "hanzi_http_request_seconds",
+    "接口处理耗时（秒，含中间件，不含网络收发），未匹配的路径记为 unmatched。",
+    ("method", "route", "status"),
+)
+
+
+class ApiError(Exception):
+    """接口错误：由路由统一转换为 {"ok": False, "message": ...} 响应。"""
+
+    def __init__(self, message: str, status_code: int = 400) -> None:
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def log_unexpected_error(where: str) -> None:
+    """打印当前正在处理的异常及调用栈（在 except 块中调用）。"""
+    print(f"[接口] {where} 处理失败:\n{traceback.format_exc()}", end="")
+
+
+class Response:
+    """待发送的 HTTP 响应。
+
+    stream 不为空时为流式响应（如 SSE）：不带 Content-Length，发完响应头后持续写出
+    stream 产生的数据，结束后关闭连接。
+    upgrade 不为空时为协议升级（101，如 WebSocket）：发完响应头后连接交给 upgrade 处理。
+    """
+
+    def __init__(
+        self,
+        body: bytes,
+        status_code: int = 200,
+        content_type: str = JSON_CONTENT_TYPE,
+        headers: Optional[Dict[str, str]] = None,
+        stream: Optional[object] = None,
+        upgrade: Optional[object] = None,
+    ) -> None:
+        self.body = body
+        self.status_code = status_code
+        self.content_type = content_type
+        self.headers: Dict[str, str] = dict(headers or {})
+        self.stream = stream
+        self.upgrade = upgrade
+
+    @classmethod
+    def json(cls, payload: dict, status_code: int = 200) -> "Response":
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        return cls(data, status_code=status_code)
+
+
+class Request:
+    """一次请求的解析结果：路径、查询参数、请求头与请求体。"""
+
+    def __init__(
+        self,
+        method: str,
+        target: str,
+        headers,
+        body: bytes = b"",
+        client_address: Tuple[str, int] = ("", 0),
+    ) -> None:
+        parsed = urlparse(target)
+        self.method = method.upper()
+        self.target = target
+        self.path = parsed.path
+        self.query: Dict[str, List[str]] = parse_qs(parsed.query)
+        self.headers = headers
+        self.body = body
+        self.client_address = client_address
+        # 匹配到的路由（未匹配时为 None），供中间件读取
+        self.route: Optional["Route"] = None
+        # 已识别的登录用户（由处理函数填写，供访问日志读取）
+        self.user_id: Optional[int] = None
+        # 在线程池中排队等待处理的秒数（由服务前端填写，供过载保护判断）
+        self.queue_wait = 0.0
+        self._json: Optional[dict] = None
+
+    def header(self, name: str, default: str = "") -> str:
+        return self.headers.get(name, default) if self.headers is not None else default
+
+    def json(self) -> dict:
+        """解析 JSON 请求体（空请求体视为 {}）。"""
+        if self._json is None:
+            raw = self.body.decode("utf-8", errors="replace") if self.body else ""
+            if not raw.strip():
+                self._json = {}
+            else:
+                try:
+                    data = json.loads(raw)
+                except ValueError:
+                    raise ApiError("请求体不是合法的 JSON。")
+                self._json = data if isinstance(data, dict) else {}
+        return self._json
+
+    def arg(self, name: str, default: str = "") -> str:
+        """读取查询参数（取第一个值）。"""
+        values = self.query.get(name)
+        return values[0] if values else default
+
+    def int_arg(self, name: str, default: int, minimum: int, maximum: int) -> int:
+        """读取整数查询参数并限制在 [minimum, maximum]；缺失或非法时使用默认值。"""
+        raw = self.arg(name, "")
+        try:
+            value = int(raw)
+        except (TypeError, ValueError):
+            return default
+        return max(minimum, min(maximum, value))
+
+
+Handler = Callable[[Request], object]
+Middleware = Callable[[Request, Callable[[Request], Response]], Response]
+
+
+class Route:
+    def __init__(self, method: str, path: str, func: Handler, options: Dict[str, object]) -> None:
+        self.method = method
+        self.path = path
+        self.func = func
+        # 供中间件读取的附加配置（如缓存时间、限流分组）
+        self.options = options
+        self.name = f"{method} {path}"
+
+
+class _RouteStats:
+    __slots__ = ("count", "errors", "total_ms", "max_ms")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+
+class Router:
+    """声明式路由表：按 (方法, 路径) 字典查找，统一处理错误与耗时统计。
+
+    处理函数接收 Request，返回 dict（作为 200 JSON）或 Response；
+    抛出 ApiError 表示预期内的错误。中间件按注册顺序由外向内包裹处理函数。
+    """
+
+    def __init__(self) -> None:
+        self._routes: Dict[Tuple[str, str], Route] = {}
+        self._middleware: List[Middleware] = []
+        self._chain: Callable[[Request], Response] = self._invoke
+        self._stats: Dict[str, _RouteStats] = {}
+        self._stats_lock = threading.Lock()
+
+    def route(self, method: str, *paths: str, **options) -> Callable[[Handler], Handler]:
+        def decorator(func: Handler) -> Handler:
+            for path in paths:
+                key = (method.upper(), path)
+                if key in self._routes:
+                    raise ValueError(f"重复注册的路由: {method} {path}")
+                self._routes[key] = Route(method.upper(), path, func, options)
+            return func
+
+        return decorator
+
+    def get(self, *paths: str, **kwargs) -> Callable[[Handler], Handler]:
+        return self.route("GET", *paths, **kwargs)
+
+    def post(self, *paths: str, **kwargs) -> Callable[[Handler], Handler]:
+        return self.route("POST", *paths, **kwargs)
+
+    def delete(self, *paths: str, **kwargs) -> Callable[[Handler], Handler]:
+        return self.route("DELETE", *paths, **kwargs)
+
+    def use(self, middleware: Middleware) -> None:
+        """注册中间件：middleware(request, call_next) -> Response。"""
+        self._middleware.append(middleware)
+        chain = self._invoke
+        for item in reversed(self._middleware):
+            chain = self._wrap(item, chain)
+        self._chain = chain
+
+    @staticmethod
+    def _wrap(middleware: Middleware, call_next: Callable[[Request], Response]) -> Callable[[Request], Response]:
+        return lambda request: middleware(request, call_next)
+
+    def routes(self) -> List[Route]:
+        return list(self._routes.values())
+
+    def dispatch(self, request: Request) -> Response:
+        request.route = self._routes.get((request.method, request.path))
+        started = time.perf_counter()
+        try:
+            response = self._chain(request)
+        except ApiError as exc:
+            # 中间件抛出的错误（如限流）
+            response = Response.json({"ok": False, "message": exc.message}, status_code=exc.status_code)
+        route = request.route
+        self._record(route.name if route else "unmatched", started, response.status_code)
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=response.status_code,
+        )
+        return response
+
+    def _invoke(self, request: Request) -> Response:
+        route = request.route
+        if route is None:
+            return Response.json({"ok": False, "message": "未找到对应的接口。"}, status_code=404)
+        try:
+            result = route.func(request)
+        except ApiError as exc:
+            return Response.json({"ok": False, "message": exc.message}, status_code=exc.status_code)
+        except Exception:
+            # 预期内的错误由处理函数抛出 ApiError；其余异常的内容可能含内部细节，不返回给客户端
+            log_unexpected_error(route.name)
+            return Response.json({"ok": False, "message": INTERNAL_ERROR_MESSAGE}, status_code=500)
+        if isinstance(result, Response):
+            return result
+        return Response.json(result)
+
+    def _record(self, name: str, started: float, status_code: int) -> None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = _RouteStats()
+                self._stats[name] = stats
+            stats.count += 1
+            if status_code >= 400:
+                stats.errors += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        """各路由的调用次数、错误数（状态码 >= 400）与耗时。"""
+        with self._stats_lock:
+            return {
+                name: {
+                    "count": item.count,
+                    "errors": item.errors,
+                    "avg_ms": round(item.total_ms / item.count, 3) if item.count else 0.0,
+                    "max_ms": round(item.max_ms, 3),
+                }
+                for name, item in sorted(self._stats.items())
+            }
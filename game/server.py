@@ -3,26 +3,44 @@
 import argparse
 import json
 import os
+import signal
+import socket
+import threading
 import time
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from urllib.parse import parse_qs, urlparse
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Callable, Optional, Dict, List, Set, Tuple, TypeVar
 
-from .engine import Game
+from .accesslog import AccessLog
+from .engine import Game, state_delta
+from . import metrics
+from .events import EventBroadcaster, LiveFeed, TooManySubscribers
 from .ai_client import AIClient
+from .async_server import AsyncHTTPServer
+from .compression import gzip_middleware
 from .db import (
     init_db,
+    close_connections,
     upsert_user,
     bind_session,
     get_user_by_session,
+    take_db_time,
     get_user_id_by_session,
+    get_progress_version,
+    load_user_progress,
+    save_user_progress,
+    remove_puzzle_progress,
+    count_user_progress,
+    import_user_progress,
+    DAILY_SCHEDULE_VERSION,
+    VersionWatch,
     record_result,
-    get_leaderboard,
     get_leaderboard_between,
     get_completion_count_between,
+    count_completions_by_ranges,
     list_ai_profiles,
     upsert_ai_profile,
     delete_ai_profile,
@@ -33,17 +51,19 @@ from .db import (
     clear_setting,
     list_users,
     get_puzzle_author_id,
-    list_puzzle_ids_by_author,
+    list_puzzle_meta,
     touch_puzzle_meta,
     delete_puzzle_meta,
     list_author_stats,
-    record_puzzle_attempt,
-    record_puzzle_guess,
     set_admin_difficulty,
-    list_puzzle_admin_difficulties,
     set_daily_flag,
+    demote_played_daily_puzzles,
     list_daily_puzzle_ids,
     list_played_puzzle_ids,
+    list_daily_schedule,
+    list_scheduled_puzzle_ids,
+    add_daily_schedule,
+    delete_daily_schedule,
     upsert_difficulty_vote,
     get_difficulty_vote,
     has_result,
@@ -52,13 +72,41 @@ from .db import (
     claim_daily_checkin,
     get_daily_checkin,
     consume_daily_hint,
+    query_cache_stats,
+    query_data_version,
+    session_cache_stats,
 )
-from .puzzles import PUZZLE_DIR, load_puzzles
+from .profiling import Profiler
+from .puzzles import PUZZLE_DIR, PuzzleCatalog, parse_puzzle_file
+from .ratelimit import AdmissionControl, RateLimiter, rate_limit_middleware
+from .responsecache import ResponseCache, etag_matches, response_cache_middleware
+from .ranking import LeaderboardIndex
+from .router import INTERNAL_ERROR_MESSAGE, ApiError, Request, Response, Router, log_unexpected_error
+from .static import StaticFiles
+from .telemetry import TelemetryQueue
+from .websocket import ConnectionLimit, WebSocketConnection, WebSocketHandler, handshake_headers
+
+T = TypeVar("T")
 
 # 静态资源目录（前端页面）
 WEB_DIR = Path(__file__).resolve().parents[1] / "web"
-# 进度存档文件（按 session_id 保存）
+STATIC_FILES = StaticFiles(
+    WEB_DIR,
+    {
+        "index.html": "text/html; charset=utf-8",
+        "admin.html": "text/html; charset=utf-8",
+        "style.css": "text/css; charset=utf-8",
+        "app.js": "application/javascript; charset=utf-8",
+        "admin.js": "application/javascript; charset=utf-8",
+    },
+)
+# 题目列表：目录内容变化时才重新解析，版本号用于题目列表的 ETag
+PUZZLE_CATALOG = PuzzleCatalog(PUZZLE_DIR)
+# 旧版进度存档文件（已迁移到数据库，仅首次启动时导入）
 SESSION_FILE = Path(__file__).resolve().parents[1] / "data" / "sessions.json"
+ACCESS_LOG_FILE = Path(__file__).resolve().parents[1] / "data" / "access.log"
+# threaded 模式下 keep-alive 连接的空闲超时（秒）
+KEEPALIVE_IDLE_TIMEOUT = 15
 
 
 class ChineseArgumentParser(argparse.ArgumentParser):
@@ -75,6 +123,20 @@ class ChineseArgumentParser(argparse.ArgumentParser):
         return text
 
 
+def _load_puzzle_map(puzzle_ids: List[str]) -> Dict[str, dict]:
+    """按 id 读取题目文件（用于恢复进度，避免每次加载全部题目）。"""
+    puzzle_map = {}
+    for puzzle_id in puzzle_ids:
+        file_path = PUZZLE_DIR / f"{puzzle_id}.txt"
+        if not file_path.is_file():
+            continue
+        try:
+            puzzle_map[puzzle_id] = parse_puzzle_file(file_path)
+        except Exception:
+            continue
+    return puzzle_map
+
+
 def _choose_puzzle(puzzles: list, puzzle_id: Optional[str]) -> dict:
     """按 id 选择题目；不传 id 时默认第一个。"""
     if puzzle_id is None:
@@ -82,7 +144,7 @@ def _choose_puzzle(puzzles: list, puzzle_id: Optional[str]) -> dict:
     for puzzle in puzzles:
         if puzzle.get("id") == puzzle_id:
             return puzzle
-    raise ValueError(f"题目不存在: {puzzle_id}")
+    raise ApiError(f"题目不存在: {puzzle_id}", 404)
 
 
 class GameStore:
@@ -95,10 +157,18 @@ class GameStore:
         self.current_id: Optional[str] = None
         # 每道题的 AI 上一步结果
         self.last_ai: Dict[str, dict] = {}
+        # 同一用户的请求串行修改进度（可重入，便于组合调用）
+        self.lock = threading.RLock()
+        # 对应 user_progress 表中的版本号（0 表示尚未保存）
+        self.version = 0
+        # 从数据库载入时的版本号；此后每道题最后一次变化时的版本号记在 changed 中，
+        # 供题目列表按 since 返回增量（更早的变化不在本进程内，需返回完整列表）
+        self.base_version = 0
+        self.changed: Dict[str, int] = {}
 
     def start(self, puzzle_id: Optional[str], mode: str) -> dict:
         """开始或恢复一局游戏。mode: resume/restart"""
-        puzzles = load_puzzles(PUZZLE_DIR)
+        puzzles = PUZZLE_CATALOG.load()
         puzzle = _choose_puzzle(puzzles, puzzle_id)
         puzzle_id = puzzle["id"]
 
@@ -107,7 +177,7 @@ class GameStore:
             return self.games[puzzle_id].get_state()
 
         if mode not in ("resume", "restart"):
-            raise ValueError("启动模式不支持，请使用 resume 或 restart。")
+            raise ApiError("启动模式不支持，请使用 resume 或 restart。")
 
         game = Game(title=puzzle["title"], body=puzzle["body"], puzzle_id=puzzle_id)
         self.games[puzzle_id] = game
@@ -123,20 +193,25 @@ class GameStore:
             return None
         return game.get_state()
 
-    def guess(self, ch: str) -> dict:
+    def _current_game(self) -> Game:
         if self.current_id is None:
-            raise RuntimeError("当前没有进行中的游戏，请先开始游戏。")
+            raise ApiError("当前没有进行中的游戏，请先开始游戏。")
         game = self.games.get(self.current_id)
         if game is None:
-            raise RuntimeError("当前游戏状态已丢失，请重新开始。")
-        result = game.guess(ch)
+            raise ApiError("当前游戏状态已丢失，请重新开始。")
+        return game
+
+    def guess(self, ch: str) -> dict:
+        result = self._current_game().guess(ch)
         return {"status": result.status, "reason": result.reason, "state": result.state}
 
-    def list_puzzles(self, puzzles: List[dict]) -> List[dict]:
-        """为题目列表附加进度状态。"""
+    def list_puzzles(self, puzzles: List[dict], only: Optional[Set[str]] = None) -> List[dict]:
+        """为题目列表附加进度状态；传入 only 时只返回其中的题目（序号仍按完整列表）。"""
         output = []
         for index, puzzle in enumerate(puzzles, start=1):
             puzzle_id = puzzle["id"]
+            if only is not None and puzzle_id not in only:
+                continue
             game = self.games.get(puzzle_id)
             if game is None:
                 status = "未开始"
@@ -160,76 +235,40 @@ class GameStore:
             )
         return output
 
-    def ai_step(self, ai_config: Optional[dict]) -> dict:
-        """执行一步最短解（使用标题字符的最短序列）。"""
-        if self.current_id is None:
-            raise RuntimeError("当前没有进行中的游戏，请先开始游戏。")
-        game = self.games.get(self.current_id)
-        if game is None:
-            raise RuntimeError("当前游戏状态已丢失，请重新开始。")
-
-        if game.is_complete():
-            return {"done": True, "state": game.get_state()}
-
-        previous_step = self.last_ai.get(self.current_id)
-        client = AIClient(ai_config)
-        attempts = 0
-        last_reason = "未提供原因。"
-        last_result = None
-        last_guess = ""
-        state = game.get_state()
-        guessed_correct = set(state.get("guessed_correct", []) or [])
-        guessed_wrong = set(state.get("guessed_wrong", []) or [])
-        forbidden = guessed_correct | guessed_wrong
-
-        while attempts < 3:
-            attempts += 1
-            ai_output = client.choose_next_guess(state, previous_step)
-            next_char = str(ai_output.get("guess", "")).strip()
-            reason = str(ai_output.get("reason", "")).strip() or "未提供原因。"
-            if not next_char or len(next_char) != 1:
-                previous_step = {"status": "invalid", "guess": next_char}
-                last_reason = reason
-                continue
-            if next_char in forbidden:
-                previous_step = {"status": "repeat", "guess": next_char}
-                last_reason = reason
-                continue
-            result = game.guess(next_char)
-            last_result = result
-            last_reason = reason
-            last_guess = next_char
-            break
-
-        if last_result is None:
-            raise RuntimeError("AI 多次输出重复或非法字符，请稍后重试。")
-
-        self.last_ai[self.current_id] = {
-            "guess": last_guess,
-            "reason": last_reason,
-            "status": last_result.status,
-        }
+    def ai_snapshot(self) -> Tuple[str, dict, Optional[dict]]:
+        """读取 AI 单步所需的 (当前题目 id, 状态, 上一步结果)，不修改进度。"""
+        game = self._current_game()
+        return self.current_id, game.get_state(), self.last_ai.get(self.current_id)
+
+    def apply_ai_guess(self, puzzle_id: str, expected_state: dict, guess: str, reason: str) -> dict:
+        """提交 AI 选出的字；调用 AI 期间题目或进度有变化时拒绝，以免按过期的局面落子。"""
+        game = self.games.get(puzzle_id)
+        if self.current_id != puzzle_id or game is None or game.get_state() != expected_state:
+            raise ApiError("AI 思考期间题目进度已变化，请重试。", 409)
+        result = game.guess(guess)
+        self.last_ai[puzzle_id] = {"guess": guess, "reason": reason, "status": result.status}
         return {
             "done": False,
-            "guess": last_guess,
-            "reason": last_reason,
-            "result": {"status": last_result.status, "reason": last_result.reason, "state": last_result.state},
+            "guess": guess,
+            "reason": reason,
+            "result": {"status": result.status, "reason": result.reason, "state": result.state},
         }
 
     def use_hint(self, free: bool = False) -> dict:
         """揭示一个标题字符并返回结果。"""
-        if self.current_id is None:
-            raise RuntimeError("当前没有进行中的游戏，请先开始游戏。")
-        game = self.games.get(self.current_id)
-        if game is None:
-            raise RuntimeError("当前游戏状态已丢失，请重新开始。")
-        return game.reveal_hint(free=free)
+        game = self._current_game()
+        try:
+            return game.reveal_hint(free=free)
+        except RuntimeError as exc:
+            # 引擎以 RuntimeError 表示不能再提示（已完成或已无可提示字符）
+            raise ApiError(str(exc))
 
     def to_persist_dict(self) -> dict:
         """导出当前会话的持久化数据。"""
         return {
             "current_id": self.current_id,
             "games": {puzzle_id: game.export_progress() for puzzle_id, game in self.games.items()},
+            "last_ai": dict(self.last_ai),
         }
 
     def load_from_persist(self, data: dict, puzzle_map: Dict[str, dict]) -> None:
@@ -243,19 +282,39 @@ class GameStore:
             game = Game(title=puzzle["title"], body=puzzle["body"], puzzle_id=puzzle_id)
             game.apply_progress(progress)
             self.games[puzzle_id] = game
+        last_ai = data.get("last_ai")
+        if isinstance(last_ai, dict):
+            self.last_ai = {key: value for key, value in last_ai.items() if key in self.games and isinstance(value, dict)}
+
+
+PROGRESS_UPDATE_SECONDS = metrics.REGISTRY.histogram(
+    "hanzi_progress_update_seconds", "SessionManager.update 的耗时（秒，含读取、修改与写回进度）。"
+)
+PROGRESS_SAVE_CONFLICTS = metrics.REGISTRY.counter(
+    "hanzi_progress_save_conflicts_total", "写回进度时与其他进程冲突而重试的次数。"
+)
 
 
 class SessionManager:
-    """多用户会话管理：按 user_id 区分游戏进度。"""
+    """多用户进度管理：按 user_id 把进度保存在 SQLite 的 user_progress 表中。
+
+    进程内按版本号缓存各用户的 GameStore；多个 worker 进程共享同一个数据库，
+    每次取用前比对版本号，其他进程写入过就重新加载，保证连续请求落到不同进程时进度一致。
+    """
+
+    # 与其他进程并发修改同一用户进度时的重试次数
+    MAX_UPDATE_RETRIES = 5
 
     def __init__(self, storage_path: Path) -> None:
+        # 旧版 JSON 存档，仅用于首次启动时导入
         self.storage_path = storage_path
         self.user_stores: Dict[str, GameStore] = {}
-        self._load_from_disk()
+        self._lock = threading.Lock()
+        self._import_legacy_file()
 
-    def _load_from_disk(self) -> None:
-        """加载历史存档到内存。"""
-        if not self.storage_path.exists():
+    def _import_legacy_file(self) -> None:
+        """数据库中还没有进度时，导入旧版 sessions.json。"""
+        if count_user_progress() or not self.storage_path.exists():
             return
         try:
             raw = self.storage_path.read_text(encoding="utf-8")
@@ -263,58 +322,80 @@ class SessionManager:
         except Exception:
             return
 
-        try:
-            puzzles = load_puzzles(PUZZLE_DIR)
-        except Exception:
-            puzzles = []
-        puzzle_map = {puzzle["id"]: puzzle for puzzle in puzzles}
-
+        entries: Dict[int, dict] = {}
         users_data = data.get("users")
         if isinstance(users_data, dict) and users_data:
             for user_id, session_data in users_data.items():
-                store = GameStore()
-                store.load_from_persist(session_data, puzzle_map)
-                self.user_stores[str(user_id)] = store
-            return
-
-        for session_id, session_data in data.get("sessions", {}).items():
-            user_id = get_user_id_by_session(session_id)
-            if not user_id:
-                continue
-            user_key = str(user_id)
-            if user_key in self.user_stores:
-                continue
-            store = GameStore()
-            store.load_from_persist(session_data, puzzle_map)
-            self.user_stores[user_key] = store
-
-    def save(self) -> None:
-        """将当前内存状态写回磁盘。"""
-        data = {"users": {}}
-        for user_id, store in self.user_stores.items():
-            data["users"][str(user_id)] = store.to_persist_dict()
-        _write_json_file(self.storage_path, data)
+                if str(user_id).isdigit() and isinstance(session_data, dict):
+                    entries[int(user_id)] = session_data
+        else:
+            for session_id, session_data in data.get("sessions", {}).items():
+                user_id = get_user_id_by_session(session_id)
+                if user_id and user_id not in entries and isinstance(session_data, dict):
+                    entries[user_id] = session_data
+        import_user_progress(entries)
+
+    def _load_store(self, user_id: int) -> GameStore:
+        store = GameStore()
+        saved = load_user_progress(user_id)
+        if saved:
+            data = saved["data"]
+            games_data = data.get("games")
+            puzzle_ids = list(games_data) if isinstance(games_data, dict) else []
+            store.load_from_persist(data, _load_puzzle_map(puzzle_ids))
+            store.version = int(saved["version"])
+            store.base_version = store.version
+        return store
 
     def get_store_for_user(self, user_id: int) -> GameStore:
-        """获取指定用户的存档实例，不存在则创建。"""
+        """获取指定用户的最新进度；缓存的版本落后于数据库时重新加载。"""
         user_key = str(user_id)
-        store = self.user_stores.get(user_key)
-        if store is None:
-            store = GameStore()
+        version = get_progress_version(int(user_id))
+        with self._lock:
+            store = self.user_stores.get(user_key)
+            if store is not None and store.version == version:
+                return store
+        store = self._load_store(int(user_id))
+        with self._lock:
+            current = self.user_stores.get(user_key)
+            if current is not None and current.version >= store.version:
+                return current
             self.user_stores[user_key] = store
         return store
 
+    def update(self, user_id: int, action: Callable[[GameStore], T]) -> T:
+        """在用户进度上执行 action 并写回数据库，返回 action 的结果。
+
+        同一进程内由 GameStore.lock 串行；与其他进程冲突（版本号已变化）时，
+        丢弃本地修改、重新加载后重试，因此 action 中不应包含不可重复的副作用。
+        """
+        with PROGRESS_UPDATE_SECONDS.time():
+            for _ in range(self.MAX_UPDATE_RETRIES):
+                store = self.get_store_for_user(user_id)
+                with store.lock:
+                    previous_id = store.current_id
+                    result = action(store)
+                    version = save_user_progress(int(user_id), store.to_persist_dict(), store.version)
+                    if version is not None:
+                        store.version = version
+                        # 开局、猜字、提示都作用于当前题目；切换题目时原题目的 is_current 也变了
+                        for puzzle_id in (previous_id, store.current_id):
+                            if puzzle_id:
+                                store.changed[puzzle_id] = version
+                        return result
+                PROGRESS_SAVE_CONFLICTS.inc()
+                with self._lock:
+                    if self.user_stores.get(str(user_id)) is store:
+                        self.user_stores.pop(str(user_id), None)
+        raise ApiError("进度保存冲突，请稍后重试。", 409)
+
     def remove_puzzle(self, puzzle_id: str) -> None:
-        """当题目被覆盖时，移除所有会话中的旧进度。"""
-        changed = False
-        for store in self.user_stores.values():
-            if puzzle_id in store.games:
-                store.games.pop(puzzle_id, None)
-                if store.current_id == puzzle_id:
-                    store.current_id = None
-                changed = True
-        if changed:
-            self.save()
+        """当题目被覆盖或删除时，移除所有用户的旧进度。"""
+        remove_puzzle_progress(puzzle_id)
+        with self._lock:
+            for user_key, store in list(self.user_stores.items()):
+                if puzzle_id in store.games:
+                    self.user_stores.pop(user_key, None)
 
 
 def _is_safe_filename_char(ch: str) -> bool:
@@ -348,30 +429,22 @@ def _validate_puzzle_id(raw: str) -> Optional[str]:
 def _create_puzzle_file(puzzle_id: Optional[str], title: str, body: str, overwrite: bool) -> dict:
     """创建题目文件并返回题目元信息。"""
     if not title or not title.strip():
-        raise ValueError("标题不能为空。")
+        raise ApiError("标题不能为空。")
     safe_id = _sanitize_puzzle_id(puzzle_id or "")
     if not safe_id:
         safe_id = f"puzzle_{int(time.time())}"
     file_path = PUZZLE_DIR / f"{safe_id}.txt"
     existed = file_path.exists()
     if existed and not overwrite:
-        raise ValueError("题目文件已存在，请更换文件名或勾选覆盖。")
+        raise ApiError("题目文件已存在，请更换文件名或勾选覆盖。", 409)
 
     PUZZLE_DIR.mkdir(parents=True, exist_ok=True)
     content = title.strip() + "\n" + (body or "").rstrip() + "\n"
     file_path.write_text(content, encoding="utf-8")
+    PUZZLE_CATALOG.invalidate()
     return {"id": safe_id, "title": title.strip(), "body": body or "", "overwrote": existed}
 
 
-def _write_json_file(path: Path, data: dict) -> None:
-    """安全写入 JSON 文件，避免中途写坏。"""
-    path.parent.mkdir(parents=True, exist_ok=True)
-    tmp_path = path.with_suffix(".tmp")
-    content = json.dumps(data, ensure_ascii=False, indent=2)
-    tmp_path.write_text(content, encoding="utf-8")
-    tmp_path.replace(path)
-
-
 def _safe_ai_config_info(ai_config: Optional[dict]) -> str:
     """输出可用于排查的 AI 配置信息（不包含密钥）。"""
     if not isinstance(ai_config, dict):
@@ -415,32 +488,6 @@ def _pick_daily_puzzle_id(puzzles: List[dict], date_str: str) -> str:
     return puzzles[index]["id"]
 
 
-def _load_daily_history() -> List[Dict[str, str]]:
-    raw = get_setting("daily_puzzle_history") or "[]"
-    try:
-        data = json.loads(raw)
-    except json.JSONDecodeError:
-        return []
-    if not isinstance(data, list):
-        return []
-    history = []
-    for item in data:
-        if isinstance(item, dict):
-            puzzle_id = str(item.get("puzzle_id", "")).strip()
-            date_str = str(item.get("date", "")).strip()
-            if puzzle_id:
-                history.append({"puzzle_id": puzzle_id, "date": date_str})
-        else:
-            puzzle_id = str(item).strip()
-            if puzzle_id:
-                history.append({"puzzle_id": puzzle_id, "date": ""})
-    return history
-
-
-def _save_daily_history(history: List[Dict[str, str]]) -> None:
-    set_setting("daily_puzzle_history", json.dumps(history, ensure_ascii=False))
-
-
 def _daily_pool_ids(puzzles: List[dict]) -> List[str]:
     puzzle_ids = [puzzle["id"] for puzzle in puzzles if puzzle.get("id")]
     daily_ids = set(list_daily_puzzle_ids())
@@ -452,41 +499,88 @@ def _daily_pool_ids(puzzles: List[dict]) -> List[str]:
     return [pid for pid in puzzle_ids if pid in pool]
 
 
+def _demote_played_daily_puzzles() -> None:
+    """启动时把已玩过的题目统一移出每日题池（开局时的逐题降级之外，补上旧数据与导入的进度）。"""
+    demoted = demote_played_daily_puzzles()
+    if demoted:
+        _reset_future_daily_schedule()
+        print(f"[每日题] 已将 {len(demoted)} 道玩过的题目移出每日题池。")
+
+
 def _demote_daily_if_played(puzzle_id: str) -> None:
     if not puzzle_id:
         return
     daily_ids = set(list_daily_puzzle_ids())
     if puzzle_id in daily_ids:
         set_daily_flag(puzzle_id, False)
+        # 题池变化后，预排的未来每日题需要重新挑选
+        _reset_future_daily_schedule()
+
+
+# 预排未来每日题的天数（含当天）
+DAILY_SCHEDULE_DAYS = 7
+# 当天已启用的每日题（进程内记忆，避免每次请求查询与重复降级）
+_DAILY_ACTIVE: Dict[str, str] = {}
+_DAILY_LOCK = threading.Lock()
+# 其他进程修改每日题安排后丢弃记忆
+DAILY_SCHEDULE_VERSION.subscribe(_DAILY_ACTIVE.clear)
+
+
+def _date_offset(date_str: str, days: int) -> str:
+    day = datetime.strptime(date_str, "%Y-%m-%d") + timedelta(days=days)
+    return day.strftime("%Y-%m-%d")
+
+
+def _reset_future_daily_schedule() -> None:
+    """清除明天及以后的预排（当天安排保持不变）。"""
+    delete_daily_schedule(_date_offset(_today_local_str(), 1), include_later=True)
+
+
+def _schedule_daily_puzzles(puzzles: List[dict], start_date: str, days: int) -> Dict[str, str]:
+    """为 start_date 起的 days 天补齐每日题安排，已有安排保持不变。"""
+    dates = [_date_offset(start_date, offset) for offset in range(days)]
+    schedule = list_daily_schedule(dates[0], dates[-1])
+    missing = [date_str for date_str in dates if date_str not in schedule]
+    if not missing:
+        return schedule
+    pool_ids = _daily_pool_ids(puzzles)
+    used_ids = set(list_scheduled_puzzle_ids())
+    picks = []
+    for date_str in missing:
+        unused = [pid for pid in pool_ids if pid not in used_ids]
+        if not unused:
+            break
+        seed = int(hashlib.md5(date_str.encode("utf-8")).hexdigest(), 16)
+        puzzle_id = unused[seed % len(unused)]
+        used_ids.add(puzzle_id)
+        picks.append((date_str, puzzle_id))
+    add_daily_schedule(picks)
+    return list_daily_schedule(dates[0], dates[-1])
 
 
 def _get_daily_puzzle_id(puzzles: List[dict]) -> Dict[str, str]:
     date_str = _today_local_str()
-    stored_date = get_setting("daily_puzzle_date")
-    stored_id = get_setting("daily_puzzle_id")
     puzzle_ids = {puzzle.get("id") for puzzle in puzzles if puzzle.get("id")}
-    if stored_date == date_str and stored_id:
-        if stored_id in puzzle_ids:
-            return {"date": date_str, "puzzle_id": stored_id}
-
-    pool_ids = _daily_pool_ids(puzzles)
-    if not pool_ids:
-        raise ValueError("每日题库为空，请管理员补充每日题。")
-
-    history = _load_daily_history()
-    used_ids = {item.get("puzzle_id") for item in history if item.get("puzzle_id")}
-    unused = [pid for pid in pool_ids if pid not in used_ids]
-    if not unused:
-        raise ValueError("每日题已用尽，请管理员补充每日题。")
-    seed = int(hashlib.md5(date_str.encode("utf-8")).hexdigest(), 16)
-    puzzle_id = unused[seed % len(unused)]
-    history = [item for item in history if item.get("date") != date_str]
-    history.append({"date": date_str, "puzzle_id": puzzle_id})
-    _save_daily_history(history)
-    if puzzle_id in set(list_daily_puzzle_ids()):
-        set_daily_flag(puzzle_id, False)
-    set_setting("daily_puzzle_date", date_str)
-    set_setting("daily_puzzle_id", puzzle_id)
+    DAILY_SCHEDULE_VERSION.check()
+    active_id = _DAILY_ACTIVE.get(date_str)
+    if active_id and active_id in puzzle_ids:
+        return {"date": date_str, "puzzle_id": active_id}
+
+    with _DAILY_LOCK:
+        schedule = _schedule_daily_puzzles(puzzles, date_str, DAILY_SCHEDULE_DAYS)
+        puzzle_id = schedule.get(date_str)
+        if puzzle_id and puzzle_id not in puzzle_ids:
+            # 当天题目已被删除，重新挑选
+            delete_daily_schedule(date_str)
+            puzzle_id = _schedule_daily_puzzles(puzzles, date_str, 1).get(date_str)
+        if not puzzle_id:
+            if not _daily_pool_ids(puzzles):
+                raise ApiError("每日题库为空，请管理员补充每日题。", 503)
+            raise ApiError("每日题已用尽，请管理员补充每日题。", 503)
+        if puzzle_id in set(list_daily_puzzle_ids()):
+            set_daily_flag(puzzle_id, False)
+        _DAILY_ACTIVE.clear()
+        _DAILY_ACTIVE[date_str] = puzzle_id
     return {"date": date_str, "puzzle_id": puzzle_id}
 
 
@@ -501,838 +595,1405 @@ def _local_day_range_utc(date_str: str) -> Dict[str, str]:
     }
 
 
-def _daily_history_map() -> Dict[str, str]:
-    history = _load_daily_history()
-    mapping = {}
-    for item in history:
-        date_str = item.get("date", "")
-        puzzle_id = item.get("puzzle_id", "")
-        if date_str and puzzle_id:
-            mapping[date_str] = puzzle_id
-    return mapping
-
-
 init_db()
 SESSION_MANAGER = SessionManager(SESSION_FILE)
+# 开局/猜测统计走缓冲队列，批量写入 SQLite
+TELEMETRY = TelemetryQueue()
+# 单题排行榜的内存有序索引（按需从 results 加载）
+LEADERBOARDS = LeaderboardIndex()
+metrics.REGISTRY.callback(
+    "hanzi_telemetry_pending", "尚未写入数据库的开局/猜测统计条数。", "gauge", lambda: {(): TELEMETRY.pending_count()}
+)
+# 访问日志默认关闭，由 main() 按命令行参数开启
+ACCESS_LOG = AccessLog()
+metrics.REGISTRY.callback(
+    "hanzi_access_log_pending", "等待写入文件的访问日志条数。", "gauge", lambda: {(): ACCESS_LOG.pending_count()}
+)
 
 
-class RequestHandler(BaseHTTPRequestHandler):
-    """简单的本地 HTTP 服务：提供静态页面与 JSON 接口。"""
-
-    def _send_json(self, payload: dict, status_code: int = 200) -> None:
-        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
-        self.send_response(status_code)
-        self.send_header("Content-Type", "application/json; charset=utf-8")
-        self.send_header("Content-Length", str(len(data)))
-        self.end_headers()
-        self.wfile.write(data)
-
-    def _send_file(self, file_path: Path, content_type: str) -> None:
-        data = file_path.read_bytes()
-        self.send_response(200)
-        self.send_header("Content-Type", content_type)
-        self.send_header("Content-Length", str(len(data)))
-        self.send_header("Cache-Control", "no-store")
-        self.end_headers()
-        self.wfile.write(data)
-
-    def _read_json_body(self) -> dict:
-        length = int(self.headers.get("Content-Length", "0"))
-        if length <= 0:
-            return {}
-        raw = self.rfile.read(length).decode("utf-8")
-        if not raw.strip():
-            return {}
-        return json.loads(raw)
-
-    def _get_session_id(self) -> Optional[str]:
-        """从请求头读取 session_id。"""
-        raw = self.headers.get("X-Session-Id", "")
-        if not raw:
-            return None
-        cleaned = "".join(ch for ch in raw if ch.isalnum() or ch in ("-", "_"))
-        return cleaned or None
-
-    def _require_session_id(self) -> Optional[str]:
-        """确保请求携带有效的 session_id。"""
-        session_id = self._get_session_id()
-        if not session_id:
-            self._send_json({"ok": False, "message": "缺少会话编号，请刷新页面重试。"}, status_code=400)
-            return None
-        return session_id
-
-    def _get_admin_token(self) -> str:
-        return self.headers.get("X-Admin-Token", "")
-
-    def _require_admin(self) -> bool:
-        if not _get_admin_password():
-            self._send_json({"ok": False, "message": "管理员密码未设置。"}, status_code=401)
-            return False
-        token = self._get_admin_token()
-        if not token or not _is_admin_token(token):
-            self._send_json({"ok": False, "message": "管理员验证失败。"}, status_code=401)
-            return False
-        return True
+def _record_completion(user: Dict[str, object], state: dict) -> None:
+    """通关后写入成绩，并同步内存排行榜。"""
+    puzzle_id = str(state["puzzle_id"])
+    # 通关用时依赖开局时间：开局记录可能还在统计缓冲中，只取这一条，不必整体落库
+    started_ts = TELEMETRY.pending_first_ts(int(user["id"]), puzzle_id)
+    stored = record_result(int(user["id"]), puzzle_id, int(state["guess_count"]), started_ts)
+    if stored:
+        LEADERBOARDS.record(
+            puzzle_id,
+            int(user["id"]),
+            str(user.get("nickname", "")),
+            int(stored["guess_count"]),
+            int(stored["completed_ts"]),
+            str(stored["completed_at"]),
+            int(stored["version"]),
+        )
+        # 不等下一次轮询版本号，立即推送新的榜单
+        LIVE_FEED.notify()
+
+
+class PooledHTTPServer(HTTPServer):
+    """固定大小线程池处理请求的 HTTP 服务，避免慢请求阻塞其他玩家。"""
+
+    # 默认 backlog 只有 5，并发连接多时会触发 SYN 重传导致秒级延迟
+    request_queue_size = 128
+    # 停机时等待处理中的请求完成的最长时间（秒），由 main() 按 --shutdown-timeout 设置
+    shutdown_timeout = 10.0
+
+    def __init__(self, server_address, handler_class, max_workers: int = 32) -> None:
+        super().__init__(server_address, handler_class)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="http")
+        self._connections_lock = threading.Lock()
+        # 连接全部处理完时通知 drain()
+        self._connections_idle = threading.Condition(self._connections_lock)
+        self._connections = set()
+        # 已接受、等待工作线程的连接数
+        self._pending = 0
+        # 当前线程正在处理的连接的入队时间，由 RequestHandler.setup 取走
+        self._local = threading.local()
+        # 停机中：不再接受新连接，处理完当前请求的连接随即关闭
+        self.draining = False
+        # 停机时超过 shutdown_timeout 仍未完成、被强制断开的连接数
+        self.unfinished = 0
+
+    def queue_depth(self) -> int:
+        with self._connections_lock:
+            return self._pending
+
+    def take_queued_at(self) -> Optional[float]:
+        queued_at = getattr(self._local, "queued_at", None)
+        self._local.queued_at = None
+        return queued_at
+
+    def process_request(self, request, client_address) -> None:
+        with self._connections_lock:
+            self._pending += 1
+        self._executor.submit(self._process_request_worker, request, client_address, time.monotonic())
+
+    def _process_request_worker(self, request, client_address, queued_at: float) -> None:
+        with self._connections_lock:
+            self._pending -= 1
+            self._connections.add(request)
+        self._local.queued_at = queued_at
+        try:
+            self.finish_request(request, client_address)
+        except OSError:
+            # 停机超时被强制断开的连接，不再打印堆栈
+            if not self.draining:
+                self.handle_error(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self._connections_lock:
+                self._connections.discard(request)
+                if not self._connections and not self._pending:
+                    self._connections_idle.notify_all()
+            self.shutdown_request(request)
+
+    def drain(self, timeout: float) -> int:
+        """停止接受新连接，最多等待 timeout 秒让已接受的请求处理完，返回被强制断开的连接数。"""
+        self.draining = True
+        self.socket.close()
+        # 关闭读方向：等待下一个请求的 keep-alive 连接与 WebSocket 立即结束，正在写的响应不受影响
+        with self._connections_lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self._connections_lock:
+            while self._connections or self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._connections_idle.wait(remaining)
+            stuck = list(self._connections)
+            unfinished = len(stuck) + self._pending
+        # 超时仍在处理的连接直接断开，阻塞在读写上的线程随之出错退出
+        for connection in stuck:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        return unfinished
 
-    def _require_user(self) -> Optional[Dict[str, object]]:
-        session_id = self._require_session_id()
-        if not session_id:
-            return None
-        user = get_user_by_session(session_id)
-        if not user:
-            self._send_json({"ok": False, "message": "请先登录，再开始游戏。"}, status_code=401)
-            return None
-        return user
+    def server_close(self) -> None:
+        if not self.draining:
+            self.unfinished = self.drain(self.shutdown_timeout)
+        super().server_close()
+        # 排队中尚未开始的连接已超过停机时限，不再处理
+        self._executor.shutdown(wait=True, cancel_futures=True)
 
-    def _require_admin_user(self) -> Optional[Dict[str, object]]:
-        session_id = self._require_session_id()
-        if not session_id:
-            return None
-        user = get_user_by_session(session_id)
-        if not user:
-            self._send_json({"ok": False, "message": "请先在游戏页面登录昵称。"}, status_code=401)
-            return None
-        return user
-
-    def _require_ai_access(self) -> bool:
-        access_code = _get_ai_access_code()
-        if not access_code:
-            self._send_json({"ok": False, "message": "AI 访问码未配置，请联系管理员。"}, status_code=403)
-            return False
-        provided = self.headers.get("X-AI-Access-Code", "").strip()
-        if not provided or provided != access_code:
-            self._send_json({"ok": False, "message": "AI 访问码无效。"}, status_code=403)
-            return False
-        return True
 
-    def do_GET(self) -> None:
-        parsed = urlparse(self.path)
-        path = parsed.path
-        query = parse_qs(parsed.query)
-        # 静态资源路由
-        if path == "/":
-            return self._send_file(WEB_DIR / "index.html", "text/html; charset=utf-8")
-        if path in ("/admin", "/admin/"):
-            return self._send_file(WEB_DIR / "admin.html", "text/html; charset=utf-8")
-        if path == "/style.css":
-            return self._send_file(WEB_DIR / "style.css", "text/css; charset=utf-8")
-        if path == "/app.js":
-            return self._send_file(WEB_DIR / "app.js", "application/javascript; charset=utf-8")
-        if path == "/admin.js":
-            return self._send_file(WEB_DIR / "admin.js", "application/javascript; charset=utf-8")
-
-        # JSON 接口
-        if path == "/api/puzzles":
-            try:
-                session_id = self._require_session_id()
-                if not session_id:
-                    return None
-                puzzles = load_puzzles(PUZZLE_DIR)
-                user = get_user_by_session(session_id)
-                if user:
-                    store = SESSION_MANAGER.get_store_for_user(int(user["id"]))
-                else:
-                    store = GameStore()
-                data = store.list_puzzles(puzzles)
-                return self._send_json({"ok": True, "puzzles": data})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=500)
-
-        if path == "/api/state":
-            user = self._require_user()
-            if not user:
-                return None
-            store = SESSION_MANAGER.get_store_for_user(int(user["id"]))
-            return self._send_json({"ok": True, "state": store.get_state()})
-
-        if path == "/api/me":
-            session_id = self._require_session_id()
-            if not session_id:
-                return None
-            user = get_user_by_session(session_id)
-            return self._send_json({"ok": True, "user": user})
-
-        if path == "/api/checkin":
-            user = self._require_user()
-            if not user:
-                return None
-            date_str = _today_local_str()
-            info = get_daily_checkin(int(user["id"]), date_str)
-            if not info:
-                return self._send_json({"ok": True, "date": date_str, "claimed": False, "free_hints": 0})
-            return self._send_json(
-                {
-                    "ok": True,
-                    "date": date_str,
-                    "claimed": True,
-                    "free_hints": info.get("free_hints", 0),
-                }
-            )
+def _clean_session_id(raw: str) -> Optional[str]:
+    if not raw:
+        return None
+    cleaned = "".join(ch for ch in raw if ch.isalnum() or ch in ("-", "_"))
+    return cleaned or None
 
-        if path == "/api/admin/check":
-            if not _get_admin_password():
-                return self._send_json({"ok": False, "message": "管理员密码未设置。"}, status_code=401)
-            token = self._get_admin_token()
-            if token and _is_admin_token(token):
-                return self._send_json({"ok": True})
-            return self._send_json({"ok": False, "message": "管理员验证失败。"}, status_code=401)
-
-        if path == "/api/admin/ai/profiles":
-            if not self._require_admin():
-                return None
-            profiles = list_ai_profiles(include_secret=True)
-            return self._send_json({"ok": True, "profiles": profiles})
-
-        if path == "/api/admin/ai/access":
-            if not self._require_admin():
-                return None
-            access_code = _get_ai_access_code()
-            if not access_code:
-                return self._send_json({"ok": True, "configured": False})
-            return self._send_json(
-                {"ok": True, "configured": True, "length": len(access_code), "access_code": access_code}
-            )
 
-        if path == "/api/admin/puzzles":
-            if not self._require_admin():
-                return None
-            user = self._require_admin_user()
-            if not user:
-                return None
-            owned_ids = set(list_puzzle_ids_by_author(int(user["id"])))
-            admin_difficulties = list_puzzle_admin_difficulties()
-            daily_pool = set(list_daily_puzzle_ids())
-            played_ids = set(list_played_puzzle_ids())
-            demote_ids = daily_pool & played_ids
-            if demote_ids:
-                for puzzle_id in demote_ids:
-                    set_daily_flag(puzzle_id, False)
-                daily_pool -= demote_ids
-            puzzles = load_puzzles(PUZZLE_DIR)
-            data = []
-            for puzzle in puzzles:
-                puzzle_id = puzzle.get("id")
-                if puzzle_id not in owned_ids:
-                    if not _is_default_admin_user(user):
-                        continue
-                    author_id = get_puzzle_author_id(str(puzzle_id))
-                    if author_id is not None:
-                        continue
-                data.append(
-                    {
-                        "id": puzzle_id,
-                        "title": puzzle.get("title", ""),
-                        "body": puzzle.get("body", ""),
-                        "admin_difficulty": admin_difficulties.get(str(puzzle_id), ""),
-                        "is_daily": puzzle_id in daily_pool,
-                        "is_played": puzzle_id in played_ids,
-                    }
-                )
-            return self._send_json({"ok": True, "puzzles": data})
-
-        if path == "/api/admin/users":
-            if not self._require_admin():
-                return None
-            limit_raw = (query.get("limit") or ["100"])[0]
-            try:
-                limit = max(1, min(500, int(limit_raw)))
-            except (TypeError, ValueError):
-                limit = 100
-            users = list_users(limit=limit)
-            return self._send_json({"ok": True, "users": users})
-
-        if path == "/api/admin/daily/auto":
-            if not self._require_admin():
-                return None
-            enabled = get_setting("daily_auto_unplayed") == "1"
-            return self._send_json({"ok": True, "enabled": enabled})
-
-        if path == "/api/admin/author_stats":
-            if not self._require_admin():
-                return None
-            limit_raw = (query.get("limit") or ["50"])[0]
-            try:
-                limit = max(1, min(200, int(limit_raw)))
-            except (TypeError, ValueError):
-                limit = 50
-            stats = list_author_stats(limit=limit)
-            return self._send_json({"ok": True, "stats": stats})
-
-        if path == "/api/ai/config":
-            config = get_active_ai_config()
-            access_configured = bool(_get_ai_access_code())
-            if not config:
-                return self._send_json(
-                    {"ok": True, "configured": False, "access_configured": access_configured}
-                )
-            return self._send_json(
-                {
-                    "ok": True,
-                    "configured": True,
-                    "access_configured": access_configured,
-                    "name": config.get("name", ""),
-                    "base_url": config.get("base_url", ""),
-                    "model": config.get("model", ""),
-                }
-            )
+def _get_session_id(request: Request) -> Optional[str]:
+    """从请求头读取 session_id。"""
+    return _clean_session_id(request.header("X-Session-Id"))
+
+
+def _require_session_id(request: Request) -> str:
+    """确保请求携带有效的 session_id。"""
+    session_id = _get_session_id(request)
+    if not session_id:
+        raise ApiError("缺少会话编号，请刷新页面重试。", 400)
+    return session_id
+
+
+def _get_admin_token(request: Request) -> str:
+    token = request.header("X-Admin-Token")
+    if token:
+        return token
+    # Prometheus 等抓取工具使用 Authorization: Bearer <令牌>
+    scheme, _, credentials = request.header("Authorization").partition(" ")
+    return credentials.strip() if scheme.lower() == "bearer" else ""
+
+
+def _require_admin(request: Request) -> None:
+    if not _get_admin_password():
+        raise ApiError("管理员密码未设置。", 401)
+    token = _get_admin_token(request)
+    if not token or not _is_admin_token(token):
+        raise ApiError("管理员验证失败。", 401)
+
+
+def _session_user(request: Request, session_id: str) -> Optional[Dict[str, object]]:
+    """按会话编号查找登录用户，并记在请求上供访问日志使用。"""
+    user = get_user_by_session(session_id)
+    if user:
+        request.user_id = int(user["id"])
+    return user
+
+
+def _require_user(request: Request) -> Dict[str, object]:
+    session_id = _require_session_id(request)
+    user = _session_user(request, session_id)
+    if not user:
+        raise ApiError("请先登录，再开始游戏。", 401)
+    return user
+
+
+def _require_admin_user(request: Request) -> Dict[str, object]:
+    session_id = _require_session_id(request)
+    user = _session_user(request, session_id)
+    if not user:
+        raise ApiError("请先在游戏页面登录昵称。", 401)
+    return user
+
+
+def _check_ai_access_code(provided: str) -> None:
+    access_code = _get_ai_access_code()
+    if not access_code:
+        raise ApiError("AI 访问码未配置，请联系管理员。", 403)
+    if not provided or provided != access_code:
+        raise ApiError("AI 访问码无效。", 403)
 
-        if path == "/api/daily":
-            try:
-                puzzles = load_puzzles(PUZZLE_DIR)
-                daily = _get_daily_puzzle_id(puzzles)
-                index_map = {puzzle["id"]: idx for idx, puzzle in enumerate(puzzles, start=1)}
-                created_map = {puzzle["id"]: puzzle.get("created_at", "") for puzzle in puzzles}
-                puzzle_id = daily["puzzle_id"]
-                return self._send_json(
-                    {
-                        "ok": True,
-                        "date": daily["date"],
-                        "puzzle_id": puzzle_id,
-                        "index": index_map.get(puzzle_id),
-                        "created_at": created_map.get(puzzle_id, ""),
-                    }
-                )
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if path == "/api/daily/leaderboard":
-            limit_raw = (query.get("limit") or ["5"])[0]
-            try:
-                limit = max(1, min(50, int(limit_raw)))
-            except (TypeError, ValueError):
-                limit = 5
-            try:
-                puzzles = load_puzzles(PUZZLE_DIR)
-                daily = _get_daily_puzzle_id(puzzles)
-                time_range = _local_day_range_utc(daily["date"])
-                entries = get_leaderboard_between(
-                    daily["puzzle_id"], time_range["start"], time_range["end"], limit=limit
-                )
-                count = get_completion_count_between(
-                    daily["puzzle_id"], time_range["start"], time_range["end"]
-                )
-                return self._send_json(
-                    {
-                        "ok": True,
-                        "date": daily["date"],
-                        "puzzle_id": daily["puzzle_id"],
-                        "entries": entries,
-                        "count": count,
-                    }
-                )
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if path == "/api/daily/trend":
-            days_raw = (query.get("days") or ["7"])[0]
-            try:
-                days = max(1, min(14, int(days_raw)))
-            except (TypeError, ValueError):
-                days = 7
-            try:
-                puzzles = load_puzzles(PUZZLE_DIR)
-                daily = _get_daily_puzzle_id(puzzles)
-                history_map = _daily_history_map()
-                today = datetime.strptime(daily["date"], "%Y-%m-%d")
-                output = []
-                for offset in range(days - 1, -1, -1):
-                    day = today - timedelta(days=offset)
-                    day_str = day.strftime("%Y-%m-%d")
-                    puzzle_id = history_map.get(day_str)
-                    if day_str == daily["date"]:
-                        puzzle_id = daily["puzzle_id"]
-                    if puzzle_id:
-                        time_range = _local_day_range_utc(day_str)
-                        count = get_completion_count_between(
-                            puzzle_id, time_range["start"], time_range["end"]
-                        )
-                    else:
-                        count = 0
-                    output.append({"date": day_str, "puzzle_id": puzzle_id or "", "count": count})
-                return self._send_json({"ok": True, "items": output})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if path == "/api/difficulty/board":
-            limit_raw = (query.get("limit") or ["50"])[0]
-            try:
-                limit = max(1, min(200, int(limit_raw)))
-            except (TypeError, ValueError):
-                limit = 50
-            try:
-                puzzles = load_puzzles(PUZZLE_DIR)
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-            index_map = {puzzle["id"]: idx for idx, puzzle in enumerate(puzzles, start=1)}
-            created_map = {puzzle["id"]: puzzle.get("created_at", "") for puzzle in puzzles}
-            stats = list_puzzle_difficulty_stats(limit=limit)
-            data = []
-            for stat in stats:
-                puzzle_id = stat.get("puzzle_id")
-                data.append(
-                    {
-                        **stat,
-                        "index": index_map.get(puzzle_id),
-                        "created_at": created_map.get(puzzle_id, ""),
-                    }
-                )
-            return self._send_json({"ok": True, "stats": data})
-
-        if path == "/api/difficulty/mine":
-            user = self._require_user()
-            if not user:
-                return None
-            puzzle_id = _validate_puzzle_id((query.get("puzzle_id") or [""])[0])
-            if not puzzle_id:
-                return self._send_json({"ok": False, "message": "缺少 puzzle_id。"}, status_code=400)
-            vote = get_difficulty_vote(int(user["id"]), puzzle_id)
-            return self._send_json({"ok": True, "difficulty": vote})
-
-        if path == "/api/overall_leaderboard":
-            limit_raw = (query.get("limit") or ["50"])[0]
-            try:
-                limit = max(1, min(200, int(limit_raw)))
-            except (TypeError, ValueError):
-                limit = 50
-            stats = list_overall_leaderboard(limit=limit)
-            return self._send_json({"ok": True, "stats": stats})
-
-        if path == "/api/author_stats":
-            limit_raw = (query.get("limit") or ["50"])[0]
-            try:
-                limit = max(1, min(200, int(limit_raw)))
-            except (TypeError, ValueError):
-                limit = 50
-            stats = list_author_stats(limit=limit)
-            return self._send_json({"ok": True, "stats": stats})
-
-        if path == "/api/leaderboard":
-            puzzle_id = (query.get("puzzle_id") or [""])[0]
-            if not puzzle_id:
-                return self._send_json({"ok": False, "message": "缺少 puzzle_id。"}, status_code=400)
-            limit_raw = (query.get("limit") or ["10"])[0]
-            try:
-                limit = max(1, min(50, int(limit_raw)))
-            except (TypeError, ValueError):
-                limit = 10
-            entries = get_leaderboard(puzzle_id, limit=limit)
-            return self._send_json({"ok": True, "entries": entries})
 
-        return self._send_json({"ok": False, "message": "未找到对应的接口。"}, status_code=404)
+def _require_ai_access(request: Request) -> None:
+    _check_ai_access_code(request.header("X-AI-Access-Code").strip())
 
-    def do_POST(self) -> None:
+
+def _require_puzzle_id(raw: str, message: str = "题目 id 不合法。") -> str:
+    puzzle_id = _validate_puzzle_id(raw)
+    if not puzzle_id:
+        raise ApiError(message, 400)
+    return puzzle_id
+
+
+def _check_puzzle_owner(user: Dict[str, object], puzzle_id: str, not_owner: str, action: str) -> Optional[int]:
+    """校验当前管理员能否操作该题目，返回作者 id（未归属时为 None）。"""
+    author_id = get_puzzle_author_id(puzzle_id)
+    if author_id and author_id != int(user["id"]):
+        raise ApiError(not_owner, 403)
+    if author_id is None and not _is_default_admin_user(user):
+        raise ApiError(f"该题目未归属，只能由 Admin {action}。", 403)
+    return author_id
+
+
+ROUTER = Router()
+PROFILER = Profiler()
+# 限流分组见路由的 rate_limit 参数；过载阈值由 main() 按线程数设置
+RATE_LIMITER = RateLimiter()
+ADMISSION = AdmissionControl()
+# 最外层：分析结果包含压缩等中间件的开销
+ROUTER.use(PROFILER.middleware)
+# 在压缩之前：被拒绝的请求不做多余的工作
+ROUTER.use(rate_limit_middleware(RATE_LIMITER, ADMISSION, _get_session_id))
+ROUTER.use(gzip_middleware())
+# 公开榜单的响应缓存（见路由的 cache_ttl 参数）：成绩等数据的版本、日期或题目目录变化时作废
+RESPONSE_CACHE = ResponseCache(
+    validator=lambda: (query_data_version(), _today_local_str(), PUZZLE_CATALOG.version())
+)
+# 最内层：缓存的是处理函数的结果，命中时已带 gzip 版本，压缩中间件直接放行
+ROUTER.use(response_cache_middleware(RESPONSE_CACHE))
+
+
+# 静态资源路由
+@ROUTER.get("/")
+def _page_index(request: Request) -> Response:
+    return STATIC_FILES.response(request, "index.html")
+
+
+@ROUTER.get("/admin", "/admin/")
+def _page_admin(request: Request) -> Response:
+    return STATIC_FILES.response(request, "admin.html")
+
+
+@ROUTER.get("/style.css")
+def _asset_style(request: Request) -> Response:
+    return STATIC_FILES.response(request, "style.css")
+
+
+@ROUTER.get("/app.js")
+def _asset_app(request: Request) -> Response:
+    return STATIC_FILES.response(request, "app.js")
+
+
+@ROUTER.get("/admin.js")
+def _asset_admin(request: Request) -> Response:
+    return STATIC_FILES.response(request, "admin.js")
+
+
+# 玩家接口
+def _parse_list_version(raw: str) -> Optional[Tuple[str, int, int]]:
+    """解析题目列表的版本号：<题目目录版本>.<用户 id>.<进度版本>。"""
+    parts = raw.strip().strip('"').split(".")
+    if len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+        return None
+    return parts[0], int(parts[1]), int(parts[2])
+
+
+@ROUTER.get("/api/puzzles")
+def _api_puzzles(request: Request) -> Response:
+    session_id = _require_session_id(request)
+    catalog_version, puzzles = PUZZLE_CATALOG.snapshot()
+    user = _session_user(request, session_id)
+    if user:
+        user_id = int(user["id"])
+        store = SESSION_MANAGER.get_store_for_user(user_id)
+    else:
+        user_id = 0
+        store = GameStore()
+    with store.lock:
+        # 题目增删改或该用户开局、猜字、通关后版本号才变化，未变化时返回 304
+        version = f"{catalog_version}.{user_id}.{store.version}"
+        headers = {"ETag": f'"{version}"', "Cache-Control": "private, no-cache", "Vary": "X-Session-Id"}
+        if_none_match = request.header("If-None-Match")
+        if if_none_match and etag_matches(if_none_match, (f'"{version}"', f'"{version}-gz"')):
+            return Response(b"", status_code=304, content_type="", headers=headers)
+        # since 为客户端上次拿到的 version：只返回之后有变化的题目
+        only = None
+        since = _parse_list_version(request.arg("since"))
+        if since and since[:2] == (catalog_version, user_id) and store.base_version <= since[2] <= store.version:
+            only = {puzzle_id for puzzle_id, changed in store.changed.items() if changed > since[2]}
+        data = store.list_puzzles(puzzles, only)
+    response = Response.json({"ok": True, "version": version, "delta": only is not None, "puzzles": data})
+    response.headers.update(headers)
+    return response
+
+
+def _current_state(user: Dict[str, object]) -> Optional[dict]:
+    store = SESSION_MANAGER.get_store_for_user(int(user["id"]))
+    with store.lock:
+        return store.get_state()
+
+
+@ROUTER.get("/api/state")
+def _api_state(request: Request) -> dict:
+    user = _require_user(request)
+    return {"ok": True, "state": _current_state(user)}
+
+
+@ROUTER.get("/api/me")
+def _api_me(request: Request) -> dict:
+    session_id = _require_session_id(request)
+    return {"ok": True, "user": _session_user(request, session_id)}
+
+
+@ROUTER.post("/api/login")
+def _api_login(request: Request) -> dict:
+    payload = request.json()
+    session_id = _require_session_id(request)
+    nickname = str(payload.get("nickname", "")).strip()
+    if not nickname:
+        raise ApiError("昵称不能为空。")
+    if len(nickname) > 20:
+        raise ApiError("昵称长度不能超过 20。")
+    user = upsert_user(nickname)
+    bind_session(session_id, int(user["id"]))
+    request.user_id = int(user["id"])
+    return {"ok": True, "user": user}
+
+
+def _start_game(user: Dict[str, object], puzzle_id: Optional[str], mode: str) -> dict:
+    existed, state = SESSION_MANAGER.update(
+        int(user["id"]),
+        lambda store: (bool(puzzle_id and puzzle_id in store.games), store.start(puzzle_id, mode)),
+    )
+    if mode == "restart" or not existed:
+        TELEMETRY.record_attempt(int(user["id"]), str(state["puzzle_id"]))
+        _demote_daily_if_played(str(state["puzzle_id"]))
+    return state
+
+
+def _submit_guess(user: Dict[str, object], guess_char: str) -> dict:
+    result = SESSION_MANAGER.update(int(user["id"]), lambda store: store.guess(guess_char))
+    if result.get("state"):
+        TELEMETRY.record_guess(
+            int(user["id"]),
+            str(result["state"]["puzzle_id"]),
+            str(result.get("status", "")),
+        )
+    if result["state"].get("is_complete"):
+        _record_completion(user, result["state"])
+    return result
+
+
+def _use_hint(user: Dict[str, object]) -> dict:
+    date_str = _today_local_str()
+    free_used = consume_daily_hint(int(user["id"]), date_str)
+    result = SESSION_MANAGER.update(int(user["id"]), lambda store: store.use_hint(free=free_used))
+    state = result.get("state")
+    if state and state.get("is_complete"):
+        _record_completion(user, state)
+    return {
+        "revealed": result.get("revealed"),
+        "penalty": result.get("penalty", 0),
+        "free_used": free_used,
+        "state": state,
+    }
+
+
+def _choose_ai_guess(ai_config: dict, state: dict, previous_step: Optional[dict]) -> Tuple[str, str]:
+    """请 AI 选下一个字（最多 3 次，跳过重复或非法的输出），返回 (字, 理由)。"""
+    client = AIClient(ai_config)
+    forbidden = set(state.get("guessed_correct", []) or []) | set(state.get("guessed_wrong", []) or [])
+    for _ in range(3):
+        ai_output = client.choose_next_guess(state, previous_step)
+        next_char = str(ai_output.get("guess", "")).strip()
+        reason = str(ai_output.get("reason", "")).strip() or "未提供原因。"
+        if not next_char or len(next_char) != 1:
+            previous_step = {"status": "invalid", "guess": next_char}
+            continue
+        if next_char in forbidden:
+            previous_step = {"status": "repeat", "guess": next_char}
+            continue
+        return next_char, reason
+    raise ApiError("AI 多次输出重复或非法字符，请稍后重试。", 502)
+
+
+def _call_ai(call: Callable[[], T], action: str, ai_config: Optional[dict]) -> T:
+    """执行 AI 请求；失败时记录日志，并以 502 返回 AI 接口给出的原因（便于排查配置）。"""
+    try:
+        return call()
+    except Exception as exc:
+        print(f"[AI] {action}失败: {exc} | {_safe_ai_config_info(ai_config)}")
+        if isinstance(exc, ApiError):
+            raise
+        raise ApiError(f"AI {action}失败：{exc}", 502) from exc
+
+
+def _run_ai_step(user: Dict[str, object]) -> dict:
+    user_id = int(user["id"])
+    ai_config = get_active_ai_config()
+    if not ai_config:
+        raise ApiError("AI 尚未配置，请在管理员页面设置。", 503)
+    # 调用 AI（可能耗时数十秒、按次计费）不放进 update：既不占着该用户的进度锁，版本冲突重试时也不会重复调用
+    store = SESSION_MANAGER.get_store_for_user(user_id)
+    with store.lock:
+        puzzle_id, state, previous_step = store.ai_snapshot()
+    if state.get("is_complete"):
+        return {"done": True, "state": state}
+    guess, reason = _call_ai(lambda: _choose_ai_guess(ai_config, state, previous_step), "调用", ai_config)
+    result = SESSION_MANAGER.update(user_id, lambda store: store.apply_ai_guess(puzzle_id, state, guess, reason))
+    status = result.get("result", {}).get("status")
+    state = result.get("result", {}).get("state")
+    if state and status:
+        TELEMETRY.record_guess(int(user["id"]), str(state["puzzle_id"]), str(status))
+    if state and state.get("is_complete"):
+        _record_completion(user, state)
+    print(f"[AI] 猜测={result.get('guess')} 状态={status} 理由={result.get('reason')}")
+    return result
+
+
+@ROUTER.post("/api/start")
+def _api_start(request: Request) -> dict:
+    payload = request.json()
+    user = _require_user(request)
+    state = _start_game(user, payload.get("puzzle_id"), payload.get("mode", "resume"))
+    return {"ok": True, "state": state}
+
+
+@ROUTER.post("/api/guess", rate_limit="guess")
+def _api_guess(request: Request) -> dict:
+    payload = request.json()
+    user = _require_user(request)
+    return {"ok": True, "result": _submit_guess(user, payload.get("ch", ""))}
+
+
+@ROUTER.post("/api/hint", rate_limit="hint")
+def _api_hint(request: Request) -> dict:
+    request.json()
+    user = _require_user(request)
+    return {"ok": True, **_use_hint(user)}
+
+
+@ROUTER.get("/api/checkin")
+def _api_checkin(request: Request) -> dict:
+    user = _require_user(request)
+    date_str = _today_local_str()
+    info = get_daily_checkin(int(user["id"]), date_str)
+    if not info:
+        return {"ok": True, "date": date_str, "claimed": False, "free_hints": 0}
+    return {"ok": True, "date": date_str, "claimed": True, "free_hints": info.get("free_hints", 0)}
+
+
+@ROUTER.post("/api/checkin")
+def _api_claim_checkin(request: Request) -> dict:
+    request.json()
+    user = _require_user(request)
+    date_str = _today_local_str()
+    info = claim_daily_checkin(int(user["id"]), date_str, reward=1)
+    return {"ok": True, "date": date_str, "claimed": True, "free_hints": info.get("free_hints", 0)}
+
+
+@ROUTER.get("/api/ai/config")
+def _api_ai_config(request: Request) -> dict:
+    config = get_active_ai_config()
+    access_configured = bool(_get_ai_access_code())
+    if not config:
+        return {"ok": True, "configured": False, "access_configured": access_configured}
+    return {
+        "ok": True,
+        "configured": True,
+        "access_configured": access_configured,
+        "name": config.get("name", ""),
+        "base_url": config.get("base_url", ""),
+        "model": config.get("model", ""),
+    }
+
+
+@ROUTER.post("/api/ai/step", rate_limit="ai_step")
+def _api_ai_step(request: Request) -> dict:
+    request.json()
+    user = _require_user(request)
+    _require_ai_access(request)
+    return {"ok": True, **_run_ai_step(user)}
+
+
+# 每日题与榜单
+@ROUTER.get("/api/daily", cache_ttl=30)
+def _api_daily(request: Request) -> dict:
+    puzzles = PUZZLE_CATALOG.load()
+    daily = _get_daily_puzzle_id(puzzles)
+    index_map = {puzzle["id"]: idx for idx, puzzle in enumerate(puzzles, start=1)}
+    created_map = {puzzle["id"]: puzzle.get("created_at", "") for puzzle in puzzles}
+    puzzle_id = daily["puzzle_id"]
+    return {
+        "ok": True,
+        "date": daily["date"],
+        "puzzle_id": puzzle_id,
+        "index": index_map.get(puzzle_id),
+        "created_at": created_map.get(puzzle_id, ""),
+    }
+
+
+def _daily_leaderboard_payload(limit: int) -> dict:
+    puzzles = PUZZLE_CATALOG.load()
+    daily = _get_daily_puzzle_id(puzzles)
+    time_range = _local_day_range_utc(daily["date"])
+    entries = get_leaderboard_between(daily["puzzle_id"], time_range["start"], time_range["end"], limit=limit)
+    count = get_completion_count_between(daily["puzzle_id"], time_range["start"], time_range["end"])
+    return {
+        "ok": True,
+        "date": daily["date"],
+        "puzzle_id": daily["puzzle_id"],
+        "entries": entries,
+        "count": count,
+    }
+
+
+@ROUTER.get("/api/daily/leaderboard")
+def _api_daily_leaderboard(request: Request) -> dict:
+    return _daily_leaderboard_payload(request.int_arg("limit", 5, 1, 50))
+
+
+def _daily_trend_payload(days: int) -> dict:
+    puzzles = PUZZLE_CATALOG.load()
+    daily = _get_daily_puzzle_id(puzzles)
+    history_map = list_daily_schedule(_date_offset(daily["date"], -(days - 1)), daily["date"])
+    history_map[daily["date"]] = daily["puzzle_id"]
+    day_strs = [_date_offset(daily["date"], -offset) for offset in range(days - 1, -1, -1)]
+    ranges = []
+    for day_str in day_strs:
+        puzzle_id = history_map.get(day_str)
+        if puzzle_id:
+            time_range = _local_day_range_utc(day_str)
+            ranges.append((day_str, puzzle_id, time_range["start"], time_range["end"]))
+    counts = count_completions_by_ranges(ranges)
+    items = [
+        {"date": day_str, "puzzle_id": history_map.get(day_str, ""), "count": counts.get(day_str, 0)}
+        for day_str in day_strs
+    ]
+    return {"ok": True, "items": items}
+
+
+@ROUTER.get("/api/daily/trend")
+def _api_daily_trend(request: Request) -> dict:
+    return _daily_trend_payload(request.int_arg("days", 7, 1, 365))
+
+
+def _difficulty_board_payload(limit: int) -> dict:
+    puzzles = PUZZLE_CATALOG.load()
+    index_map = {puzzle["id"]: idx for idx, puzzle in enumerate(puzzles, start=1)}
+    created_map = {puzzle["id"]: puzzle.get("created_at", "") for puzzle in puzzles}
+    data = []
+    for stat in list_puzzle_difficulty_stats(limit=limit):
+        puzzle_id = stat.get("puzzle_id")
+        data.append({**stat, "index": index_map.get(puzzle_id), "created_at": created_map.get(puzzle_id, "")})
+    return {"ok": True, "stats": data}
+
+
+@ROUTER.get("/api/difficulty/board", cache_ttl=10)
+def _api_difficulty_board(request: Request) -> dict:
+    return _difficulty_board_payload(request.int_arg("limit", 50, 1, 200))
+
+
+@ROUTER.get("/api/difficulty/mine")
+def _api_difficulty_mine(request: Request) -> dict:
+    user = _require_user(request)
+    puzzle_id = _require_puzzle_id(request.arg("puzzle_id"), "缺少 puzzle_id。")
+    return {"ok": True, "difficulty": get_difficulty_vote(int(user["id"]), puzzle_id)}
+
+
+@ROUTER.post("/api/difficulty/vote")
+def _api_difficulty_vote(request: Request) -> dict:
+    payload = request.json()
+    user = _require_user(request)
+    puzzle_id = _require_puzzle_id(str(payload.get("puzzle_id", "")))
+    difficulty_raw = str(payload.get("difficulty", "")).strip().lower()
+    mapping = {"easy": 1, "medium": 2, "hard": 3, "1": 1, "2": 2, "3": 3}
+    if difficulty_raw not in mapping:
+        raise ApiError("难度参数不合法。")
+    if not has_result(int(user["id"]), puzzle_id):
+        raise ApiError("通关后才能评价难度。", 403)
+    upsert_difficulty_vote(int(user["id"]), puzzle_id, mapping[difficulty_raw])
+    return {"ok": True}
+
+
+@ROUTER.get("/api/overall_leaderboard", cache_ttl=10)
+def _api_overall_leaderboard(request: Request) -> dict:
+    limit = request.int_arg("limit", 50, 1, 200)
+    return {"ok": True, "stats": list_overall_leaderboard(limit=limit)}
+
+
+@ROUTER.get("/api/author_stats", cache_ttl=30)
+def _api_author_stats(request: Request) -> dict:
+    limit = request.int_arg("limit", 50, 1, 200)
+    return {"ok": True, "stats": list_author_stats(limit=limit)}
+
+
+@ROUTER.get("/api/leaderboard")
+def _api_leaderboard(request: Request) -> dict:
+    puzzle_id = _require_puzzle_id(request.arg("puzzle_id"), "缺少 puzzle_id。")
+    limit = request.int_arg("limit", 10, 1, 50)
+    # 不存在的题目直接返回空榜，不加载也不常驻内存
+    if not PUZZLE_CATALOG.contains(puzzle_id):
+        return {"ok": True, "entries": []}
+    return {"ok": True, "entries": LEADERBOARDS.top(puzzle_id, limit=limit)}
+
+
+@ROUTER.get("/api/leaderboard/rank")
+def _api_leaderboard_rank(request: Request) -> dict:
+    user = _require_user(request)
+    puzzle_id = _require_puzzle_id(request.arg("puzzle_id"), "缺少 puzzle_id。")
+    if not PUZZLE_CATALOG.contains(puzzle_id):
+        return {"ok": True, "rank": None}
+    # 通关后立即查询名次，请求可能落到另一个进程：每次核对该题成绩的版本号
+    return {"ok": True, "rank": LEADERBOARDS.rank(puzzle_id, int(user["id"]), max_age=0)}
+
+
+# 实时推送：每次数据变化只为有人订阅的主题计算一次快照，再分发给所有连接
+LIVE_TOPIC_DAILY = "daily"
+LIVE_TOPIC_BOARDS = "boards"
+LIVE_TOPIC_LEADERBOARD = "leaderboard:"
+
+
+def _live_payloads(topics: Set[str]) -> Dict[str, Tuple[str, dict]]:
+    """计算推送数据，参数与页面默认请求的接口一致。"""
+    payloads: Dict[str, Tuple[str, dict]] = {}
+    if LIVE_TOPIC_DAILY in topics:
+        daily = _daily_leaderboard_payload(5)
+        daily["trend"] = _daily_trend_payload(7)["items"]
+        payloads[LIVE_TOPIC_DAILY] = ("daily", daily)
+    if LIVE_TOPIC_BOARDS in topics:
+        payloads[LIVE_TOPIC_BOARDS] = (
+            "boards",
+            {
+                "ok": True,
+                "overall": list_overall_leaderboard(limit=50),
+                "authors": list_author_stats(limit=50),
+                "difficulty": _difficulty_board_payload(50)["stats"],
+            },
+        )
+    for topic in topics:
+        if topic.startswith(LIVE_TOPIC_LEADERBOARD):
+            puzzle_id = topic[len(LIVE_TOPIC_LEADERBOARD) :]
+            # 只在数据变化后计算一次，直接核对版本号
+            entries = LEADERBOARDS.top(puzzle_id, limit=10, max_age=0) if PUZZLE_CATALOG.contains(puzzle_id) else []
+            payloads[topic] = ("leaderboard", {"ok": True, "puzzle_id": puzzle_id, "entries": entries})
+    return payloads
+
+
+LIVE_FEED = LiveFeed(EventBroadcaster(), _live_payloads, VersionWatch("queries"))
+
+
+@ROUTER.get("/api/stream")
+def _api_stream(request: Request) -> Response:
+    topics = {LIVE_TOPIC_DAILY, LIVE_TOPIC_BOARDS}
+    puzzle_id = _validate_puzzle_id(request.arg("puzzle_id"))
+    # 只为存在的题目建主题，任意 id 不会变成常驻的推送主题
+    if puzzle_id and PUZZLE_CATALOG.contains(puzzle_id):
+        topics.add(LIVE_TOPIC_LEADERBOARD + puzzle_id)
+    try:
+        subscription = LIVE_FEED.subscribe(topics)
+    except TooManySubscribers as exc:
+        raise ApiError(str(exc), 503)
+    return Response(
+        b"",
+        content_type="text/event-stream; charset=utf-8",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        stream=subscription,
+    )
+
+
+# 游戏长连接：每个连接在线程池模式下占用一个工作线程，上限在 main() 中按线程数调整
+WEBSOCKET_LIMIT = ConnectionLimit(1000)
+
+metrics.REGISTRY.callback(
+    "hanzi_open_streams",
+    "当前打开的长连接数（sse 为实时推送，websocket 为游戏长连接）。",
+    "gauge",
+    lambda: {("sse",): LIVE_FEED.broadcaster.subscriber_count(), ("websocket",): WEBSOCKET_LIMIT.count()},
+    ("kind",),
+)
+
+
+class GameSocket(WebSocketHandler):
+    """一名玩家的游戏长连接：登录只在握手时校验一次，之后的指令直接操作该用户的进度。
+
+    指令为 JSON，如 {"id": 1, "type": "guess", "ch": "字"}，type 取 start/guess/hint/ai_step/state/ping，
+    参数与对应的 REST 接口一致（ai_step 的访问码放在 access_code 字段）。
+    回复与 REST 响应一致并带回 id，只是其中的 state 换成相对本连接上一次发出的状态的增量 delta
+    （见 engine.state_delta）；客户端手里的状态不是来自本连接时，带上 "full": true 取完整状态。
+    """
+
+    # 与 REST 接口共用限流额度
+    RATE_LIMITS = {"guess": "guess", "hint": "hint", "ai_step": "ai_step"}
+
+    def __init__(self, user: Dict[str, object], session_id: str, client_ip: str) -> None:
+        self.user = user
+        self.session_id = session_id
+        self.client_ip = client_ip
+        self._last_state: Optional[dict] = None
+        self._commands: Dict[str, Callable[[dict], dict]] = {
+            "start": self._start,
+            "guess": self._guess,
+            "hint": self._hint,
+            "ai_step": self._ai_step,
+            "state": self._state,
+            "ping": self._ping,
+        }
+
+    def on_message(self, text: str) -> Optional[str]:
+        request_id = None
+        kind = ""
         try:
-            payload = self._read_json_body()
-        except Exception:
-            return self._send_json({"ok": False, "message": "请求体不是合法的 JSON。"}, status_code=400)
-
-        if self.path == "/api/start":
-            user = self._require_user()
-            if not user:
-                return None
-            puzzle_id = payload.get("puzzle_id")
-            mode = payload.get("mode", "resume")
-            try:
-                store = SESSION_MANAGER.get_store_for_user(int(user["id"]))
-                existed = bool(puzzle_id and puzzle_id in store.games)
-                state = store.start(puzzle_id, mode)
-                if mode == "restart" or not existed:
-                    record_puzzle_attempt(int(user["id"]), str(state["puzzle_id"]))
-                    _demote_daily_if_played(str(state["puzzle_id"]))
-                SESSION_MANAGER.save()
-                return self._send_json({"ok": True, "state": state})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/guess":
-            user = self._require_user()
-            if not user:
-                return None
-            guess_char = payload.get("ch", "")
-            try:
-                store = SESSION_MANAGER.get_store_for_user(int(user["id"]))
-                result = store.guess(guess_char)
-                if result.get("state"):
-                    record_puzzle_guess(
-                        int(user["id"]),
-                        str(result["state"]["puzzle_id"]),
-                        str(result.get("status", "")),
-                    )
-                if result["state"].get("is_complete"):
-                    record_result(user["id"], result["state"]["puzzle_id"], result["state"]["guess_count"])
-                SESSION_MANAGER.save()
-                return self._send_json({"ok": True, "result": result})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/hint":
-            user = self._require_user()
-            if not user:
-                return None
-            try:
-                date_str = _today_local_str()
-                free_used = consume_daily_hint(int(user["id"]), date_str)
-                store = SESSION_MANAGER.get_store_for_user(int(user["id"]))
-                result = store.use_hint(free=free_used)
-                state = result.get("state")
-                if state and state.get("is_complete"):
-                    record_result(user["id"], state["puzzle_id"], state["guess_count"])
-                SESSION_MANAGER.save()
-                return self._send_json(
-                    {
-                        "ok": True,
-                        "revealed": result.get("revealed"),
-                        "penalty": result.get("penalty", 0),
-                        "free_used": free_used,
-                        "state": state,
-                    }
-                )
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/checkin":
-            user = self._require_user()
-            if not user:
-                return None
-            date_str = _today_local_str()
-            try:
-                info = claim_daily_checkin(int(user["id"]), date_str, reward=1)
-                return self._send_json(
-                    {
-                        "ok": True,
-                        "date": date_str,
-                        "claimed": True,
-                        "free_hints": info.get("free_hints", 0),
-                    }
-                )
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/ai/step":
-            user = self._require_user()
-            if not user:
-                return None
-            if not self._require_ai_access():
-                return None
-            try:
-                store = SESSION_MANAGER.get_store_for_user(int(user["id"]))
-                ai_config = get_active_ai_config()
-                if not ai_config:
-                    raise RuntimeError("AI 尚未配置，请在管理员页面设置。")
-                result = store.ai_step(ai_config)
-                if result.get("result", {}).get("state", {}).get("is_complete"):
-                    state = result["result"]["state"]
-                    record_result(user["id"], state["puzzle_id"], state["guess_count"])
-                status = result.get("result", {}).get("status")
-                state = result.get("result", {}).get("state")
-                if state and status:
-                    record_puzzle_guess(int(user["id"]), str(state["puzzle_id"]), str(status))
-                guess = result.get("guess")
-                reason = result.get("reason")
-                print(f"[AI] 猜测={guess} 状态={status} 理由={reason}")
-                SESSION_MANAGER.save()
-                return self._send_json({"ok": True, **result})
-            except Exception as exc:
-                info = _safe_ai_config_info(ai_config if isinstance(ai_config, dict) else None)
-                print(f"[AI] 调用失败: {exc} | {info}")
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/login":
-            session_id = self._require_session_id()
-            if not session_id:
-                return None
-            nickname = str(payload.get("nickname", "")).strip()
-            if not nickname:
-                return self._send_json({"ok": False, "message": "昵称不能为空。"}, status_code=400)
-            if len(nickname) > 20:
-                return self._send_json({"ok": False, "message": "昵称长度不能超过 20。"}, status_code=400)
-            try:
-                user = upsert_user(nickname)
-                bind_session(session_id, int(user["id"]))
-                return self._send_json({"ok": True, "user": user})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/puzzles/create":
-            if not self._require_admin():
-                return None
-            user = self._require_admin_user()
-            if not user:
-                return None
-            try:
-                puzzle_id = payload.get("puzzle_id")
-                title = payload.get("title", "")
-                body = payload.get("body", "")
-                overwrite = bool(payload.get("overwrite", False))
-                safe_id = _sanitize_puzzle_id(str(puzzle_id or ""))
-                if safe_id:
-                    author_id = get_puzzle_author_id(safe_id)
-                    if author_id and author_id != int(user["id"]):
-                        return self._send_json(
-                            {"ok": False, "message": "只能编辑自己创建的题目。"},
-                            status_code=403,
-                        )
-                    if author_id is None and not _is_default_admin_user(user):
-                        file_path = PUZZLE_DIR / f"{safe_id}.txt"
-                        if file_path.exists():
-                            return self._send_json(
-                                {"ok": False, "message": "该题目未归属，只能由 Admin 认领或修改。"},
-                                status_code=403,
-                            )
-                puzzle = _create_puzzle_file(puzzle_id, title, body, overwrite)
-                if overwrite and puzzle.get("overwrote"):
-                    SESSION_MANAGER.remove_puzzle(puzzle["id"])
-                SESSION_MANAGER.save()
-                touch_puzzle_meta(puzzle["id"], int(user["id"]))
-                return self._send_json({"ok": True, "puzzle": {"id": puzzle["id"]}})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/difficulty/vote":
-            user = self._require_user()
-            if not user:
-                return None
-            puzzle_id = _validate_puzzle_id(str(payload.get("puzzle_id", "")))
-            if not puzzle_id:
-                return self._send_json({"ok": False, "message": "题目 id 不合法。"}, status_code=400)
-            difficulty_raw = str(payload.get("difficulty", "")).strip().lower()
-            mapping = {"easy": 1, "medium": 2, "hard": 3, "1": 1, "2": 2, "3": 3}
-            if difficulty_raw not in mapping:
-                return self._send_json({"ok": False, "message": "难度参数不合法。"}, status_code=400)
-            if not has_result(int(user["id"]), puzzle_id):
-                return self._send_json({"ok": False, "message": "通关后才能评价难度。"}, status_code=403)
-            try:
-                upsert_difficulty_vote(int(user["id"]), puzzle_id, mapping[difficulty_raw])
-                return self._send_json({"ok": True})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/admin/puzzles/difficulty":
-            if not self._require_admin():
-                return None
-            user = self._require_admin_user()
-            if not user:
-                return None
-            puzzle_id = _validate_puzzle_id(str(payload.get("puzzle_id", "")))
-            if not puzzle_id:
-                return self._send_json({"ok": False, "message": "题目 id 不合法。"}, status_code=400)
-            difficulty_raw = str(payload.get("difficulty", "")).strip().lower()
-            allowed = {"", "easy", "medium", "hard"}
-            if difficulty_raw not in allowed:
-                return self._send_json({"ok": False, "message": "难度参数不合法。"}, status_code=400)
-            author_id = get_puzzle_author_id(puzzle_id)
-            if author_id and author_id != int(user["id"]):
-                return self._send_json(
-                    {"ok": False, "message": "只能为自己创建的题目标注难度。"},
-                    status_code=403,
-                )
-            if author_id is None and not _is_default_admin_user(user):
-                return self._send_json(
-                    {"ok": False, "message": "该题目未归属，只能由 Admin 标注难度。"},
-                    status_code=403,
-                )
-            try:
-                if author_id is None:
-                    touch_puzzle_meta(puzzle_id, int(user["id"]))
-                value = difficulty_raw or None
-                set_admin_difficulty(puzzle_id, value)
-                return self._send_json({"ok": True})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/admin/puzzles/daily":
-            if not self._require_admin():
-                return None
-            user = self._require_admin_user()
-            if not user:
-                return None
-            puzzle_id = _validate_puzzle_id(str(payload.get("puzzle_id", "")))
-            if not puzzle_id:
-                return self._send_json({"ok": False, "message": "题目 id 不合法。"}, status_code=400)
-            is_daily = bool(payload.get("is_daily", False))
-            author_id = get_puzzle_author_id(puzzle_id)
-            if author_id and author_id != int(user["id"]):
-                return self._send_json(
-                    {"ok": False, "message": "只能为自己创建的题目标记每日题。"},
-                    status_code=403,
-                )
-            if author_id is None and not _is_default_admin_user(user):
-                return self._send_json(
-                    {"ok": False, "message": "该题目未归属，只能由 Admin 标记每日题。"},
-                    status_code=403,
-                )
-            try:
-                if is_daily:
-                    played_ids = set(list_played_puzzle_ids())
-                    if puzzle_id in played_ids:
-                        current_daily = set(list_daily_puzzle_ids())
-                        if puzzle_id not in current_daily:
-                            return self._send_json(
-                                {"ok": False, "message": "该题已被游玩，不能加入每日题池。"},
-                                status_code=400,
-                            )
-                if author_id is None:
-                    touch_puzzle_meta(puzzle_id, int(user["id"]))
-                set_daily_flag(puzzle_id, is_daily)
-                return self._send_json({"ok": True})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/admin/daily/auto":
-            if not self._require_admin():
-                return None
-            enabled = bool(payload.get("enabled", False))
             try:
-                set_setting("daily_auto_unplayed", "1" if enabled else "0")
-                return self._send_json({"ok": True, "enabled": enabled})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/admin/puzzles/generate":
-            if not self._require_admin():
-                return None
-            title = str(payload.get("title", "")).strip()
-            style_hint = str(payload.get("style_hint", "")).strip()
-            if not title:
-                return self._send_json({"ok": False, "message": "标题不能为空。"}, status_code=400)
-            if len(title) > 40:
-                return self._send_json({"ok": False, "message": "标题长度过长。"}, status_code=400)
-            try:
-                access_code = _get_ai_access_code()
-                if not access_code:
-                    raise RuntimeError("AI 访问码未配置，请先设置。")
-                ai_config = get_active_ai_config()
-                if not ai_config:
-                    raise RuntimeError("AI 尚未配置，请在管理员页面设置。")
-                client = AIClient(ai_config)
-                body = client.generate_puzzle_body(title, style_hint)
-                return self._send_json({"ok": True, "title": title, "body": body})
-            except Exception as exc:
-                info = _safe_ai_config_info(ai_config if isinstance(ai_config, dict) else None)
-                print(f"[AI] 生成题目失败: {exc} | {info}")
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/admin/ai/profiles":
-            if not self._require_admin():
-                return None
-            name = str(payload.get("name", "")).strip()
-            base_url = str(payload.get("base_url", "")).strip()
-            model = str(payload.get("model", "")).strip()
-            api_key = str(payload.get("api_key", "")).strip()
-            set_active = bool(payload.get("set_active", True))
-            if not name or not base_url or not model or not api_key:
-                return self._send_json({"ok": False, "message": "请完整填写 AI 配置。"}, status_code=400)
-            try:
-                upsert_ai_profile(name, base_url, model, api_key, set_active=set_active)
-                return self._send_json({"ok": True})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/admin/ai/active":
-            if not self._require_admin():
-                return None
-            name = str(payload.get("name", "")).strip()
-            if not name:
-                return self._send_json({"ok": False, "message": "缺少配置名称。"}, status_code=400)
-            try:
-                set_active_ai_profile(name)
-                return self._send_json({"ok": True})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/admin/ai/access":
-            if not self._require_admin():
-                return None
-            access_code = str(payload.get("access_code", "")).strip()
-            if not access_code:
-                return self._send_json({"ok": False, "message": "访问码不能为空。"}, status_code=400)
-            if len(access_code) > 64:
-                return self._send_json({"ok": False, "message": "访问码过长。"}, status_code=400)
-            try:
-                set_setting("ai_access_code", access_code)
-                return self._send_json({"ok": True})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
+                message = json.loads(text)
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                raise ApiError("消息不是合法的 JSON。")
+            request_id = message.get("id")
+            kind = str(message.get("type", ""))
+            command = self._commands.get(kind)
+            if command is None:
+                raise ApiError("不支持的指令。")
+            group = self.RATE_LIMITS.get(kind)
+            if group and RATE_LIMITER.acquire(group, self.session_id, self.client_ip):
+                raise ApiError("操作太频繁，请稍后再试。", 429)
+            if message.get("full"):
+                self._last_state = None
+            payload = {"ok": True, **command(message)}
+        except ApiError as exc:
+            payload = {"ok": False, "message": exc.message}
+        except Exception:
+            log_unexpected_error(f"WebSocket {kind}")
+            payload = {"ok": False, "message": INTERNAL_ERROR_MESSAGE}
+        payload["id"] = request_id
+        for holder in (payload, payload.get("result")):
+            if isinstance(holder, dict) and "state" in holder:
+                state = holder.pop("state")
+                holder["delta"] = state_delta(self._last_state, state)
+                self._last_state = state
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+    def on_close(self) -> None:
+        WEBSOCKET_LIMIT.release()
+
+    def _start(self, message: dict) -> dict:
+        return {"state": _start_game(self.user, message.get("puzzle_id"), message.get("mode", "resume"))}
+
+    def _guess(self, message: dict) -> dict:
+        return {"result": _submit_guess(self.user, message.get("ch", ""))}
+
+    def _hint(self, message: dict) -> dict:
+        return _use_hint(self.user)
+
+    def _ai_step(self, message: dict) -> dict:
+        _check_ai_access_code(str(message.get("access_code", "")).strip())
+        return _run_ai_step(self.user)
+
+    def _state(self, message: dict) -> dict:
+        return {"state": _current_state(self.user)}
+
+    def _ping(self, message: dict) -> dict:
+        return {"type": "pong"}
+
+
+@ROUTER.get("/api/ws")
+def _api_ws(request: Request) -> Response:
+    try:
+        headers = handshake_headers(request.headers)
+    except ValueError as exc:
+        raise ApiError(str(exc), 400)
+    # 浏览器的 WebSocket 不能自定义请求头，会话编号放在查询参数里
+    session_id = _clean_session_id(request.arg("session")) or _get_session_id(request)
+    user = _session_user(request, session_id) if session_id else None
+    if not user:
+        raise ApiError("请先登录，再开始游戏。", 401)
+    if not WEBSOCKET_LIMIT.acquire():
+        raise ApiError("游戏长连接数已满，请稍后再试。", 503)
+    return Response(
+        b"",
+        status_code=101,
+        content_type="",
+        headers=headers,
+        upgrade=WebSocketConnection(GameSocket(user, session_id, request.client_address[0])),
+    )
+
+
+# 管理员接口
+@ROUTER.get("/api/admin/check")
+def _api_admin_check(request: Request) -> dict:
+    _require_admin(request)
+    return {"ok": True}
+
+
+@ROUTER.get("/api/admin/cache", shed=False)
+def _api_admin_cache(request: Request) -> dict:
+    _require_admin(request)
+    return {
+        "ok": True,
+        "query_cache": query_cache_stats(),
+        "session_cache": session_cache_stats(),
+        "response_cache": RESPONSE_CACHE.stats(),
+        "static_files": STATIC_FILES.stats(),
+        "live_stream": LIVE_FEED.stats(),
+        "game_sockets": WEBSOCKET_LIMIT.count(),
+        "rate_limit_buckets": RATE_LIMITER.size(),
+    }
+
+
+@ROUTER.get("/api/admin/routes", shed=False)
+def _api_admin_routes(request: Request) -> dict:
+    _require_admin(request)
+    return {"ok": True, "routes": ROUTER.stats()}
 
-        return self._send_json({"ok": False, "message": "未找到对应的接口。"}, status_code=404)
 
-    def do_DELETE(self) -> None:
+@ROUTER.post("/api/admin/profile", shed=False)
+def _api_admin_profile_start(request: Request) -> dict:
+    payload = request.json()
+    _require_admin(request)
+    mode = str(payload.get("mode", "cprofile")).strip()
+    try:
+        if mode == "cprofile":
+            PROFILER.start_cprofile(int(payload.get("requests", 20)), str(payload.get("route", "")))
+        elif mode == "sample":
+            PROFILER.start_sampling(
+                float(payload.get("seconds", 10)),
+                float(payload.get("interval_ms", 10)) / 1000,
+                bool(payload.get("all_threads", False)),
+            )
+        else:
+            raise ApiError("mode 只能是 cprofile 或 sample。")
+    except (TypeError, ValueError):
+        raise ApiError("分析参数无效。")
+    return {"ok": True, "profile": PROFILER.status()}
+
+
+@ROUTER.get("/api/admin/profile", shed=False)
+def _api_admin_profile(request: Request) -> object:
+    _require_admin(request)
+    report = PROFILER.report(request.arg("sort", "cumulative"), request.int_arg("limit", 40, 1, 500))
+    if request.arg("format") == "text":
+        # 纯文本便于直接保存：collapsed stack 可交给 flamegraph.pl
+        return Response(report.encode("utf-8"), content_type="text/plain; charset=utf-8")
+    return {"ok": True, "profile": PROFILER.status(), "report": report}
+
+
+@ROUTER.delete("/api/admin/profile", shed=False)
+def _api_admin_profile_stop(request: Request) -> dict:
+    _require_admin(request)
+    PROFILER.stop()
+    return {"ok": True}
+
+
+@ROUTER.get("/metrics", shed=False)
+def _metrics(request: Request) -> Response:
+    _require_admin(request)
+    return Response(metrics.REGISTRY.render().encode("utf-8"), content_type=metrics.CONTENT_TYPE)
+
+
+@ROUTER.get("/api/admin/users")
+def _api_admin_users(request: Request) -> dict:
+    _require_admin(request)
+    limit = request.int_arg("limit", 100, 1, 500)
+    return {"ok": True, "users": list_users(limit=limit)}
+
+
+@ROUTER.get("/api/admin/author_stats")
+def _api_admin_author_stats(request: Request) -> dict:
+    _require_admin(request)
+    limit = request.int_arg("limit", 50, 1, 200)
+    return {"ok": True, "stats": list_author_stats(limit=limit)}
+
+
+@ROUTER.get("/api/admin/puzzles")
+def _api_admin_puzzles(request: Request) -> dict:
+    _require_admin(request)
+    user = _require_admin_user(request)
+    user_id = int(user["id"])
+    # 默认管理员还能看到未归属的题目
+    show_unowned = _is_default_admin_user(user)
+    meta = list_puzzle_meta()
+    played_ids = set(list_played_puzzle_ids())
+    data = []
+    for puzzle in PUZZLE_CATALOG.load():
+        puzzle_id = puzzle.get("id")
+        info = meta.get(str(puzzle_id))
+        author_id = info["author_id"] if info else None
+        if author_id != user_id and not (show_unowned and author_id is None):
+            continue
+        is_played = puzzle_id in played_ids
+        data.append(
+            {
+                "id": puzzle_id,
+                "title": puzzle.get("title", ""),
+                "body": puzzle.get("body", ""),
+                "admin_difficulty": info["admin_difficulty"] if info else "",
+                # 玩过的题目会在开局时移出题池（旧数据在启动时统一处理），这里只读不写
+                "is_daily": bool(info and info["is_daily"]) and not is_played,
+                "is_played": is_played,
+            }
+        )
+    return {"ok": True, "puzzles": data}
+
+
+@ROUTER.post("/api/puzzles/create")
+def _api_create_puzzle(request: Request) -> dict:
+    payload = request.json()
+    _require_admin(request)
+    user = _require_admin_user(request)
+    puzzle_id = payload.get("puzzle_id")
+    title = payload.get("title", "")
+    body = payload.get("body", "")
+    overwrite = bool(payload.get("overwrite", False))
+    safe_id = _sanitize_puzzle_id(str(puzzle_id or ""))
+    if safe_id:
+        author_id = get_puzzle_author_id(safe_id)
+        if author_id and author_id != int(user["id"]):
+            raise ApiError("只能编辑自己创建的题目。", 403)
+        if author_id is None and not _is_default_admin_user(user):
+            if (PUZZLE_DIR / f"{safe_id}.txt").exists():
+                raise ApiError("该题目未归属，只能由 Admin 认领或修改。", 403)
+    puzzle = _create_puzzle_file(puzzle_id, title, body, overwrite)
+    if overwrite and puzzle.get("overwrote"):
+        SESSION_MANAGER.remove_puzzle(puzzle["id"])
+    touch_puzzle_meta(puzzle["id"], int(user["id"]))
+    _reset_future_daily_schedule()
+    return {"ok": True, "puzzle": {"id": puzzle["id"]}}
+
+
+@ROUTER.delete("/api/admin/puzzles")
+def _api_delete_puzzle(request: Request) -> dict:
+    payload = request.json()
+    _require_admin(request)
+    user = _require_admin_user(request)
+    puzzle_id = _require_puzzle_id(str(payload.get("puzzle_id", "")))
+    _check_puzzle_owner(user, puzzle_id, "只能删除自己创建的题目。", "删除")
+    file_path = PUZZLE_DIR / f"{puzzle_id}.txt"
+    if not file_path.exists():
+        raise ApiError("题目不存在。", 404)
+    file_path.unlink()
+    PUZZLE_CATALOG.invalidate()
+    SESSION_MANAGER.remove_puzzle(puzzle_id)
+    delete_puzzle_meta(puzzle_id)
+    _reset_future_daily_schedule()
+    return {"ok": True}
+
+
+@ROUTER.post("/api/admin/puzzles/difficulty")
+def _api_admin_puzzle_difficulty(request: Request) -> dict:
+    payload = request.json()
+    _require_admin(request)
+    user = _require_admin_user(request)
+    puzzle_id = _require_puzzle_id(str(payload.get("puzzle_id", "")))
+    difficulty_raw = str(payload.get("difficulty", "")).strip().lower()
+    if difficulty_raw not in {"", "easy", "medium", "hard"}:
+        raise ApiError("难度参数不合法。")
+    author_id = _check_puzzle_owner(user, puzzle_id, "只能为自己创建的题目标注难度。", "标注难度")
+    if author_id is None:
+        touch_puzzle_meta(puzzle_id, int(user["id"]))
+    set_admin_difficulty(puzzle_id, difficulty_raw or None)
+    return {"ok": True}
+
+
+@ROUTER.post("/api/admin/puzzles/daily")
+def _api_admin_puzzle_daily(request: Request) -> dict:
+    payload = request.json()
+    _require_admin(request)
+    user = _require_admin_user(request)
+    puzzle_id = _require_puzzle_id(str(payload.get("puzzle_id", "")))
+    is_daily = bool(payload.get("is_daily", False))
+    author_id = _check_puzzle_owner(user, puzzle_id, "只能为自己创建的题目标记每日题。", "标记每日题")
+    if is_daily:
+        TELEMETRY.flush()
+        if puzzle_id in set(list_played_puzzle_ids()) and puzzle_id not in set(list_daily_puzzle_ids()):
+            raise ApiError("该题已被游玩，不能加入每日题池。")
+    if author_id is None:
+        touch_puzzle_meta(puzzle_id, int(user["id"]))
+    set_daily_flag(puzzle_id, is_daily)
+    _reset_future_daily_schedule()
+    return {"ok": True}
+
+
+@ROUTER.post("/api/admin/puzzles/generate", rate_limit="generate")
+def _api_admin_generate_puzzle(request: Request) -> dict:
+    payload = request.json()
+    _require_admin(request)
+    title = str(payload.get("title", "")).strip()
+    style_hint = str(payload.get("style_hint", "")).strip()
+    if not title:
+        raise ApiError("标题不能为空。")
+    if len(title) > 40:
+        raise ApiError("标题长度过长。")
+    if not _get_ai_access_code():
+        raise ApiError("AI 访问码未配置，请先设置。", 503)
+    ai_config = get_active_ai_config()
+    if not ai_config:
+        raise ApiError("AI 尚未配置，请在管理员页面设置。", 503)
+    body = _call_ai(lambda: AIClient(ai_config).generate_puzzle_body(title, style_hint), "生成题目", ai_config)
+    return {"ok": True, "title": title, "body": body}
+
+
+@ROUTER.get("/api/admin/daily/auto")
+def _api_admin_daily_auto(request: Request) -> dict:
+    _require_admin(request)
+    return {"ok": True, "enabled": get_setting("daily_auto_unplayed") == "1"}
+
+
+@ROUTER.post("/api/admin/daily/auto")
+def _api_admin_set_daily_auto(request: Request) -> dict:
+    payload = request.json()
+    _require_admin(request)
+    enabled = bool(payload.get("enabled", False))
+    set_setting("daily_auto_unplayed", "1" if enabled else "0")
+    _reset_future_daily_schedule()
+    return {"ok": True, "enabled": enabled}
+
+
+@ROUTER.get("/api/admin/ai/profiles")
+def _api_admin_ai_profiles(request: Request) -> dict:
+    _require_admin(request)
+    return {"ok": True, "profiles": list_ai_profiles(include_secret=True)}
+
+
+@ROUTER.post("/api/admin/ai/profiles")
+def _api_admin_save_ai_profile(request: Request) -> dict:
+    payload = request.json()
+    _require_admin(request)
+    name = str(payload.get("name", "")).strip()
+    base_url = str(payload.get("base_url", "")).strip()
+    model = str(payload.get("model", "")).strip()
+    api_key = str(payload.get("api_key", "")).strip()
+    set_active = bool(payload.get("set_active", True))
+    if not name or not base_url or not model or not api_key:
+        raise ApiError("请完整填写 AI 配置。")
+    upsert_ai_profile(name, base_url, model, api_key, set_active=set_active)
+    return {"ok": True}
+
+
+@ROUTER.delete("/api/admin/ai/profiles")
+def _api_admin_delete_ai_profile(request: Request) -> dict:
+    payload = request.json()
+    _require_admin(request)
+    name = str(payload.get("name", "")).strip()
+    if not name:
+        raise ApiError("缺少配置名称。")
+    delete_ai_profile(name)
+    return {"ok": True}
+
+
+@ROUTER.post("/api/admin/ai/active")
+def _api_admin_activate_ai_profile(request: Request) -> dict:
+    payload = request.json()
+    _require_admin(request)
+    name = str(payload.get("name", "")).strip()
+    if not name:
+        raise ApiError("缺少配置名称。")
+    set_active_ai_profile(name)
+    return {"ok": True}
+
+
+@ROUTER.get("/api/admin/ai/access")
+def _api_admin_ai_access(request: Request) -> dict:
+    _require_admin(request)
+    access_code = _get_ai_access_code()
+    if not access_code:
+        return {"ok": True, "configured": False}
+    return {"ok": True, "configured": True, "length": len(access_code), "access_code": access_code}
+
+
+@ROUTER.post("/api/admin/ai/access")
+def _api_admin_set_ai_access(request: Request) -> dict:
+    payload = request.json()
+    _require_admin(request)
+    access_code = str(payload.get("access_code", "")).strip()
+    if not access_code:
+        raise ApiError("访问码不能为空。")
+    if len(access_code) > 64:
+        raise ApiError("访问码过长。")
+    set_setting("ai_access_code", access_code)
+    return {"ok": True}
+
+
+@ROUTER.delete("/api/admin/ai/access")
+def _api_admin_clear_ai_access(request: Request) -> dict:
+    request.json()
+    _require_admin(request)
+    clear_setting("ai_access_code")
+    return {"ok": True}
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """简单的本地 HTTP 服务：解析请求后交给 ROUTER 分发。"""
+
+    # 所有响应都带 Content-Length，可以复用连接，避免每次轮询都重新握手
+    protocol_version = "HTTP/1.1"
+    # 空闲连接会占住线程池里的一个线程，超时后关闭
+    timeout = KEEPALIVE_IDLE_TIMEOUT
+    # 响应头与响应体分两次写出，复用连接时需关闭 Nagle，否则会撞上延迟 ACK（约 40ms）
+    disable_nagle_algorithm = True
+
+    def _read_body(self) -> bytes:
         try:
-            payload = self._read_json_body()
-        except Exception:
-            return self._send_json({"ok": False, "message": "请求体不是合法的 JSON。"}, status_code=400)
-
-        if self.path == "/api/admin/puzzles":
-            if not self._require_admin():
-                return None
-            user = self._require_admin_user()
-            if not user:
-                return None
-            puzzle_id = _validate_puzzle_id(str(payload.get("puzzle_id", "")))
-            if not puzzle_id:
-                return self._send_json({"ok": False, "message": "题目 id 不合法。"}, status_code=400)
-            try:
-                author_id = get_puzzle_author_id(puzzle_id)
-                if author_id and author_id != int(user["id"]):
-                    return self._send_json(
-                        {"ok": False, "message": "只能删除自己创建的题目。"},
-                        status_code=403,
-                    )
-                if author_id is None and not _is_default_admin_user(user):
-                    return self._send_json(
-                        {"ok": False, "message": "该题目未归属，只能由 Admin 删除。"},
-                        status_code=403,
-                    )
-                file_path = PUZZLE_DIR / f"{puzzle_id}.txt"
-                if not file_path.exists():
-                    return self._send_json({"ok": False, "message": "题目不存在。"}, status_code=404)
-                file_path.unlink()
-                SESSION_MANAGER.remove_puzzle(puzzle_id)
-                SESSION_MANAGER.save()
-                delete_puzzle_meta(puzzle_id)
-                return self._send_json({"ok": True})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
-
-        if self.path == "/api/admin/ai/access":
-            if not self._require_admin():
-                return None
-            clear_setting("ai_access_code")
-            return self._send_json({"ok": True})
-
-        if self.path == "/api/admin/ai/profiles":
-            if not self._require_admin():
-                return None
-            name = str(payload.get("name", "")).strip()
-            if not name:
-                return self._send_json({"ok": False, "message": "缺少配置名称。"}, status_code=400)
-            try:
-                delete_ai_profile(name)
-                return self._send_json({"ok": True})
-            except Exception as exc:
-                return self._send_json({"ok": False, "message": str(exc)}, status_code=400)
+            length = int(self.headers.get("Content-Length", "0") or 0)
+        except ValueError:
+            length = 0
+        return self.rfile.read(length) if length > 0 else b""
+
+    # 为 True 时（asyncio 前端）流式响应与协议升级只写响应头，连接留给事件循环处理
+    defer_stream = False
+    deferred_stream = None
+    # 请求提交给线程池的时间（time.monotonic()），用于计算排队时长；同一连接上的后续请求不再排队
+    queued_at: Optional[float] = None
+
+    def setup(self) -> None:
+        super().setup()
+        take_queued_at = getattr(self.server, "take_queued_at", None)
+        if take_queued_at is not None:
+            self.queued_at = take_queued_at()
+
+    def _send(self, response: Response) -> None:
+        takeover = response.stream is not None or response.upgrade is not None
+        if getattr(self.server, "draining", False):
+            # 停机中：告知客户端换连接，不再在这条连接上等待下一个请求
+            self.close_connection = True
+        if takeover:
+            # 流式响应没有长度，以关闭连接结束；升级后的连接也不再回到 HTTP
+            self.close_connection = True
+        # 流式响应与升级连接在构造时已登记（订阅者、长连接名额），写响应头失败时也要释放
+        taken = response.stream if response.stream is not None else response.upgrade
+        deferred = False
+        try:
+            self.send_response(response.status_code)
+            if response.content_type:
+                self.send_header("Content-Type", response.content_type)
+            # 304 没有响应体，也不能带 Content-Length: 0（会被当作资源长度）
+            if response.status_code != 304 and not takeover:
+                self.send_header("Content-Length", str(len(response.body)))
+            for name, value in response.headers.items():
+                self.send_header(name, value)
+            if self.close_connection and self.protocol_version >= "HTTP/1.1" and response.upgrade is None:
+                # 客户端要求关闭或使用 HTTP/1.0 时明确告知，否则 HTTP/1.1 客户端会以为连接仍可复用
+                self.send_header("Connection", "close")
+            self.end_headers()
+            if not takeover:
+                self.wfile.write(response.body)
+            elif self.defer_stream:
+                # 交给事件循环收发，由它负责关闭
+                self.deferred_stream = taken
+                deferred = True
+            elif response.stream is not None:
+                self._write_stream(response.stream)
+            else:
+                self._serve_upgrade(response.upgrade)
+        finally:
+            if taken is not None and not deferred:
+                taken.close()
 
-        return self._send_json({"ok": False, "message": "未找到对应的接口。"}, status_code=404)
+    def _write_stream(self, stream) -> None:
+        try:
+            for chunk in stream:
+                self.wfile.write(chunk)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass
+        finally:
+            stream.close()
+
+    def _serve_upgrade(self, connection: WebSocketConnection) -> None:
+        # 长连接的空闲超时比普通 keep-alive 更长，客户端会定期发 ping
+        self.connection.settimeout(connection.idle_timeout)
+        try:
+            connection.serve(self.rfile.read1, self.wfile.write)
+        except OSError:
+            pass
+
+    def _handle(self) -> None:
+        started = time.perf_counter()
+        # 丢弃本线程之前残留的数据库耗时（如 WebSocket 消息处理）
+        take_db_time()
+        request = Request(self.command, self.path, self.headers, self._read_body(), self.client_address)
+        if self.queued_at is not None:
+            request.queue_wait = max(0.0, time.monotonic() - self.queued_at)
+            self.queued_at = None
+        response = ROUTER.dispatch(request)
+        db_seconds, db_calls = take_db_time()
+        # 在发送前记录：流式响应与 WebSocket 会一直占用连接
+        ACCESS_LOG.record(request, response, time.perf_counter() - started, db_seconds, db_calls)
+        self._send(response)
+
+    do_GET = _handle
+    do_POST = _handle
+    do_DELETE = _handle
 
     def log_message(self, format: str, *args) -> None:
-        # 保持安静，避免刷屏；需要时可自行打开
+        # 请求记录见访问日志（--access-log），这里不再逐行打印到终端
         return
 
 
+class SingleRequestHandler(RequestHandler):
+    """单线程模式使用：每个请求后关闭连接，避免一个空闲连接挡住其他客户端。"""
+
+    protocol_version = "HTTP/1.0"
+
+
+def _handle_stop_signals(server, signals, announce: bool = True) -> None:
+    """收到停止信号后平滑停机：在其他线程调用 server.shutdown()，serve_forever 返回后由 _serve_forever 收尾。
+
+    shutdown() 会等待 serve_forever 退出，不能直接在信号处理函数（主线程）里调用。
+    第二次收到信号时不再等待，直接中断。
+    """
+    stopping = threading.Event()
+
+    def handle(signum, frame) -> None:
+        if stopping.is_set():
+            raise KeyboardInterrupt
+        stopping.set()
+        if announce:
+            timeout = getattr(server, "shutdown_timeout", None)
+            limit = f"最多 {timeout:g} 秒，" if timeout is not None else ""
+            print(f"\n正在停止：不再接受新连接，等待处理中的请求完成（{limit}再次按 Ctrl+C 立即退出）。")
+        threading.Thread(target=server.shutdown, name="shutdown", daemon=True).start()
+
+    for signum in signals:
+        signal.signal(signum, handle)
+
+
+def _serve_forever(server, announce_stop: bool = True) -> None:
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        try:
+            # 先断开推送长连接，否则等待处理中的请求时会一直等它们
+            LIVE_FEED.stop()
+            server.server_close()
+        finally:
+            # 即使等待被再次中断，也要写入缓冲的统计与访问日志
+            TELEMETRY.stop()
+            ACCESS_LOG.stop()
+            close_connections()
+        unfinished = getattr(server, "unfinished", 0)
+        if unfinished:
+            print(f"[服务] {unfinished} 个连接未能在停机时限内处理完，已强制断开。")
+        if announce_stop:
+            print("已停止。")
+
+
+def _interrupt_once(signum, frame) -> None:
+    # 只响应一次，避免清理过程中再次被打断
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+
+def _serve_prefork(server, workers: int) -> None:
+    """预派生 workers 个子进程共同 accept 同一个监听 socket。
+
+    父进程不处理请求，只负责在子进程异常退出时补位，以及停止时通知子进程退出。
+    进程间共享的状态都在 SQLite 中，各进程的内存缓存通过 cache_versions 发现过期。
+    """
+    # 不把父进程打开的 SQLite 连接带进子进程
+    close_connections()
+    # 子进程 pid -> 编号，补位的进程沿用原编号
+    children: Dict[int, int] = {}
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            # Ctrl+C 同时发给整个进程组，子进程只听父进程转发的 SIGTERM
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            _handle_stop_signals(server, [signal.SIGTERM], announce=False)
+            if ACCESS_LOG.path is not None:
+                # 各进程写各自的文件，轮转时互不干扰
+                ACCESS_LOG.path = ACCESS_LOG.path.with_name(f"{ACCESS_LOG.path.stem}.{slot}{ACCESS_LOG.path.suffix}")
+            code = 0
+            try:
+                _serve_forever(server, announce_stop=False)
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = slot
+
+    signal.signal(signal.SIGTERM, _interrupt_once)
+    for slot in range(workers):
+        spawn(slot)
+    try:
+        while children:
+            pid, status = os.wait()
+            slot = children.pop(pid)
+            print(f"[服务] 工作进程 {pid} 意外退出（状态 {status}），正在重新启动。")
+            time.sleep(1)
+            spawn(slot)
+    except KeyboardInterrupt:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        print("\n已停止。")
+    finally:
+        server.server_close()
+
+
 def main() -> int:
     parser = ChineseArgumentParser(description="单字猜谜本地服务。", add_help=False)
     parser.add_argument("-h", "--help", action="help", help="显示帮助并退出。")
     parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认 127.0.0.1）。")
     parser.add_argument("--port", type=int, default=8000, help="监听端口（默认 8000）。")
+    parser.add_argument(
+        "--backend",
+        choices=["threaded", "asyncio", "single"],
+        default="threaded",
+        help="服务模式：threaded 为线程池并发处理，asyncio 为事件循环 + 线程池，single 为单线程（默认 threaded）。",
+    )
+    parser.add_argument("--threads", type=int, default=32, help="threaded/asyncio 模式的工作线程数（默认 32）。")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="预派生的工作进程数，共享同一监听端口与数据库（默认 1，需要支持 fork 的系统）。",
+    )
+    parser.add_argument("--no-rate-limit", action="store_true", help="关闭按会话/IP 的限流（压测时使用）。")
+    parser.add_argument(
+        "--max-queue",
+        type=int,
+        default=None,
+        help="等待处理的连接/请求超过该数量时返回 503（默认线程数的 8 倍，0 为不限制）。",
+    )
+    parser.add_argument(
+        "--max-queue-wait-ms",
+        type=int,
+        default=3000,
+        help="请求排队超过该时长（毫秒）时返回 503（默认 3000，0 为不限制）。",
+    )
+    parser.add_argument(
+        "--access-log",
+        metavar="PATH",
+        default=str(ACCESS_LOG_FILE),
+        help="JSON Lines 访问日志文件（默认 data/access.log；多进程时为 access.<编号>.log）。",
+    )
+    parser.add_argument("--no-access-log", action="store_true", help="不记录访问日志。")
+    parser.add_argument(
+        "--access-log-max-mb", type=float, default=20, help="访问日志达到该大小（MB）后轮转，保留 5 份（默认 20）。"
+    )
+    parser.add_argument(
+        "--shutdown-timeout",
+        type=float,
+        default=10,
+        help="收到 Ctrl+C/SIGTERM 后等待处理中的请求完成的最长秒数，超时强制断开（默认 10）。",
+    )
     args = parser.parse_args()
-
-    server = HTTPServer((args.host, args.port), RequestHandler)
+    if args.workers > 1 and not hasattr(os, "fork"):
+        parser.error("当前系统不支持 fork，无法使用 --workers。")
+    RATE_LIMITER.enabled = not args.no_rate_limit
+    ADMISSION.max_queue_depth = max(0, args.threads * 8 if args.max_queue is None else args.max_queue)
+    ADMISSION.max_queue_wait = max(0, args.max_queue_wait_ms) / 1000
+    if not args.no_access_log:
+        ACCESS_LOG.path = Path(args.access_log)
+        ACCESS_LOG.max_bytes = max(1024, int(args.access_log_max_mb * 1024 * 1024))
+
+    if args.backend == "single":
+        server = HTTPServer((args.host, args.port), SingleRequestHandler)
+        # 推送与游戏长连接会一直占住唯一的线程
+        LIVE_FEED.broadcaster.max_subscribers = 0
+        WEBSOCKET_LIMIT.maximum = 0
+    elif args.backend == "asyncio":
+        server = AsyncHTTPServer((args.host, args.port), RequestHandler, max_workers=args.threads)
+    else:
+        server = PooledHTTPServer((args.host, args.port), RequestHandler, max_workers=args.threads)
+        # 推送连接与游戏长连接各占用一个工作线程，各限四分之一，至少留出一半给普通请求
+        LIVE_FEED.broadcaster.max_subscribers = max(1, args.threads // 4)
+        WEBSOCKET_LIMIT.maximum = max(1, args.threads // 4)
+    ADMISSION.queue_depth = getattr(server, "queue_depth", None)
+    if args.backend != "single":
+        server.shutdown_timeout = max(0.0, args.shutdown_timeout)
+    _demote_played_daily_puzzles()
     print(f"本地服务已启动：http://{args.host}:{args.port}")
+    if args.workers > 1:
+        print(f"工作进程数：{args.workers}")
     print("按 Ctrl+C 结束。")
-    try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        print("\n已停止。")
+    if args.workers > 1:
+        _serve_prefork(server, args.workers)
+    else:
+        _handle_stop_signals(server, [signal.SIGINT, signal.SIGTERM])
+        _serve_forever(server)
     return 0
 
 
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import hashlib
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .compression import accepts_gzip
+from .responsecache import etag_matches
+from .router import ApiError, Request, Response
+
+# 带 ?v=<指纹> 的请求内容不会变化，可以让浏览器长期缓存
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# 页面与未带指纹的请求：允许缓存，但每次都用 ETag 向服务器确认
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# 小于该大小的文件压缩收益太小，不生成 gzip 版本
+MIN_GZIP_BYTES = 512
+
+
+class StaticAsset:
+    """载入内存的静态文件：原始内容、gzip 版本与强 ETag。"""
+
+    __slots__ = ("name", "content_type", "body", "gzip_body", "version", "etag", "gzip_etag")
+
+    def __init__(self, name: str, content_type: str, body: bytes) -> None:
+        self.name = name
+        self.content_type = content_type
+        self.body = body
+        self.version = hashlib.sha1(body).hexdigest()[:12]
+        self.etag = f'"{self.version}"'
+        # 不同编码的字节不同，强 ETag 也要区分
+        self.gzip_etag = f'"{self.version}-gz"'
+        gzip_body = gzip.compress(body, compresslevel=9, mtime=0) if len(body) >= MIN_GZIP_BYTES else None
+        self.gzip_body = gzip_body if gzip_body is not None and len(gzip_body) < len(body) else None
+
+
+class StaticFiles:
+    """静态资源缓存：文件只在修改后才重新读取，响应带 ETag、gzip 与指纹 URL。
+
+    HTML 中引用的其他资源会被改写为 /name?v=<指纹>，资源内容变化时指纹随之变化，
+    因此带指纹的请求可以使用 immutable 缓存。
+    """
+
+    def __init__(self, root: Path, files: Dict[str, str], recheck_interval: float = 1.0) -> None:
+        self.root = root
+        self.files = dict(files)
+        self.recheck_interval = float(recheck_interval)
+        self._assets: Dict[str, StaticAsset] = {}
+        self._raw: Dict[str, Tuple[int, int, bytes]] = {}
+        self._lock = threading.Lock()
+        self._checked_at: Optional[float] = None
+        names = "|".join(re.escape(name) for name in self.files if not name.endswith(".html"))
+        self._link_re = re.compile(r'(href|src)="/(' + names + r')"') if names else None
+
+    def _stat(self, name: str) -> Optional[Tuple[int, int]]:
+        try:
+            info = (self.root / name).stat()
+        except OSError:
+            return None
+        return info.st_mtime_ns, info.st_size
+
+    def _refresh(self) -> None:
+        """检查文件是否有变化；有变化时重建受影响的资源（HTML 依赖其他资源的指纹）。"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.recheck_interval:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.recheck_interval:
+                return
+            changed = False
+            raw = dict(self._raw)
+            for name in self.files:
+                stat = self._stat(name)
+                if stat is None:
+                    if raw.pop(name, None) is not None:
+                        changed = True
+                    continue
+                cached = raw.get(name)
+                if cached is not None and cached[:2] == stat:
+                    continue
+                try:
+                    raw[name] = (stat[0], stat[1], (self.root / name).read_bytes())
+                except OSError:
+                    raw.pop(name, None)
+                changed = True
+            if changed or not self._assets:
+                self._raw = raw
+                self._assets = self._build(raw)
+            self._checked_at = time.monotonic()
+
+    def _build(self, raw: Dict[str, Tuple[int, int, bytes]]) -> Dict[str, StaticAsset]:
+        assets: Dict[str, StaticAsset] = {}
+        for name, (_, _, body) in raw.items():
+            if not name.endswith(".html"):
+                assets[name] = StaticAsset(name, self.files[name], body)
+        for name, (_, _, body) in raw.items():
+            if name.endswith(".html"):
+                assets[name] = StaticAsset(name, self.files[name], self._fingerprint_links(body, assets))
+        return assets
+
+    def _fingerprint_links(self, body: bytes, assets: Dict[str, StaticAsset]) -> bytes:
+        if self._link_re is None:
+            return body
+
+        def replace(match: "re.Match[str]") -> str:
+            asset = assets.get(match.group(2))
+            if asset is None:
+                return match.group(0)
+            return f'{match.group(1)}="{self.url(match.group(2), asset)}"'
+
+        return self._link_re.sub(replace, body.decode("utf-8")).encode("utf-8")
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        self._refresh()
+        return self._assets.get(name)
+
+    def url(self, name: str, asset: Optional[StaticAsset] = None) -> str:
+        """带指纹的资源地址。"""
+        asset = asset or self.get(name)
+        return f"/{name}?v={asset.version}" if asset else f"/{name}"
+
+    def response(self, request: Request, name: str) -> Response:
+        asset = self.get(name)
+        if asset is None:
+            raise ApiError("未找到对应的文件。", 404)
+        fingerprinted = bool(request.arg("v")) and request.arg("v") == asset.version
+        use_gzip = asset.gzip_body is not None and accepts_gzip(request.header("Accept-Encoding"))
+        headers = {
+            "ETag": asset.gzip_etag if use_gzip else asset.etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if fingerprinted else REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = request.header("If-None-Match")
+        if if_none_match and etag_matches(if_none_match, (asset.etag, asset.gzip_etag)):
+            return Response(b"", status_code=304, content_type="", headers=headers)
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(asset.gzip_body, content_type=asset.content_type, headers=headers)
+        return Response(asset.body, content_type=asset.content_type, headers=headers)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        self._refresh()
+        return {
+            name: {
+                "version": asset.version,
+                "bytes": len(asset.body),
+                "gzip_bytes": len(asset.gzip_body) if asset.gzip_body is not None else None,
+            }
+            for name, asset in sorted(self._assets.items())
+        }
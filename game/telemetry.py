@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .db import flush_puzzle_telemetry
+
+
+class TelemetryQueue:
+    """开局/猜测统计的写入缓冲：按 (题目, 用户) 合并计数，按数量或时间批量落库。"""
+
+    def __init__(
+        self,
+        flush_size: int = 200,
+        flush_interval: float = 2.0,
+        writer: Callable[[List[Dict[str, object]]], None] = flush_puzzle_telemetry,
+    ) -> None:
+        self.flush_size = max(1, int(flush_size))
+        self.flush_interval = max(0.05, float(flush_interval))
+        self._writer = writer
+        self._lock = threading.Lock()
+        # 串行化落库，避免两次 flush 交错写入
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[Tuple[str, int], Dict[str, object]] = {}
+        # 正在写入的批次：写完之前这些数据既不在缓冲中也不在数据库里
+        self._writing: Dict[Tuple[str, int], Dict[str, object]] = {}
+        self._pending_events = 0
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _entry(self, user_id: int, puzzle_id: str, now_ts: int) -> Dict[str, object]:
+        key = (str(puzzle_id), int(user_id))
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = {
+                "puzzle_id": key[0],
+                "user_id": key[1],
+                "attempts": 0,
+                "total_guesses": 0,
+                "correct_guesses": 0,
+                "first_ts": now_ts,
+                "last_ts": now_ts,
+            }
+            self._pending[key] = entry
+        return entry
+
+    def _after_record(self) -> None:
+        self._pending_events += 1
+        if self._pending_events >= self.flush_size:
+            self._wakeup.set()
+
+    def record_attempt(self, user_id: int, puzzle_id: str) -> None:
+        """记录一次开局尝试（异步落库）。"""
+        self._ensure_started()
+        now_ts = int(time.time())
+        with self._lock:
+            entry = self._entry(user_id, puzzle_id, now_ts)
+            entry["attempts"] = int(entry["attempts"]) + 1
+            entry["last_ts"] = now_ts
+            self._after_record()
+
+    def record_guess(self, user_id: int, puzzle_id: str, status: str) -> None:
+        """记录一次有效猜测（仅 correct/wrong 计入）。"""
+        if status not in ("correct", "wrong"):
+            return
+        self._ensure_started()
+        now_ts = int(time.time())
+        with self._lock:
+            entry = self._entry(user_id, puzzle_id, now_ts)
+            entry["total_guesses"] = int(entry["total_guesses"]) + 1
+            if status == "correct":
+                entry["correct_guesses"] = int(entry["correct_guesses"]) + 1
+            self._after_record()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._pending_events
+
+    def pending_first_ts(self, user_id: int, puzzle_id: str) -> Optional[int]:
+        """尚未落库的 (题目, 用户) 最早记录时间；无缓冲数据时返回 None。"""
+        key = (str(puzzle_id), int(user_id))
+        with self._lock:
+            times = [int(entry["first_ts"]) for entry in (self._writing.get(key), self._pending.get(key)) if entry]
+        return min(times) if times else None
+
+    def flush(self) -> int:
+        """立即写入所有缓冲数据，返回写入的行数。"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = list(self._pending.values())
+                self._writing = self._pending
+                self._pending = {}
+                self._pending_events = 0
+            try:
+                self._writer(batch)
+            except Exception:
+                # 写入失败时放回缓冲，等待下次重试
+                with self._lock:
+                    self._writing = {}
+                    self._merge_back(batch)
+                raise
+            with self._lock:
+                self._writing = {}
+            return len(batch)
+
+    def _merge_back(self, batch: List[Dict[str, object]]) -> None:
+        for item in batch:
+            key = (str(item["puzzle_id"]), int(item["user_id"]))
+            entry = self._pending.get(key)
+            self._pending_events += 1
+            if entry is None:
+                self._pending[key] = item
+                continue
+            # 缓冲中已有更新的开局记录时保留其时间
+            if not int(entry["attempts"]):
+                entry["last_ts"] = item["last_ts"]
+            for field in ("attempts", "total_guesses", "correct_guesses"):
+                entry[field] = int(entry[field]) + int(item[field])
+            entry["first_ts"] = min(int(entry["first_ts"]), int(item["first_ts"]))
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None or self._stopped.is_set():
+                return
+            self._thread = threading.Thread(target=self._run, name="telemetry-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as exc:
+                print(f"[统计] 批量写入失败: {exc}")
+
+    def stop(self) -> None:
+        """停止后台线程并写入剩余数据。"""
+        self._stopped.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=self.flush_interval + 1)
+        self.flush()
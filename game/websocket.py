@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import hashlib
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# RFC 6455 握手用的固定 GUID
+_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_UNSUPPORTED = 1003
+CLOSE_INVALID_DATA = 1007
+CLOSE_TOO_BIG = 1009
+
+# 单条消息上限：游戏指令都很短
+MAX_MESSAGE_BYTES = 64 * 1024
+# 多久收不到任何帧就断开（页面每 30 秒发一次 ping）
+IDLE_TIMEOUT = 120.0
+
+
+class WebSocketError(Exception):
+    def __init__(self, message: str, close_code: int = CLOSE_PROTOCOL_ERROR) -> None:
+        super().__init__(message)
+        self.close_code = close_code
+
+
+def handshake_headers(headers) -> Dict[str, str]:
+    """校验升级请求，返回 101 响应需要的响应头；请求不合法时抛出 ValueError。"""
+    if str(headers.get("Upgrade", "")).lower() != "websocket":
+        raise ValueError("需要 WebSocket 升级请求。")
+    connection = {item.strip().lower() for item in str(headers.get("Connection", "")).split(",")}
+    if "upgrade" not in connection:
+        raise ValueError("需要 WebSocket 升级请求。")
+    if str(headers.get("Sec-WebSocket-Version", "")).strip() != "13":
+        raise ValueError("仅支持 WebSocket 版本 13。")
+    key = str(headers.get("Sec-WebSocket-Key", "")).strip()
+    try:
+        if len(base64.b64decode(key, validate=True)) != 16:
+            raise ValueError
+    except ValueError:
+        raise ValueError("Sec-WebSocket-Key 无效。")
+    accept = base64.b64encode(hashlib.sha1((key + _GUID).encode("ascii")).digest()).decode("ascii")
+    return {"Upgrade": "websocket", "Connection": "Upgrade", "Sec-WebSocket-Accept": accept}
+
+
+def encode_frame(opcode: int, payload: bytes = b"") -> bytes:
+    """编码一个服务端帧（FIN=1，服务端发出的帧不加掩码）。"""
+    length = len(payload)
+    if length < 126:
+        head = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        head = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        head = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return head + payload
+
+
+def close_frame(code: int, reason: str = "") -> bytes:
+    return encode_frame(OP_CLOSE, struct.pack("!H", code) + reason.encode("utf-8")[:120])
+
+
+class FrameParser:
+    """增量解析客户端帧：feed() 返回已完整收到的 (opcode, payload)，分片消息会被拼接。"""
+
+    def __init__(self, max_message_bytes: int = MAX_MESSAGE_BYTES) -> None:
+        self.max_message_bytes = max_message_bytes
+        self._buffer = bytearray()
+        self._fragments: List[bytes] = []
+        self._fragment_opcode: Optional[int] = None
+        self._fragment_size = 0
+
+    def feed(self, data: bytes) -> List[Tuple[int, bytes]]:
+        self._buffer.extend(data)
+        messages = []
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                return messages
+            message = self._assemble(*frame)
+            if message is not None:
+                messages.append(message)
+
+    def _next_frame(self) -> Optional[Tuple[bool, int, bytes]]:
+        buffer = self._buffer
+        if len(buffer) < 2:
+            return None
+        first, second = buffer[0], buffer[1]
+        if first & 0x70:
+            raise WebSocketError("不支持扩展位。")
+        if not second & 0x80:
+            raise WebSocketError("客户端帧必须加掩码。")
+        length = second & 0x7F
+        offset = 2
+        if length == 126:
+            if len(buffer) < 4:
+                return None
+            length = struct.unpack_from("!H", buffer, 2)[0]
+            offset = 4
+        elif length == 127:
+            if len(buffer) < 10:
+                return None
+            length = struct.unpack_from("!Q", buffer, 2)[0]
+            offset = 10
+        if length > self.max_message_bytes:
+            raise WebSocketError("消息过大。", CLOSE_TOO_BIG)
+        if len(buffer) < offset + 4 + length:
+            return None
+        mask = bytes(buffer[offset : offset + 4])
+        start = offset + 4
+        payload = bytes(buffer[start : start + length])
+        del buffer[: start + length]
+        if length:
+            # 按 4 字节掩码整体异或，比逐字节循环快得多
+            repeated = (mask * (length // 4 + 1))[:length]
+            payload = (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(length, "big")
+        return bool(first & 0x80), first & 0x0F, payload
+
+    def _assemble(self, fin: bool, opcode: int, payload: bytes) -> Optional[Tuple[int, bytes]]:
+        if opcode >= OP_CLOSE:
+            if not fin or len(payload) > 125:
+                raise WebSocketError("控制帧格式错误。")
+            return opcode, payload
+        if opcode == OP_CONTINUATION:
+            if self._fragment_opcode is None:
+                raise WebSocketError("意外的后续分片。")
+        elif opcode in (OP_TEXT, OP_BINARY):
+            if self._fragment_opcode is not None:
+                raise WebSocketError("上一条分片消息尚未结束。")
+            if fin:
+                return opcode, payload
+            self._fragment_opcode = opcode
+        else:
+            raise WebSocketError("未知的帧类型。")
+        self._fragments.append(payload)
+        self._fragment_size += len(payload)
+        if self._fragment_size > self.max_message_bytes:
+            raise WebSocketError("消息过大。", CLOSE_TOO_BIG)
+        if not fin:
+            return None
+        message = (self._fragment_opcode, b"".join(self._fragments))
+        self._fragments = []
+        self._fragment_opcode = None
+        self._fragment_size = 0
+        return message
+
+
+class WebSocketHandler:
+    """一个 WebSocket 连接的应用层逻辑。"""
+
+    def on_message(self, text: str) -> Optional[str]:
+        """收到一条文本消息，返回要回复的文本（None 表示不回复）；默认不回复。"""
+        return None
+
+    def on_close(self) -> None:
+        pass
+
+
+class WebSocketConnection:
+    """与传输无关的 WebSocket 连接：receive() 接收原始字节，返回需要写回的字节。
+
+    线程池与 asyncio 两种前端共用：前者阻塞读取 socket，后者由事件循环读取，
+    只在处理消息时占用工作线程。
+    """
+
+    idle_timeout = IDLE_TIMEOUT
+
+    def __init__(self, handler: WebSocketHandler) -> None:
+        self.handler = handler
+        self.closed = False
+        self._parser = FrameParser()
+        self._close_lock = threading.Lock()
+
+    def receive(self, data: bytes) -> bytes:
+        output = []
+        try:
+            messages = self._parser.feed(data)
+        except WebSocketError as exc:
+            self.close()
+            return close_frame(exc.close_code, str(exc))
+        for opcode, payload in messages:
+            if opcode == OP_PING:
+                output.append(encode_frame(OP_PONG, payload))
+            elif opcode == OP_PONG:
+                continue
+            elif opcode == OP_CLOSE:
+                self.close()
+                output.append(close_frame(CLOSE_NORMAL))
+                break
+            elif opcode == OP_BINARY:
+                self.close()
+                output.append(close_frame(CLOSE_UNSUPPORTED, "仅支持文本消息。"))
+                break
+            else:
+                try:
+                    text = payload.decode("utf-8")
+                except UnicodeDecodeError:
+                    self.close()
+                    output.append(close_frame(CLOSE_INVALID_DATA, "消息不是合法的 UTF-8。"))
+                    break
+                reply = self.handler.on_message(text)
+                if reply is not None:
+                    output.append(encode_frame(OP_TEXT, reply.encode("utf-8")))
+        return b"".join(output)
+
+    def close(self) -> None:
+        with self._close_lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.handler.on_close()
+
+    def serve(self, read, write) -> None:
+        """阻塞式收发：read(n) 返回 b"" 表示对方已断开。"""
+        try:
+            while not self.closed:
+                data = read(65536)
+                if not data:
+                    break
+                output = self.receive(data)
+                if output:
+                    write(output)
+        finally:
+            self.close()
+
+
+class ConnectionLimit:
+    """长连接数量上限（线程池模式下每个连接占用一个工作线程）。"""
+
+    def __init__(self, maximum: int) -> None:
+        self.maximum = max(0, int(maximum))
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self._count >= self.maximum:
+                return False
+            self._count += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._count = max(0, self._count - 1)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._count
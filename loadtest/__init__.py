@@ -0,0 +1,6 @@
+"""Simulated player traffic against a running game.server.
+
+Run ``python -m loadtest --help`` from the repository root. Players arrive at a
+configurable rate, each following one of the profiles in ``loadtest.players``,
+and the run ends with per-route throughput, latency percentiles and error rates.
+"""
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import List, Tuple
+
+from game.puzzles import PUZZLE_DIR, load_puzzles
+
+from .client import PlayerClient
+from .players import PROFILES, Profile, parse_mix, run_visit
+from .stats import Recorder, format_table
+
+DEFAULT_MIX = "casual=70,speedrunner=20,spectator=10"
+
+
+def _pick(rng: random.Random, mix: List[Tuple[Profile, float]]) -> Profile:
+    return rng.choices([profile for profile, _ in mix], weights=[weight for _, weight in mix])[0]
+
+
+def _progress(recorder: Recorder, started: float, active: int) -> None:
+    elapsed = time.monotonic() - started
+    print(
+        f"[{elapsed:6.1f}s] players active={active} started={recorder.players_started} "
+        f"rejected={recorder.players_rejected} requests={recorder.total_requests()}",
+        file=sys.stderr,
+    )
+
+
+def run(args: argparse.Namespace) -> Tuple[Recorder, float]:
+    mix = parse_mix(args.mix)
+    if args.think_scale != 1.0:
+        mix = [
+            (dataclasses.replace(p, think=(p.think[0] * args.think_scale, p.think[1] * args.think_scale)), weight)
+            for p, weight in mix
+        ]
+    catalog = load_puzzles(Path(args.puzzle_dir))
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    run_tag = uuid.uuid4().hex[:4]
+    threads: List[threading.Thread] = []
+    started = time.monotonic()
+    stop_at = started + args.duration
+
+    def player(index: int, profile: Profile, seed: int) -> None:
+        client = PlayerClient(args.url, uuid.uuid4().hex, recorder, timeout=args.timeout)
+        try:
+            run_visit(client, profile, catalog, random.Random(seed), stop_at, f"lt{run_tag}-{index}")
+        finally:
+            client.close()
+            recorder.player_event("players_finished")
+
+    index = 0
+    next_arrival = started
+    next_report = started + args.report_every
+    while True:
+        now = time.monotonic()
+        if now >= stop_at:
+            break
+        if now >= next_report:
+            threads = [thread for thread in threads if thread.is_alive()]
+            _progress(recorder, started, len(threads))
+            next_report += args.report_every
+        if now < next_arrival:
+            time.sleep(min(next_arrival, next_report, stop_at) - now)
+            continue
+        # Poisson arrivals: exponential gaps between players.
+        next_arrival += rng.expovariate(args.arrival_rate)
+        threads = [thread for thread in threads if thread.is_alive()]
+        if len(threads) >= args.max_players:
+            recorder.player_event("players_rejected")
+            continue
+        index += 1
+        recorder.player_event("players_started")
+        thread = threading.Thread(
+            target=player, args=(index, _pick(rng, mix), rng.getrandbits(32)), name=f"player-{index}", daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join(timeout=args.timeout + 1)
+    return recorder, time.monotonic() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m loadtest",
+        description="Drive a running game.server with simulated players and report per-route latency.",
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server base URL")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to run (default: 60)")
+    parser.add_argument(
+        "--arrival-rate", type=float, default=2.0, help="New players per second, Poisson arrivals (default: 2)"
+    )
+    parser.add_argument(
+        "--max-players", type=int, default=500, help="Concurrent players; arrivals beyond this are turned away"
+    )
+    parser.add_argument(
+        "--mix",
+        default=DEFAULT_MIX,
+        help=f"Weighted player profiles (default: {DEFAULT_MIX}; profiles: {', '.join(PROFILES)})",
+    )
+    parser.add_argument(
+        "--think-scale", type=float, default=1.0, help="Multiply every think time, e.g. 0.1 for 10x faster players"
+    )
+    parser.add_argument("--puzzle-dir", default=str(PUZZLE_DIR), help="Puzzles the server is serving")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds (default: 10)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for arrivals and player choices")
+    parser.add_argument("--report-every", type=float, default=5.0, help="Progress line interval on stderr")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+    if args.arrival_rate <= 0 or args.duration <= 0 or args.max_players <= 0:
+        parser.error("--arrival-rate, --duration and --max-players must be positive")
+    try:
+        recorder, wall = run(args)
+    except ValueError as exc:
+        parser.error(str(exc))
+    rows = recorder.summary(wall)
+    players = {
+        "started": recorder.players_started,
+        "finished": recorder.players_finished,
+        "rejected": recorder.players_rejected,
+    }
+    if args.json:
+        print(json.dumps({"wall_seconds": round(wall, 2), "players": players, "routes": rows}, indent=2))
+        return 0
+    print(f"wall={wall:.1f}s players started={players['started']} rejected={players['rejected']}")
+    print(format_table(rows))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
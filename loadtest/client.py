@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import http.client
+import json
+import time
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+from .stats import Recorder
+
+
+class PlayerClient:
+    """One simulated browser tab: a keep-alive connection and a session id.
+
+    Every request is timed and recorded under "METHOD /path" (query string dropped),
+    so all polls of /api/leaderboard land in one row regardless of puzzle.
+    """
+
+    def __init__(self, base_url: str, session_id: str, recorder: Recorder, timeout: float = 10.0) -> None:
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 80
+        self.session_id = session_id
+        self.recorder = recorder
+        self.timeout = timeout
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, dict]:
+        """Send one request; returns (status, json). Status 0 means the request never completed."""
+        headers = {"X-Session-Id": self.session_id, "Accept-Encoding": "identity"}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        route = f"{method} {path.split('?', 1)[0]}"
+        started = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.request(method, path, body=data, headers=headers)
+            resp = conn.getresponse()
+            raw = resp.read()
+            status = resp.status
+            if resp.getheader("Connection", "").lower() == "close":
+                self.close()
+        except (OSError, http.client.HTTPException) as exc:
+            self.close()
+            self.recorder.record(route, 0, time.perf_counter() - started)
+            return 0, {"ok": False, "message": str(exc)}
+        self.recorder.record(route, status, time.perf_counter() - started)
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            payload = {}
+        return status, payload if isinstance(payload, dict) else {}
+
+    def get(self, path: str) -> Tuple[int, dict]:
+        return self.request("GET", path)
+
+    def post(self, path: str, body: Optional[dict] = None) -> Tuple[int, dict]:
+        return self.request("POST", path, body if body is not None else {})
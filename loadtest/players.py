@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+from urllib.parse import quote
+
+from game.engine import Game
+
+from .client import PlayerClient
+
+# Common characters used for deliberate misses; any that happen to be in the title are skipped.
+MISS_POOL = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严龙飞"
+
+
+@dataclass(frozen=True)
+class Profile:
+    """How one kind of player behaves during a visit."""
+
+    name: str
+    # Seconds between actions, drawn uniformly from this range.
+    think: Tuple[float, float]
+    # Puzzles played per visit (0 = spectator who only polls boards).
+    puzzles: int = 1
+    # Chance that a guess is a deliberate miss instead of the optimal character.
+    miss_rate: float = 0.0
+    # Chance per turn of asking for a hint instead of guessing.
+    hint_rate: float = 0.0
+    # Seconds between leaderboard polls while playing (0 = never).
+    poll_every: float = 0.0
+    # Upper bound on a visit, in seconds.
+    visit: float = 300.0
+
+
+PROFILES: Dict[str, Profile] = {
+    # Types a guess every few seconds, misses often, takes the odd hint, keeps an eye on the board.
+    "casual": Profile("casual", think=(1.0, 4.0), puzzles=1, miss_rate=0.35, hint_rate=0.05, poll_every=15.0),
+    # Knows the answers, guesses fast and plays several puzzles in a row.
+    "speedrunner": Profile("speedrunner", think=(0.2, 0.6), puzzles=3, miss_rate=0.05),
+    # Only watches the daily challenge and the leaderboards.
+    "spectator": Profile("spectator", think=(3.0, 8.0), puzzles=0, poll_every=5.0, visit=60.0),
+}
+
+BOARD_PATHS = ["/api/daily", "/api/overall_leaderboard", "/api/difficulty/board", "/api/daily/leaderboard"]
+
+
+def parse_mix(text: str) -> List[Tuple[Profile, float]]:
+    """Parse "casual=70,speedrunner=20,spectator=10" into weighted profiles."""
+    mix = []
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        profile = PROFILES.get(name.strip())
+        if profile is None:
+            raise ValueError(f"unknown profile {name.strip()!r} (choose from {', '.join(PROFILES)})")
+        mix.append((profile, float(weight or 1)))
+    if not mix or sum(weight for _, weight in mix) <= 0:
+        raise ValueError("the player mix needs at least one profile with a positive weight")
+    return mix
+
+
+def _pause(rng: random.Random, profile: Profile, stop_at: float) -> bool:
+    """Think for a while; returns False when the visit is over."""
+    delay = rng.uniform(*profile.think)
+    remaining = stop_at - time.monotonic()
+    if remaining <= 0:
+        return False
+    time.sleep(min(delay, remaining))
+    return time.monotonic() < stop_at
+
+
+def _miss(rng: random.Random, game: Game) -> str:
+    guessed = set(game.guessed_correct) | set(game.guessed_wrong)
+    for _ in range(20):
+        ch = rng.choice(MISS_POOL)
+        if ch not in game.title and ch not in guessed:
+            return ch
+    return game.next_optimal_guess() or rng.choice(MISS_POOL)
+
+
+def _play_puzzle(client: PlayerClient, profile: Profile, puzzle: dict, rng: random.Random, stop_at: float) -> None:
+    puzzle_id = quote(str(puzzle["id"]))
+    status, data = client.post("/api/start", {"puzzle_id": puzzle["id"], "mode": "restart"})
+    if status != 200:
+        return
+    # A local copy of the puzzle tells us the optimal next guess; the server stays authoritative.
+    game = Game(puzzle["title"], puzzle["body"])
+    last_poll = time.monotonic()
+    complete = False
+    while not complete and _pause(rng, profile, stop_at):
+        if profile.hint_rate and rng.random() < profile.hint_rate:
+            client.post("/api/hint")
+            continue
+        if rng.random() < profile.miss_rate:
+            ch = _miss(rng, game)
+        else:
+            ch = game.next_optimal_guess()
+            if ch is None:
+                break
+        status, data = client.post("/api/guess", {"ch": ch})
+        game.guess(ch)
+        if status == 200:
+            complete = bool(((data.get("result") or {}).get("state") or {}).get("is_complete"))
+        if profile.poll_every and time.monotonic() - last_poll >= profile.poll_every:
+            client.get(f"/api/leaderboard?puzzle_id={puzzle_id}&limit=10")
+            last_poll = time.monotonic()
+    if complete:
+        client.get(f"/api/leaderboard/rank?puzzle_id={puzzle_id}")
+        client.get(f"/api/leaderboard?puzzle_id={puzzle_id}&limit=10")
+
+
+def run_visit(
+    client: PlayerClient, profile: Profile, catalog: List[dict], rng: random.Random, stop_at: float, nickname: str
+) -> None:
+    """One player's visit: log in, look around, then play or watch until done or stop_at."""
+    stop_at = min(stop_at, time.monotonic() + profile.visit)
+    status, _ = client.post("/api/login", {"nickname": nickname})
+    if status != 200:
+        return
+    client.get("/api/me")
+    client.get("/api/puzzles")
+    client.get("/api/daily")
+    if profile.puzzles <= 0:
+        while _pause(rng, profile, stop_at):
+            client.get(rng.choice(BOARD_PATHS))
+        return
+    for _ in range(profile.puzzles):
+        if time.monotonic() >= stop_at:
+            break
+        _play_puzzle(client, profile, rng.choice(catalog), rng, stop_at)
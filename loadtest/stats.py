@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import math
+import threading
+from collections import Counter
+from typing import Dict, List
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+class Recorder:
+    """Thread-safe collection of request outcomes, keyed by route ("GET /api/puzzles")."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, List[float]] = {}
+        self._statuses: Dict[str, Counter] = {}
+        self.players_started = 0
+        self.players_finished = 0
+        self.players_rejected = 0
+
+    def record(self, route: str, status: int, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(route, []).append(seconds)
+            self._statuses.setdefault(route, Counter())[status] += 1
+
+    def total_requests(self) -> int:
+        with self._lock:
+            return sum(len(values) for values in self._latencies.values())
+
+    def player_event(self, kind: str) -> None:
+        with self._lock:
+            setattr(self, kind, getattr(self, kind) + 1)
+
+    def summary(self, wall: float) -> List[Dict[str, object]]:
+        """One row per route plus a final "TOTAL" row.
+
+        A request is an error when the connection failed (status 0) or the status is >= 400.
+        """
+        with self._lock:
+            routes = {route: list(values) for route, values in self._latencies.items()}
+            statuses = {route: Counter(counts) for route, counts in self._statuses.items()}
+        rows = []
+        everything: List[float] = []
+        all_statuses: Counter = Counter()
+        for route in sorted(routes):
+            rows.append(_row(route, routes[route], statuses[route], wall))
+            everything.extend(routes[route])
+            all_statuses.update(statuses[route])
+        rows.append(_row("TOTAL", everything, all_statuses, wall))
+        return rows
+
+
+def _row(route: str, latencies: List[float], statuses: Counter, wall: float) -> Dict[str, object]:
+    latencies.sort()
+    count = len(latencies)
+    errors = sum(n for status, n in statuses.items() if status == 0 or status >= 400)
+    return {
+        "route": route,
+        "requests": count,
+        "rps": round(count / wall, 1) if wall else 0.0,
+        "errors": errors,
+        "error_pct": round(100.0 * errors / count, 2) if count else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        "statuses": {str(status): n for status, n in sorted(statuses.items()) if status != 200},
+    }
+
+
+def format_table(rows: List[Dict[str, object]]) -> str:
+    columns = ["requests", "rps", "errors", "error_pct", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+    width = max([len("route")] + [len(str(row["route"])) for row in rows])
+    lines = [f"{'route':<{width}}  " + "  ".join(f"{col:>9}" for col in columns) + "  other statuses"]
+    for row in rows:
+        other = " ".join(f"{status}x{n}" for status, n in row["statuses"].items())
+        cells = "  ".join(f"{row[col]:>9}" for col in columns)
+        lines.append(f"{row['route']:<{width}}  {cells}  {other}")
+    return "\n".join(lines)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# Side-by-side load benchmark of the server backends (threaded / asyncio / single).
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Read-only endpoints, so the benchmark does not change local progress data.
+PATHS = ["/api/puzzles", "/api/daily", "/api/difficulty/board", "/api/overall_leaderboard", "/"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def wait_ready(port: int, timeout: float = 15.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def open_idle_connections(port: int, count: int) -> List[socket.socket]:
+    """Open keep-alive connections that send nothing, like idle browser tabs."""
+    sockets = []
+    for _ in range(count):
+        try:
+            sockets.append(socket.create_connection(("127.0.0.1", port), timeout=5))
+        except OSError:
+            break
+    return sockets
+
+
+def run_load(
+    port: int, clients: int, duration: float, timeout: float, gzip: bool = False, new_connection: bool = False
+) -> Dict[str, object]:
+    latencies: List[float] = []
+    errors = [0]
+    received = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(index: int) -> None:
+        session_id = uuid.uuid4().hex
+        headers = {"X-Session-Id": session_id}
+        if gzip:
+            headers["Accept-Encoding"] = "gzip"
+        if new_connection:
+            headers["Connection"] = "close"
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        local: List[float] = []
+        failed = 0
+        nbytes = 0
+        step = index
+        while time.monotonic() < deadline:
+            path = PATHS[step % len(PATHS)]
+            step += 1
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+                nbytes += len(resp.read())
+                if resp.status != 200:
+                    failed += 1
+                    continue
+                local.append(time.perf_counter() - started)
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+            received[0] += nbytes
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    total = len(latencies)
+
+    def pct(value: float) -> float:
+        return latencies[min(total - 1, int(total * value))] * 1000 if total else 0.0
+
+    return {
+        "requests": total,
+        "errors": errors[0],
+        "rps": round(total / wall, 1) if wall else 0.0,
+        "body_kb_per_req": round(received[0] / total / 1024, 2) if total else 0.0,
+        "p50_ms": round(pct(0.50), 1),
+        "p99_ms": round(pct(0.99), 1),
+    }
+
+
+def bench_backend(backend: str, args: argparse.Namespace) -> Dict[str, object]:
+    port = free_port()
+    cmd = [
+        sys.executable,
+        "-m",
+        "game.server",
+        "--backend",
+        backend,
+        "--port",
+        str(port),
+        "--threads",
+        str(args.threads),
+        # Measure the raw backend: no per-IP rate limits or load shedding.
+        "--no-rate-limit",
+        "--max-queue",
+        "0",
+        "--max-queue-wait-ms",
+        "0",
+    ]
+    proc = subprocess.Popen(cmd, cwd=str(ROOT), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(port):
+            return {"backend": backend, "error": "server did not start"}
+        idle = open_idle_connections(port, args.idle)
+        try:
+            result = run_load(port, args.clients, args.duration, args.timeout, args.gzip, args.new_connection)
+        finally:
+            for sock in idle:
+                sock.close()
+        return {"backend": backend, "idle_connections": len(idle), **result}
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare server backends under the same load.")
+    parser.add_argument("--backends", default="threaded,asyncio", help="Comma separated (default: threaded,asyncio)")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent keep-alive clients (default: 32)")
+    parser.add_argument("--idle", type=int, default=200, help="Idle connections held open during the run (default: 200)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per backend (default: 10)")
+    parser.add_argument("--threads", type=int, default=32, help="Server worker threads (default: 32)")
+    parser.add_argument("--timeout", type=float, default=5.0, help="Per-request timeout in seconds (default: 5)")
+    parser.add_argument("--gzip", action="store_true", help="Send Accept-Encoding: gzip")
+    parser.add_argument(
+        "--new-connection", action="store_true", help="Open a new connection per request (Connection: close)"
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = [bench_backend(name.strip(), args) for name in args.backends.split(",") if name.strip()]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    columns = ["backend", "idle_connections", "requests", "errors", "rps", "body_kb_per_req", "p50_ms", "p99_ms"]
+    print("  ".join(f"{col:>16}" for col in columns))
+    for row in results:
+        if "error" in row:
+            print(f"{row['backend']:>16}  {row['error']}")
+            continue
+        print("  ".join(f"{row.get(col, ''):>16}" for col in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
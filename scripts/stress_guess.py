@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# Hammer /api/guess (or the /api/ws game socket) from many concurrent clients and check per-user invariants.
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlparse
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from game.engine import Game  # noqa: E402
+from game.puzzles import PUZZLE_DIR, load_puzzles  # noqa: E402
+
+# Characters that never appear in the bundled puzzles, used as wrong guesses.
+WRONG_POOL = "乒乓兮乩亟亵仑伫佚侥"
+
+
+def call(base: str, method: str, path: str, session_id: str, body: Optional[dict] = None) -> Tuple[int, dict]:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    headers = {"X-Session-Id": session_id, "Content-Type": "application/json"}
+    req = urllib.request.Request(base + path, data=data, method=method, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return resp.status, json.loads(resp.read() or b"{}")
+    except urllib.error.HTTPError as exc:
+        return exc.code, json.loads(exc.read() or b"{}")
+    except OSError as exc:
+        # Connection resets/timeouts count as failures instead of killing the worker.
+        return 0, {"ok": False, "message": str(exc)}
+
+
+def apply_delta(base: Optional[dict], delta: dict) -> Optional[dict]:
+    """Mirror of applyStateDelta in web/app.js."""
+    if "full" in delta:
+        return delta["full"]
+    state = dict(base or {}, **delta.get("set", {}))
+    for key, items in delta.get("append", {}).items():
+        state[key] = list(base.get(key) or []) + items
+    for key, pairs in delta.get("reveal", {}).items():
+        chars = list(base.get(key) or "")
+        for index, ch in pairs:
+            chars[index] = ch
+        state[key] = "".join(chars)
+    return state
+
+
+class GameSocketClient:
+    """Minimal blocking WebSocket client for /api/ws that rebuilds the state from deltas."""
+
+    def __init__(self, base: str, session_id: str, timeout: float = 30.0) -> None:
+        parsed = urlparse(base)
+        host, port = parsed.hostname or "127.0.0.1", parsed.port or 80
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        self.sock.sendall(
+            (
+                f"GET /api/ws?session={quote(session_id)} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+            ).encode("ascii")
+        )
+        self.file = self.sock.makefile("rb")
+        status_line = self.file.readline()
+        while self.file.readline() not in (b"\r\n", b""):
+            pass
+        if b" 101 " not in status_line:
+            self.close()
+            raise OSError(f"upgrade failed: {status_line!r}")
+        self.state: Optional[dict] = None
+        self.seq = 0
+
+    def call(self, kind: str, **fields) -> dict:
+        self.seq += 1
+        payload = json.dumps({"id": self.seq, "type": kind, **fields}).encode("utf-8")
+        mask = os.urandom(4)
+        if len(payload) < 126:
+            head = struct.pack("!BB", 0x81, 0x80 | len(payload))
+        else:
+            head = struct.pack("!BBH", 0x81, 0x80 | 126, len(payload))
+        self.sock.sendall(head + mask + bytes(b ^ mask[i % 4] for i, b in enumerate(payload)))
+        data = json.loads(self._read_text())
+        for holder in (data, data.get("result")):
+            if isinstance(holder, dict) and "delta" in holder:
+                self.state = apply_delta(self.state, holder.pop("delta"))
+                holder["state"] = self.state
+        return data
+
+    def _read_text(self) -> bytes:
+        first, second = self.file.read(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self.file.read(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self.file.read(8))[0]
+        data = self.file.read(length)
+        if first & 0x0F == 0x8:
+            raise OSError(f"socket closed by server: {data[2:].decode('utf-8', 'replace')}")
+        return data
+
+    def close(self) -> None:
+        self.file.close()
+        self.sock.close()
+
+
+def guess_sequence(puzzle: dict, rng: random.Random) -> List[str]:
+    """Return the solving guesses plus a few wrong ones, shuffled."""
+    game = Game(puzzle["title"], puzzle["body"])
+    chars: List[str] = []
+    while True:
+        ch = game.next_optimal_guess()
+        if ch is None:
+            break
+        game.guess(ch)
+        chars.append(ch)
+    title_chars = set(puzzle["title"])
+    chars.extend(ch for ch in WRONG_POOL[:3] if ch not in title_chars and ch not in puzzle["body"])
+    rng.shuffle(chars)
+    return chars
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Concurrent /api/guess stress test.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server base URL")
+    parser.add_argument("--users", type=int, default=20, help="Number of simulated players (default: 20)")
+    parser.add_argument(
+        "--clients-per-user",
+        type=int,
+        default=3,
+        help="Concurrent clients sharing one session, sending the same guesses (default: 3)",
+    )
+    parser.add_argument("--puzzle-id", default="", help="Puzzle to play (default: first puzzle)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for guess order")
+    parser.add_argument(
+        "--websocket",
+        action="store_true",
+        help="Send guesses over one /api/ws socket per client and check the delta-rebuilt state",
+    )
+    args = parser.parse_args()
+
+    base = args.url.rstrip("/")
+    puzzles = load_puzzles(PUZZLE_DIR)
+    if args.puzzle_id:
+        puzzles = [p for p in puzzles if p["id"] == args.puzzle_id]
+    if not puzzles:
+        print("No puzzle found.")
+        return 1
+    puzzle = puzzles[0]
+    rng = random.Random(args.seed)
+    run_tag = uuid.uuid4().hex[:6]
+
+    sessions: Dict[str, List[str]] = {}
+    for index in range(args.users):
+        session_id = uuid.uuid4().hex
+        status, data = call(base, "POST", "/api/login", session_id, {"nickname": f"st{run_tag}{index}"})
+        if not data.get("ok"):
+            print(f"login failed: {status} {data}")
+            return 1
+        status, data = call(base, "POST", "/api/start", session_id, {"puzzle_id": puzzle["id"], "mode": "restart"})
+        if not data.get("ok"):
+            print(f"start failed: {status} {data}")
+            return 1
+        sessions[session_id] = guess_sequence(puzzle, rng)
+
+    errors: List[str] = []
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    sockets: List[GameSocketClient] = []
+
+    def socket_worker(session_id: str, chars: List[str]) -> None:
+        try:
+            client = GameSocketClient(base, session_id)
+        except OSError as exc:
+            with lock:
+                errors.append(f"{session_id[:8]}: {exc}")
+            return
+        with lock:
+            sockets.append(client)
+        try:
+            for ch in chars:
+                started = time.perf_counter()
+                data = client.call("guess", ch=ch)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    if not data.get("ok"):
+                        errors.append(f"{session_id[:8]} {ch}: {data.get('message')}")
+        except OSError as exc:
+            with lock:
+                errors.append(f"{session_id[:8]}: {exc}")
+
+    def worker(session_id: str, chars: List[str]) -> None:
+        for ch in chars:
+            started = time.perf_counter()
+            status, data = call(base, "POST", "/api/guess", session_id, {"ch": ch})
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status != 200 or not data.get("ok"):
+                    errors.append(f"{session_id[:8]} {ch}: {status} {data.get('message')}")
+
+    threads = [
+        threading.Thread(target=socket_worker if args.websocket else worker, args=(session_id, chars))
+        for session_id, chars in sessions.items()
+        for _ in range(max(1, args.clients_per_user))
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    for client in sockets:
+        # Catch up on guesses made by the other clients of the same user, then compare
+        # the state rebuilt from deltas with a full state sent by the server.
+        try:
+            client.call("state")
+            rebuilt = client.state
+            client.call("state", full=True)
+            if rebuilt != client.state:
+                errors.append(f"delta state {rebuilt} != {client.state}")
+        except OSError as exc:
+            errors.append(str(exc))
+        finally:
+            client.close()
+
+    for session_id, chars in sessions.items():
+        _, data = call(base, "GET", "/api/state", session_id)
+        state = data.get("state") or {}
+        correct = state.get("guessed_correct", [])
+        wrong = state.get("guessed_wrong", [])
+        if not state.get("is_complete"):
+            errors.append(f"{session_id[:8]}: puzzle not complete")
+        if len(correct) != len(set(correct)) or len(wrong) != len(set(wrong)):
+            errors.append(f"{session_id[:8]}: duplicated guesses {correct} {wrong}")
+        if state.get("guess_count") != len(correct) + len(wrong):
+            errors.append(f"{session_id[:8]}: guess_count {state.get('guess_count')} != {len(correct) + len(wrong)}")
+        _, data = call(base, "GET", f"/api/leaderboard/rank?puzzle_id={puzzle['id']}", session_id)
+        rank = data.get("rank") or {}
+        if rank.get("guess_count") != state.get("guess_count"):
+            errors.append(f"{session_id[:8]}: leaderboard {rank.get('guess_count')} != {state.get('guess_count')}")
+
+    latencies.sort()
+    total = len(latencies)
+    p50 = latencies[total // 2] if total else 0.0
+    p99 = latencies[min(total - 1, int(total * 0.99))] if total else 0.0
+    print(
+        f"requests={total} wall={wall:.2f}s rps={total / wall if wall else 0:.0f} "
+        f"p50={p50 * 1000:.1f}ms p99={p99 * 1000:.1f}ms errors={len(errors)}"
+    )
+    for line in errors[:20]:
+        print(f"  {line}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -24,6 +24,7 @@ const currentUser = document.getElementById("currentUser");
 const leaderboardSelect = document.getElementById("leaderboardSelect");
 const leaderboardList = document.getElementById("leaderboardList");
 const leaderboardEmpty = document.getElementById("leaderboardEmpty");
+const leaderboardMine = document.getElementById("leaderboardMine");
 const filterUnfinishedBtn = document.getElementById("filterUnfinishedBtn");
 const loginBadge = document.getElementById("loginBadge");
 const loginNotice = document.getElementById("loginNotice");
@@ -76,6 +77,18 @@ let overallCache = [];
 let currentDifficulty = "";
 let lastDifficultyPuzzleId = "";
 let freeHintCount = 0;
+let liveSource = null;
+let livePuzzleId = null;
+let liveConnected = false;
+let gameSocket = null;
+let gameSocketOpen = false;
+let gameSocketUserId = null;
+let gameSocketState = null;
+let gameSocketSeq = 0;
+let gameSocketPing = null;
+let gameSocketRetry = null;
+let gameSocketRetryDelay = 5000;
+const gameSocketPending = new Map();
 
 const SESSION_KEY = "guess_game_session_id";
 const AI_ACCESS_KEY = "guess_ai_access_code";
@@ -163,6 +176,7 @@ function renderCurrentUser(user) {
 function applyLoginState(user) {
   currentUserInfo = user || null;
   renderCurrentUser(user);
+  syncGameSocket(user);
   const loggedIn = isLoggedIn();
   if (loginNotice) {
     loginNotice.classList.toggle("is-hidden", loggedIn);
@@ -229,6 +243,20 @@ function setLeaderboardHint(text) {
   leaderboardEmpty.textContent = text;
   leaderboardEmpty.style.display = "block";
   leaderboardList.innerHTML = "";
+  setLeaderboardMine(null);
+}
+
+function setLeaderboardMine(rank) {
+  if (!leaderboardMine) {
+    return;
+  }
+  if (!rank) {
+    leaderboardMine.textContent = "";
+    leaderboardMine.style.display = "none";
+    return;
+  }
+  leaderboardMine.textContent = `我的排名：第 ${rank.rank} / ${rank.total} 名，超过 ${rank.percentile}% 的玩家`;
+  leaderboardMine.style.display = "block";
 }
 
 function renderLeaderboardItems(entries, listEl, emptyEl, maxItems = null) {
@@ -296,6 +324,7 @@ function renderLeaderboard(entries) {
 }
 
 async function loadLeaderboard(puzzleId) {
+  syncLiveStream(puzzleId || "");
   if (!puzzleId) {
     setLeaderboardHint("请选择题目");
     return;
@@ -303,12 +332,27 @@ async function loadLeaderboard(puzzleId) {
   try {
     const data = await requestJson(`/api/leaderboard?puzzle_id=${encodeURIComponent(puzzleId)}`);
     renderLeaderboard(data.entries || []);
+    await loadLeaderboardRank(puzzleId);
   } catch (error) {
     console.error("[leaderboard] 读取失败", error);
     setLeaderboardHint(`排行榜读取失败：${error.message}`);
   }
 }
 
+async function loadLeaderboardRank(puzzleId) {
+  if (!isLoggedIn()) {
+    setLeaderboardMine(null);
+    return;
+  }
+  try {
+    const data = await requestJson(`/api/leaderboard/rank?puzzle_id=${encodeURIComponent(puzzleId)}`);
+    setLeaderboardMine(data.rank);
+  } catch (error) {
+    console.error("[leaderboard] 读取排名失败", error);
+    setLeaderboardMine(null);
+  }
+}
+
 // 控制输入区可用状态
 function isLoggedIn() {
   return Boolean(currentUserInfo && currentUserInfo.nickname);
@@ -573,6 +617,13 @@ function refreshLeaderboardIfComplete(state) {
     return;
   }
   const selectedId = leaderboardSelect.value;
+  if (liveConnected) {
+    // 榜单由实时推送更新，只需刷新自己的名次
+    if (selectedId && state.puzzle_id === selectedId) {
+      loadLeaderboardRank(selectedId);
+    }
+    return;
+  }
   if (selectedId && state.puzzle_id === selectedId) {
     loadLeaderboard(selectedId);
   }
@@ -683,10 +734,7 @@ async function startGame() {
     return;
   }
   try {
-    const data = await requestJson("/api/start", {
-      method: "POST",
-      body: JSON.stringify({ puzzle_id: puzzleId, mode: "resume" }),
-    });
+    const data = await callGame("start", { puzzle_id: puzzleId, mode: "resume" }, "/api/start");
     aiLogs = [];
     renderAiLog();
     renderState(data.state);
@@ -713,10 +761,7 @@ async function restartGame() {
     return;
   }
   try {
-    const data = await requestJson("/api/start", {
-      method: "POST",
-      body: JSON.stringify({ puzzle_id: puzzleSelect.value, mode: "restart" }),
-    });
+    const data = await callGame("start", { puzzle_id: puzzleSelect.value, mode: "restart" }, "/api/start");
     aiLogs = [];
     renderAiLog();
     renderState(data.state);
@@ -750,10 +795,7 @@ async function submitGuess() {
   }
 
   try {
-    const data = await requestJson("/api/guess", {
-      method: "POST",
-      body: JSON.stringify({ ch: raw }),
-    });
+    const data = await callGame("guess", { ch: raw }, "/api/guess");
     const result = data.result;
     renderState(result.state);
     if (result.state && result.state.is_complete) {
@@ -1291,29 +1333,217 @@ async function loadDailyTrend() {
   }
   try {
     const data = await requestJson("/api/daily/trend?days=7");
-    const items = data.items || [];
-    const counts = items.map((item) => Number(item.count) || 0);
-    const maxCount = Math.max(1, ...counts);
-    dailyTrendBars.innerHTML = "";
-    items.forEach((item) => {
-      const wrap = document.createElement("div");
-      wrap.className = "trend-item";
-      const bar = document.createElement("div");
-      bar.className = "trend-bar";
-      const height = Math.round((Number(item.count) || 0) / maxCount * 28) + 6;
-      bar.style.height = `${height}px`;
-      bar.title = `${item.date} · ${item.count} 完成`;
-      const label = document.createElement("div");
-      label.className = "trend-label";
-      label.textContent = (item.date || "").slice(5);
-      wrap.append(bar, label);
-      dailyTrendBars.appendChild(wrap);
-    });
+    renderDailyTrend(data.items || []);
   } catch (error) {
     dailyTrendBars.innerHTML = "";
   }
 }
 
+function renderDailyTrend(items) {
+  if (!dailyTrendBars) {
+    return;
+  }
+  const counts = items.map((item) => Number(item.count) || 0);
+  const maxCount = Math.max(1, ...counts);
+  dailyTrendBars.innerHTML = "";
+  items.forEach((item) => {
+    const wrap = document.createElement("div");
+    wrap.className = "trend-item";
+    const bar = document.createElement("div");
+    bar.className = "trend-bar";
+    const height = Math.round((Number(item.count) || 0) / maxCount * 28) + 6;
+    bar.style.height = `${height}px`;
+    bar.title = `${item.date} · ${item.count} 完成`;
+    const label = document.createElement("div");
+    label.className = "trend-label";
+    label.textContent = (item.date || "").slice(5);
+    wrap.append(bar, label);
+    dailyTrendBars.appendChild(wrap);
+  });
+}
+
+function parseLiveEvent(event) {
+  try {
+    return JSON.parse(event.data);
+  } catch (error) {
+    console.error("[live] 推送数据解析失败", error);
+    return null;
+  }
+}
+
+// 实时推送：榜单与每日统计变化时由服务端推送，不再逐个接口重新请求
+function syncLiveStream(puzzleId) {
+  if (typeof EventSource === "undefined" || puzzleId === livePuzzleId) {
+    return;
+  }
+  if (liveSource) {
+    liveSource.close();
+  }
+  livePuzzleId = puzzleId;
+  liveConnected = false;
+  const url = puzzleId ? `/api/stream?puzzle_id=${encodeURIComponent(puzzleId)}` : "/api/stream";
+  const source = new EventSource(url);
+  liveSource = source;
+  source.addEventListener("open", () => {
+    liveConnected = true;
+  });
+  source.addEventListener("error", () => {
+    // 连接数已满等错误时浏览器不再重连，回退为通关后主动刷新
+    liveConnected = false;
+  });
+  source.addEventListener("leaderboard", (event) => {
+    const data = parseLiveEvent(event);
+    if (data && data.puzzle_id === leaderboardSelect.value) {
+      renderLeaderboard(data.entries || []);
+    }
+  });
+  source.addEventListener("daily", (event) => {
+    const data = parseLiveEvent(event);
+    if (!data || !dailyLeaderboardList || !dailyLeaderboardEmpty) {
+      return;
+    }
+    if (dailyDate && (data.date !== dailyDate || data.puzzle_id !== dailyPuzzleId)) {
+      // 跨天换题：重新加载今日挑战
+      loadDailyChallenge();
+      return;
+    }
+    dailyCompletionCount = Number(data.count) || 0;
+    updateDailyBoardMeta();
+    renderLeaderboardItems(data.entries || [], dailyLeaderboardList, dailyLeaderboardEmpty, 5);
+    renderDailyTrend(data.trend || []);
+  });
+  source.addEventListener("boards", (event) => {
+    const data = parseLiveEvent(event);
+    if (!data) {
+      return;
+    }
+    authorStatsCache = data.authors || [];
+    renderAuthorStats();
+    difficultyBoardCache = data.difficulty || [];
+    renderDifficultyBoard();
+    overallCache = data.overall || [];
+    renderOverallLeaderboard();
+  });
+}
+
+// 游戏长连接：开局、猜字、提示与 AI 单步走 WebSocket，服务端只回传状态增量；未连接时回退为普通请求
+function syncGameSocket(user) {
+  const userId = user && user.id ? user.id : null;
+  if (userId === gameSocketUserId) {
+    return;
+  }
+  gameSocketUserId = userId;
+  if (gameSocket) {
+    const previous = gameSocket;
+    gameSocket = null;
+    gameSocketOpen = false;
+    previous.close();
+  }
+  connectGameSocket();
+}
+
+function connectGameSocket() {
+  if (typeof WebSocket === "undefined" || !gameSocketUserId || gameSocket) {
+    return;
+  }
+  clearTimeout(gameSocketRetry);
+  const scheme = window.location.protocol === "https:" ? "wss:" : "ws:";
+  const url = `${scheme}//${window.location.host}/api/ws?session=${encodeURIComponent(getSessionId())}`;
+  const socket = new WebSocket(url);
+  gameSocket = socket;
+  socket.addEventListener("open", () => {
+    gameSocketOpen = true;
+    gameSocketState = null;
+    gameSocketRetryDelay = 5000;
+    // 定期发消息，避免服务端把空闲连接当作断开
+    gameSocketPing = setInterval(() => socket.send(JSON.stringify({ type: "ping" })), 30000);
+  });
+  socket.addEventListener("message", (event) => {
+    let data = null;
+    try {
+      data = JSON.parse(event.data);
+    } catch (error) {
+      console.error("[socket] 消息解析失败", error);
+      return;
+    }
+    const pending = gameSocketPending.get(data.id);
+    if (!pending) {
+      return;
+    }
+    gameSocketPending.delete(data.id);
+    // 按到达顺序应用增量，与服务端记录的上一次状态保持一致
+    [data, data.result].forEach((holder) => {
+      if (holder && holder.delta) {
+        holder.state = applyStateDelta(gameSocketState, holder.delta);
+        gameSocketState = holder.state;
+        delete holder.delta;
+      }
+    });
+    pending.resolve(data);
+  });
+  socket.addEventListener("close", () => {
+    clearInterval(gameSocketPing);
+    if (gameSocket === socket) {
+      gameSocket = null;
+      gameSocketOpen = false;
+      gameSocketState = null;
+    }
+    gameSocketPending.forEach((pending, id) => {
+      if (pending.socket === socket) {
+        gameSocketPending.delete(id);
+        pending.reject(new Error("连接已断开，请重试。"));
+      }
+    });
+    if (gameSocketUserId && !gameSocket) {
+      // 连接数已满或服务重启时逐步拉长重连间隔，期间使用普通请求
+      gameSocketRetry = setTimeout(connectGameSocket, gameSocketRetryDelay);
+      gameSocketRetryDelay = Math.min(gameSocketRetryDelay * 2, 60000);
+    }
+  });
+}
+
+function applyStateDelta(base, delta) {
+  if ("full" in delta) {
+    return delta.full;
+  }
+  const state = { ...base, ...(delta.set || {}) };
+  Object.entries(delta.append || {}).forEach(([key, items]) => {
+    state[key] = (base[key] || []).concat(items);
+  });
+  Object.entries(delta.reveal || {}).forEach(([key, pairs]) => {
+    // 下标按字符计，Array.from 按码点拆分
+    const chars = Array.from(base[key] || "");
+    pairs.forEach(([index, ch]) => {
+      chars[index] = ch;
+    });
+    state[key] = chars.join("");
+  });
+  return state;
+}
+
+function sendGameCommand(type, fields) {
+  return new Promise((resolve, reject) => {
+    gameSocketSeq += 1;
+    const id = gameSocketSeq;
+    gameSocketPending.set(id, { resolve, reject, socket: gameSocket });
+    // 当前状态不是来自本连接（如刷新或回退请求）时让服务端发完整状态
+    const full = currentState !== gameSocketState;
+    gameSocket.send(JSON.stringify({ ...fields, id, type, full }));
+  });
+}
+
+// 执行一条游戏指令：返回与对应 REST 接口相同结构的数据
+async function callGame(type, fields, url, options = {}) {
+  if (gameSocketOpen) {
+    const data = await sendGameCommand(type, fields);
+    if (!data.ok) {
+      throw new Error(data.message || "请求失败");
+    }
+    return data;
+  }
+  return requestJson(url, { method: "POST", body: JSON.stringify(fields), ...options });
+}
+
 async function loadCheckinStatus() {
   if (!isLoggedIn()) {
     freeHintCount = 0;
@@ -1363,7 +1593,7 @@ async function useHint() {
     return;
   }
   try {
-    const data = await requestJson("/api/hint", { method: "POST", body: JSON.stringify({}) });
+    const data = await callGame("hint", {}, "/api/hint");
     renderState(data.state);
     refreshLeaderboardIfComplete(data.state);
     if (data.free_used) {
@@ -1436,8 +1666,7 @@ async function submitDifficulty(puzzleId, difficulty) {
 
 async function aiStep() {
   const accessCode = getLocalAiAccessCode();
-  const data = await requestJson("/api/ai/step", {
-    method: "POST",
+  const data = await callGame("ai_step", { access_code: accessCode }, "/api/ai/step", {
     headers: accessCode ? { "X-AI-Access-Code": accessCode } : {},
     body: JSON.stringify({}),
   });
@@ -1716,4 +1945,5 @@ loadDifficultyBoard();
 loadOverallLeaderboard();
 loadDailyChallenge();
 loadDailyTrend();
+syncLiveStream(leaderboardSelect.value || "");
 updateFilterUnfinishedState();